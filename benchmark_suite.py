@@ -0,0 +1,191 @@
+"""
+End-to-end scaling benchmark of the kdd_pipe stages on synthetic KDD99 data.
+
+For every size the synthetic csv is generated and then timed through the stages:
+
+    ingestion        csv to gzipped TFRecords with the KddExampleGen executor
+    statistics       TFDV statistics of the train split
+    preprocessing_fn tf.Transform analyze and transform of the train split with tfx_utils.preprocessing_fn
+    input_fn         examples/sec delivered by tfx_utils._input_fn over the transformed data
+
+Results are stored as JSON with the git commit, so runs of two commits can be compared:
+
+    python benchmark_suite.py --sizes 1000000 10000000 --output results/$(git rev-parse --short HEAD).json
+    python benchmark_suite.py --compare results/<old>.json results/<new>.json
+
+Everything runs offline on CPU; the profile of the generator is fitted on kddcup.gz once.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Text
+
+import apache_beam as beam
+import tensorflow as tf
+import tensorflow_data_validation as tfdv
+import tensorflow_transform as tft
+import tensorflow_transform.beam as tft_beam
+from apache_beam.options.pipeline_options import PipelineOptions
+from tensorflow_transform.tf_metadata import dataset_metadata
+from tfx.components.example_gen import utils
+from tfx.proto import example_gen_pb2
+
+import tfx_utils
+from custom_components.example_gen.src.executor import generate_examples
+from custom_components.file_loader.src import synthetic_kdd99
+from custom_components.instrumentation.src.instrumentation import ProcessTreeRssSampler
+
+DEFAULT_SIZES = [100000, 1000000]
+INPUT_FN_BATCHES = 200
+REGRESSION_THRESHOLD = 0.1
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Scaling benchmark of the kdd_pipe stages')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Numbers of synthetic rows.')
+    parser.add_argument('--source', type=str, default='./kddcup.gz', help='Real data the generator profile is fitted on.')
+    parser.add_argument('--profile', type=str, default='./kdd99_profile.json')
+    parser.add_argument('--work-dir', type=str, default='/tmp/kdd_benchmark')
+    parser.add_argument('--num-workers', type=int, default=0, help='0 means one per CPU.')
+    parser.add_argument('--output', type=str, default=None, help='Result JSON, defaults to <work dir>/<commit>.json.')
+    parser.add_argument('--compare', type=str, nargs=2, default=None, metavar=('BASELINE', 'CANDIDATE'),
+                        help='Compares two result files instead of running the benchmark.')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Relative slowdown of rows/sec reported as regression.')
+
+    return parser.parse_args()
+
+
+def _git_commit() -> Text:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _beam_args(num_workers: int) -> List[Text]:
+    return ['--direct_running_mode=multi_processing', f'--direct_num_workers={num_workers}']
+
+
+def timed(stage: Text, rows: int, function: Callable[[], Any]) -> Dict[Text, Any]:
+    sampler = ProcessTreeRssSampler()
+    sampler.start()
+    start = time.time()
+    try:
+        function()
+    finally:
+        seconds = time.time() - start
+        peak_rss = sampler.stop()
+    result = {'stage': stage, 'rows': rows, 'seconds': seconds, 'rows_per_sec': rows / max(seconds, 1e-9),
+              'peak_rss_mib': peak_rss / (1 << 20)}
+    print(f"  {stage:<18}{seconds:>8.1f}s {result['rows_per_sec']:>12.0f} rows/s {result['peak_rss_mib']:>8.0f} MiB")
+    return result
+
+
+def ingest(csv_dir: Text, examples_dir: Text, num_workers: int) -> Dict[Text, int]:
+    input_config = utils.make_default_input_config()
+    output_config = utils.make_default_output_config(input_config)
+    split_uris = {split.name: os.path.join(examples_dir, split.name) for split in output_config.split_config.splits}
+    return generate_examples(csv_dir, input_config, output_config, split_uris, num_workers)
+
+
+def compute_statistics(examples_pattern: Text, num_workers: int):
+    return tfdv.generate_statistics_from_tfrecord(
+        data_location=examples_pattern, pipeline_options=PipelineOptions(_beam_args(num_workers)))
+
+
+def analyze_and_transform(examples_pattern: Text, schema, output_dir: Text, num_workers: int) -> None:
+    raw_metadata = dataset_metadata.DatasetMetadata(schema)
+    with beam.Pipeline(options=PipelineOptions(_beam_args(num_workers))) as pipeline:
+        with tft_beam.Context(temp_dir=os.path.join(output_dir, 'tmp')):
+            raw_data = (pipeline
+                        | 'Read' >> beam.io.ReadFromTFRecord(examples_pattern)
+                        | 'Decode' >> beam.Map(tft.coders.ExampleProtoCoder(schema).decode))
+            (transformed_data, transformed_metadata), transform_fn = (
+                (raw_data, raw_metadata) | tft_beam.AnalyzeAndTransformDataset(tfx_utils.preprocessing_fn))
+            _ = (transformed_data
+                 | 'Encode' >> beam.Map(tft.coders.ExampleProtoCoder(transformed_metadata.schema).encode)
+                 | 'Write' >> beam.io.WriteToTFRecord(os.path.join(output_dir, 'transformed', 'data'),
+                                                      file_name_suffix='.gz'))
+            _ = transform_fn | tft_beam.WriteTransformFn(os.path.join(output_dir, 'transform_fn'))
+
+
+def read_input_fn(transformed_pattern: Text, transform_output_dir: Text, batches: int) -> None:
+    tf_transform_output = tft.TFTransformOutput(transform_output_dir)
+    dataset = tfx_utils._input_fn([transformed_pattern], tf_transform_output)
+    for _ in dataset.take(batches):
+        pass
+
+
+def run_size(rows: int, profile: Dict[Text, Any], work_dir: Text, num_workers: int) -> List[Dict[Text, Any]]:
+    size_dir = os.path.join(work_dir, str(rows))
+    shutil.rmtree(size_dir, ignore_errors=True)
+    csv_dir, examples_dir = os.path.join(size_dir, 'csv'), os.path.join(size_dir, 'examples')
+    transform_dir = os.path.join(size_dir, 'transform')
+    print(f"{rows} rows:")
+    results = [timed('generate', rows, lambda: synthetic_kdd99.generate(profile, rows, csv_dir, num_workers))]
+
+    counts = {}
+    results.append(timed('ingestion', rows, lambda: counts.update(ingest(csv_dir, examples_dir, num_workers))))
+    train_pattern = os.path.join(examples_dir, 'train', '*')
+    statistics = []
+    results.append(timed('statistics', counts['train'],
+                         lambda: statistics.append(compute_statistics(train_pattern, num_workers))))
+    schema = tfdv.infer_schema(statistics[0])
+    results.append(timed('preprocessing_fn', counts['train'],
+                         lambda: analyze_and_transform(train_pattern, schema, transform_dir, num_workers)))
+    batches = min(INPUT_FN_BATCHES, counts['train'] // tfx_utils.DEFAULT_BATCH_SIZE)
+    results.append(timed('input_fn', batches * tfx_utils.DEFAULT_BATCH_SIZE,
+                         lambda: read_input_fn(os.path.join(transform_dir, 'transformed', '*'),
+                                               os.path.join(transform_dir, 'transform_fn'), batches)))
+    for result in results:
+        result['size'] = rows
+    shutil.rmtree(size_dir, ignore_errors=True)
+    return results
+
+
+def compare(baseline_path: Text, candidate_path: Text, threshold: float) -> List[Text]:
+    """Prints the rows/sec ratio per size and stage; returns the stages that regressed."""
+    with open(baseline_path) as baseline_file, open(candidate_path) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+    baseline_results = {(result['size'], result['stage']): result for result in baseline['results']}
+    regressions = []
+    print(f"{baseline['commit']} -> {candidate['commit']}")
+    for result in candidate['results']:
+        before = baseline_results.get((result['size'], result['stage']))
+        if before is None:
+            continue
+        ratio = result['rows_per_sec'] / max(before['rows_per_sec'], 1e-9)
+        name = f"{result['stage']}@{result['size']}"
+        marker = ''
+        if ratio < 1 - threshold:
+            regressions.append(name)
+            marker = '  REGRESSION'
+        print(f"  {name:<28}{before['rows_per_sec']:>12.0f} -> {result['rows_per_sec']:>12.0f} rows/s "
+              f"({ratio:.2f}x){marker}")
+    return regressions
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if args.compare:
+        regressed = compare(args.compare[0], args.compare[1], args.threshold)
+        raise SystemExit(1 if regressed else 0)
+
+    num_workers = args.num_workers or os.cpu_count() or 1
+    profile = synthetic_kdd99.load_profile(args.profile, args.source)
+    commit = _git_commit()
+    all_results = []
+    for size in args.sizes:
+        all_results.extend(run_size(size, profile, args.work_dir, num_workers))
+    output = args.output or os.path.join(args.work_dir, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump({'commit': commit, 'time': time.time(), 'host': platform.node(), 'cpus': os.cpu_count(),
+                   'num_workers': num_workers, 'results': all_results}, output_file, indent=2)
+    print(f"Results written to {output}")
@@ -0,0 +1,292 @@
+"""
+Validation of raw KDD99 csv files before they enter the pipeline.
+
+Every row must have the 42 columns of KDD99_HEADER, every `num_*` cell must be a number and, given
+value sets, every other cell must be a value seen before. Value sets come from the schema of a
+previous SchemaGen run (schema.pbtxt, string domains) or from a JSON file written with
+--write-value-sets from data known to be good.
+
+Uncompressed files are split at line boundaries into ranges that worker processes check in large
+blocks. A block is first matched with one regular expression for the whole row layout, with the
+allowed values of the categorical cells spelled out; only blocks with a mismatch are checked row by
+row to locate the errors. Validation stops after the first --max-errors errors, which are reported
+with file and line number.
+
+Usage: python -m custom_components.3_example_validator.src.csv_validator --schema schema.pbtxt data/train
+"""
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER, open_input
+
+COLUMNS = KDD99_HEADER.split(',')
+DEFAULT_MAX_ERRORS = 20
+RANGE_BYTES = 64 << 20
+BLOCK_BYTES = 8 << 20
+_NUMBER = rb'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_NUMBER_RE = re.compile(_NUMBER + rb'$')
+# Cells like '1.2.3' or '.' match the loose numbers of the fast path but are no numbers.
+_MULTIPLE_DOTS = re.compile(rb'\.[0-9]*\.')
+_LONE_DOTS = (b',.,', b',.\n', b',.\r', b'\n.,')
+_CELLS = re.compile(rb'^' + rb','.join(rb'[^,\r\n]*' if column.startswith('num_') else rb'([^,\r\n]*)'
+                                       for column in COLUMNS) + rb'\r?$', re.MULTILINE)
+
+
+class ValidationError(NamedTuple):
+    path: str
+    line: int  # 1-based, counting headers and blank lines
+    column: str
+    message: str
+
+
+class ValidationReport(NamedTuple):
+    rows: int
+    bytes: int
+    seconds: float
+    errors: List[ValidationError]
+
+
+class _Range(NamedTuple):
+    path: str
+    start: int
+    end: int  # -1 reads to the end of the file
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Fast validator of raw KDD99 csv files')
+    parser.add_argument('inputs', type=str, nargs='+', help='Csv files or directories, optionally gzipped.')
+    parser.add_argument('--schema', type=str, default=None,
+                        help='schema.pbtxt of SchemaGen or JSON value sets with the allowed categorical values.')
+    parser.add_argument('--max-errors', type=int, default=DEFAULT_MAX_ERRORS)
+    parser.add_argument('--num-workers', type=int, default=0, help='0 means one per CPU.')
+    parser.add_argument('--write-value-sets', type=str, default=None,
+                        help='Writes the categorical values of the inputs as JSON value sets instead of validating.')
+
+    return parser.parse_args()
+
+
+def load_value_sets(path: str) -> Dict[str, Set[bytes]]:
+    """Allowed values per categorical column, from JSON value sets or the string domains of a TFDV schema."""
+    if path.endswith('.json'):
+        with open(path) as value_sets_file:
+            return {column: {value.encode() for value in values}
+                    for column, values in json.load(value_sets_file).items()}
+    from google.protobuf import text_format
+    from tensorflow_metadata.proto.v0 import schema_pb2
+
+    schema = schema_pb2.Schema()
+    with open(path, 'rb') as schema_file:
+        content = schema_file.read()
+    if path.endswith('.pbtxt'):
+        text_format.Parse(content.decode(), schema)
+    else:
+        schema.ParseFromString(content)
+    domains = {domain.name: domain for domain in schema.string_domain}
+    value_sets = {}
+    for feature in schema.feature:
+        name = feature.name or feature.path.step[-1]
+        domain = feature.string_domain if feature.HasField('string_domain') else domains.get(feature.domain)
+        if domain is not None:
+            value_sets[name] = {value.encode() for value in domain.value}
+    return value_sets
+
+
+def input_files(inputs: Sequence[str]) -> List[str]:
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(sorted(os.path.join(directory, filename)
+                                for directory, _, filenames in os.walk(path) for filename in filenames))
+        else:
+            paths.append(path)
+    return paths
+
+
+def plan_ranges(paths: Sequence[str], range_bytes: int = RANGE_BYTES) -> List[_Range]:
+    """Splits uncompressed files at line boundaries, gzipped files are checked as a whole."""
+    ranges = []
+    for path in paths:
+        with open_input(path) as file:
+            compressed = isinstance(file, gzip.GzipFile)
+        if compressed:
+            ranges.append(_Range(path, 0, -1))
+            continue
+        size = os.path.getsize(path)
+        boundaries = {0}
+        with open(path, 'rb') as file:
+            for offset in range(range_bytes, size, range_bytes):
+                file.seek(offset - 1)
+                file.readline()
+                boundaries.add(file.tell())
+        boundaries = sorted(boundary for boundary in boundaries if boundary < size) + [size]
+        ranges.extend(_Range(path, start, end) for start, end in zip(boundaries, boundaries[1:]))
+    return ranges
+
+
+def _blocks(item: _Range, block_bytes: int = BLOCK_BYTES) -> Iterator[bytes]:
+    """Whole lines of a range in blocks of about `block_bytes`, every block ending with a newline."""
+    with open_input(item.path) as file:
+        file.seek(item.start)
+        remaining = item.end - item.start if item.end >= 0 else -1
+        rest = b''
+        while remaining != 0:
+            data = file.read(block_bytes if remaining < 0 else min(block_bytes, remaining))
+            if not data:
+                break
+            if remaining > 0:
+                remaining -= len(data)
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            if cut:
+                yield data[:cut]
+            rest = data[cut:]
+        if rest:
+            yield rest + b'\n'
+
+
+class _Checker:
+    """Checks blocks of csv lines, regex fast path first."""
+
+    def __init__(self, value_sets: Dict[str, Set[bytes]]):
+        self.value_sets = value_sets
+        self.categorical = [i for i, column in enumerate(COLUMNS) if not column.startswith('num_')]
+        # The fast path accepts plain decimals and the exact allowed values only; anything else, like
+        # signs, exponents or a cell of dots only or more than one dot, is left to line_errors.
+        cells = [rb'[\d.]+' if column.startswith('num_') else self._cell(column) for column in COLUMNS]
+        self.row_re = re.compile(rb'^' + rb','.join(cells) + rb'\r?$', re.MULTILINE)
+        self.header = KDD99_HEADER.encode()
+
+    def _cell(self, column: str) -> bytes:
+        allowed = self.value_sets.get(column)
+        if allowed is None:
+            return rb'[^,\r\n]*'
+        # Longest values first, so a value is never cut short by one of its prefixes.
+        return rb'(?:' + rb'|'.join(re.escape(value) for value in sorted(allowed, key=len, reverse=True)) + rb')'
+
+    def block_is_valid(self, block: bytes, lines: int) -> bool:
+        if block.startswith(b'.,') or any(dot in block for dot in _LONE_DOTS) or _MULTIPLE_DOTS.search(block):
+            return False
+        return self.row_re.subn(b'', block)[1] == lines
+
+    def line_errors(self, line: bytes) -> List[Tuple[str, str]]:
+        """(column, message) of every problem of one line, empty for valid rows and headers."""
+        line = line.rstrip(b'\r')
+        if not line or line == self.header:
+            return []
+        cells = line.split(b',')
+        if len(cells) != len(COLUMNS):
+            return [('', f"expected {len(COLUMNS)} columns, found {len(cells)}")]
+        errors = []
+        for column, cell in zip(COLUMNS, cells):
+            if column.startswith('num_'):
+                if not _NUMBER_RE.match(cell):
+                    errors.append((column, f"not a number: {cell.decode(errors='replace')!r}"))
+            elif column in self.value_sets and cell not in self.value_sets[column]:
+                kind = 'label' if column.startswith('label') else 'value'
+                errors.append((column, f"unseen {kind} {cell.decode(errors='replace')!r}"))
+        return errors
+
+
+def _validate_range(task) -> Tuple[int, int, int, List[Tuple[int, str, str]]]:
+    """Returns lines, data rows and bytes of a range and its first errors with 0-based line offsets."""
+    item, value_sets, max_errors = task
+    checker = _Checker(value_sets)
+    lines = rows = size = 0
+    errors = []
+    for block in _blocks(item):
+        block_lines = block.count(b'\n')
+        # Blank lines and headers do not match the row layout and take the slow path.
+        if checker.block_is_valid(block, block_lines):
+            rows += block_lines
+        else:
+            for offset, line in enumerate(block.split(b'\n')[:block_lines]):
+                line_errors = checker.line_errors(line)
+                errors.extend((lines + offset, column, message) for column, message in line_errors)
+                if not line_errors and line.rstrip(b'\r') not in (b'', checker.header):
+                    rows += 1
+        lines += block_lines
+        size += len(block)
+        if len(errors) >= max_errors:
+            break
+    return lines, rows, size, errors[:max_errors]
+
+
+def validate(paths: Sequence[str], value_sets: Optional[Dict[str, Set[bytes]]] = None,
+             max_errors: int = DEFAULT_MAX_ERRORS, num_workers: int = 0) -> ValidationReport:
+    """Checks the csv files in parallel and stops after the first `max_errors` errors.
+
+    Args:
+      paths: Csv files, with or without header, optionally gzipped.
+      value_sets: Allowed values per categorical column, see `load_value_sets`. Columns without a
+        value set accept any value.
+      max_errors: Number of errors after which validation stops.
+      num_workers: Number of worker processes, 0 means one per CPU.
+    Returns:
+      Rows and bytes read and the first errors in file and line order.
+    """
+    start = time.time()
+    ranges = plan_ranges(paths)
+    tasks = [(item, value_sets or {}, max_errors) for item in ranges]
+    errors = []
+    rows = size = 0
+    line_base = {}  # type: Dict[str, int]
+    num_workers = min(num_workers or os.cpu_count() or 1, max(len(tasks), 1))
+    with multiprocessing.Pool(num_workers) as pool:
+        # Ordered results give the line numbers, and the first errors are known as soon as they arrive.
+        for item, (lines, range_rows, range_bytes, range_errors) in zip(ranges, pool.imap(_validate_range, tasks)):
+            base = line_base.get(item.path, 0)
+            errors.extend(ValidationError(item.path, base + offset + 1, column, message)
+                          for offset, column, message in range_errors)
+            line_base[item.path] = base + lines
+            rows += range_rows
+            size += range_bytes
+            if len(errors) >= max_errors:
+                pool.terminate()
+                break
+    return ValidationReport(rows, size, time.time() - start, errors[:max_errors])
+
+
+def write_value_sets(paths: Sequence[str], output: str) -> Dict[str, List[str]]:
+    """Collects the values of the categorical columns of trusted data as JSON value sets."""
+    categorical = [i for i, column in enumerate(COLUMNS) if not column.startswith('num_')]
+    values = {COLUMNS[index]: set() for index in categorical}
+    header = tuple(COLUMNS[index].encode() for index in categorical)
+    for item in plan_ranges(paths):
+        for block in _blocks(item):
+            for match in _CELLS.findall(block):
+                if match == header:
+                    continue
+                for index, value in zip(categorical, match):
+                    values[COLUMNS[index]].add(value.decode())
+    value_sets = {column: sorted(column_values) for column, column_values in values.items()}
+    with open(output, 'w') as output_file:
+        json.dump(value_sets, output_file, indent=2)
+    return value_sets
+
+
+def format_report(report: ValidationReport) -> str:
+    lines = [f"Checked {report.rows} rows ({report.bytes / (1 << 20):.1f} MiB) in {report.seconds:.2f}s "
+             f"({report.bytes / (1 << 20) / max(report.seconds, 1e-9):.0f} MiB/s), {len(report.errors)} errors"]
+    lines.extend(f"  {error.path}:{error.line}: {error.column + ': ' if error.column else ''}{error.message}"
+                 for error in report.errors)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    files = input_files(args.inputs)
+    if args.write_value_sets:
+        written = write_value_sets(files, args.write_value_sets)
+        print(f"Wrote value sets of {len(written)} columns to {args.write_value_sets}")
+        sys.exit(0)
+    result = validate(files, load_value_sets(args.schema) if args.schema else None, args.max_errors,
+                      args.num_workers)
+    print(format_report(result))
+    sys.exit(1 if result.errors else 0)
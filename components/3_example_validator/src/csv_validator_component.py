@@ -0,0 +1,52 @@
+import importlib
+from typing import Optional, Text
+
+from tfx import types
+from tfx.components.base import executor_spec
+from tfx.components.base.base_component import BaseComponent
+from tfx.components.example_gen import utils
+from tfx.proto import example_gen_pb2
+from tfx.types import ComponentSpec, channel_utils, component_spec, standard_artifacts
+from tfx.types.artifact import Artifact
+
+executor = importlib.import_module('custom_components.3_example_validator.src.executor')
+
+
+class CsvValidationReport(Artifact):
+    """Rows checked and first errors of the raw csv files, as report.json."""
+    TYPE_NAME = 'CsvValidationReport'
+
+
+class CsvValidator(BaseComponent):
+    """Checks the raw KDD99 csv files before ExampleGen converts them.
+
+    Takes the `input` and `input_config` of the ExampleGen it guards and fails on malformed rows,
+    non-numeric `num_*` cells and, given `value_sets_path`, unseen categorical values or labels.
+    Make the ExampleGen depend on it with `example_gen.add_upstream_node(csv_validator)`.
+    """
+
+    class _ComponentSpec(ComponentSpec):
+        INPUTS = {
+            'input': component_spec.ChannelParameter(type=standard_artifacts.ExternalArtifact),
+        }
+        OUTPUTS = {
+            'report': component_spec.ChannelParameter(type=CsvValidationReport),
+        }
+        PARAMETERS = {
+            'input_config': component_spec.ExecutionParameter(type=example_gen_pb2.Input),
+            # schema.pbtxt of a previous SchemaGen run or JSON value sets, see csv_validator.py.
+            'value_sets_path': component_spec.ExecutionParameter(type=Text, optional=True),
+            'max_errors': component_spec.ExecutionParameter(type=int, optional=True),
+        }
+
+    SPEC_CLASS = _ComponentSpec
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
+
+    def __init__(self, input: types.Channel,  # pylint: disable=redefined-builtin
+                 input_config: Optional[example_gen_pb2.Input] = None, value_sets_path: Optional[str] = None,
+                 max_errors: Optional[int] = None):
+        spec = self._ComponentSpec(input=input, report=channel_utils.as_channel([CsvValidationReport()]),
+                                   input_config=input_config or utils.make_default_input_config(),
+                                   value_sets_path=value_sets_path, max_errors=max_errors)
+        super(CsvValidator, self).__init__(spec)
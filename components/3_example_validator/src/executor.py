@@ -0,0 +1,72 @@
+import glob
+import importlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Text, Tuple
+
+import absl
+from google.protobuf import json_format
+from tfx import types
+from tfx.components.base import base_executor
+from tfx.components.example_gen import utils
+from tfx.proto import example_gen_pb2
+from tfx.types import artifact_utils
+
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+from custom_components.resource_planner.src import resource_planner
+
+csv_validator = importlib.import_module('custom_components.3_example_validator.src.csv_validator')
+
+REPORT_FILE_NAME = 'report.json'
+
+
+def input_files(input_base: Text, splits: Iterable[example_gen_pb2.Input.Split]) -> Tuple[List[Text], Text]:
+    """The files of every split and their span. {SPAN} resolves to the latest span like in the
+    ExampleGen driver, so the files ExampleGen is going to read are checked.
+
+    Raises:
+      ValueError: If a split matches no files.
+    """
+    # The driver's helper may rewrite the patterns of the splits it is given, so it gets copies.
+    patterns = [(split.name, split.pattern) for split in splits]
+    _, span = utils.calculate_splits_fingerprint_and_span(
+        input_base, [example_gen_pb2.Input.Split(name=name, pattern=pattern) for name, pattern in patterns])
+    paths = set()
+    for name, pattern in patterns:
+        pattern = os.path.join(input_base, pattern.replace(utils.SPAN_SPEC, span))
+        split_paths = [path for path in glob.glob(pattern) if os.path.isfile(path)]
+        if not split_paths:
+            raise ValueError('Split {} matches no files: {}'.format(name, pattern))
+        paths.update(split_paths)
+    return sorted(paths), span
+
+
+class Executor(InstrumentedExecutorMixin, base_executor.BaseExecutor):
+    """Validates the raw csv files that ExampleGen is going to read and fails on the first errors."""
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        self._log_startup(input_dict, output_dict, exec_properties)
+        with self.span('resolve'):
+            input_config = example_gen_pb2.Input()
+            json_format.Parse(exec_properties['input_config'], input_config)
+            input_base = artifact_utils.get_single_uri(input_dict['input'])
+            paths, span = input_files(input_base, input_config.splits)
+            value_sets_path = exec_properties.get('value_sets_path')
+            value_sets = csv_validator.load_value_sets(value_sets_path) if value_sets_path else None
+        with self.span('compute'):
+            report = csv_validator.validate(paths, value_sets,
+                                            exec_properties.get('max_errors') or csv_validator.DEFAULT_MAX_ERRORS,
+                                            resource_planner.num_workers(self._beam_pipeline_args))
+        self.add_rows(report.rows)
+
+        report_uri = artifact_utils.get_single_uri(output_dict['report'])
+        os.makedirs(report_uri, exist_ok=True)
+        with open(os.path.join(report_uri, REPORT_FILE_NAME), 'w') as report_file:
+            json.dump({'span': span, 'files': paths, 'rows': report.rows, 'bytes': report.bytes,
+                       'seconds': report.seconds, 'errors': [error._asdict() for error in report.errors]},
+                      report_file, indent=2)
+        absl.logging.info(csv_validator.format_report(report))
+        if report.errors:
+            raise ValueError('Invalid input csv files:\n' + csv_validator.format_report(report))
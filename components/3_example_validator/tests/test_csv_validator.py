@@ -0,0 +1,38 @@
+import importlib
+
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER
+
+csv_validator = importlib.import_module('custom_components.3_example_validator.src.csv_validator')
+
+ROW = "0,tcp,http,SF,181,5450,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,8,8,0.00,0.00,0.00,0.00,1.00,0.00,0.00,9,9,1.00,0.00," \
+      "0.11,0.00,0.00,0.00,0.00,0.00,normal."
+
+
+def write_csv(path, rows):
+    path.write_text(KDD99_HEADER + "\n" + "\n".join(rows) + "\n")
+    return str(path)
+
+
+def test_accepts_valid_rows_and_collects_value_sets(tmp_path):
+    # given
+    path = write_csv(tmp_path / "valid.csv", [ROW, ROW.replace("http", "smtp"), ROW.replace("normal.", "smurf.")])
+    written = csv_validator.write_value_sets([path], str(tmp_path / "value_sets.json"))
+    # when
+    report = csv_validator.validate([path], csv_validator.load_value_sets(str(tmp_path / "value_sets.json")),
+                                    num_workers=1)
+    # then
+    assert written["application_protocol"] == ["http", "smtp"] and written["label_0"] == ["normal.", "smurf."]
+    assert report.rows == 3 and report.errors == []
+
+
+def test_reports_first_errors_with_line_numbers(tmp_path):
+    # given
+    value_sets = {"label_0": {b"normal."}}
+    rows = [ROW] * 5 + [ROW.replace("181", "1.8.1"), ROW + ",0", ROW.replace("normal.", "satan."),
+                        ROW.replace("5450", "x")]
+    path = write_csv(tmp_path / "invalid.csv", rows)
+    # when
+    report = csv_validator.validate([path], value_sets, max_errors=3, num_workers=1)
+    # then
+    assert [(error.line, error.column) for error in report.errors] == [(7, "num_1"), (8, ""), (9, "label_0")]
+    assert report.errors[2].message == "unseen label 'satan.'"
@@ -0,0 +1,32 @@
+import importlib
+
+import pytest
+from tfx.proto import example_gen_pb2
+
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER
+
+executor = importlib.import_module('custom_components.3_example_validator.src.executor')
+
+
+def test_checks_the_files_of_the_latest_span(tmp_path):
+    # given
+    for span in (1, 2):
+        (tmp_path / f"span-{span}").mkdir()
+        (tmp_path / f"span-{span}" / "kddcup.csv").write_text(KDD99_HEADER + "\n")
+    splits = [example_gen_pb2.Input.Split(name="single_split", pattern="span-{SPAN}/*")]
+    # when
+    paths, span = executor.input_files(str(tmp_path), splits)
+    # then
+    assert span == "2"
+    assert paths == [str(tmp_path / "span-2" / "kddcup.csv")]
+
+
+def test_fails_on_a_split_without_files(tmp_path):
+    # given
+    (tmp_path / "span-1").mkdir()
+    (tmp_path / "span-1" / "kddcup.csv").write_text(KDD99_HEADER + "\n")
+    splits = [example_gen_pb2.Input.Split(name="train", pattern="span-{SPAN}/*"),
+              example_gen_pb2.Input.Split(name="eval", pattern="eval/*")]
+    # when / then
+    with pytest.raises(ValueError, match="Split eval matches no files"):
+        executor.input_files(str(tmp_path), splits)
@@ -0,0 +1,33 @@
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_transform.beam as tft_beam
+from tensorflow_transform.tf_metadata import dataset_metadata, schema_utils
+
+import tfx_utils
+
+FEATURE_SPEC = {key: tf.io.FixedLenFeature([1], tf.float32) for key in tfx_utils.NUMERICAL_KEYS}
+
+
+def analyze_and_transform(preprocessing_fn, instances):
+    metadata = dataset_metadata.DatasetMetadata(schema_utils.schema_from_feature_spec(FEATURE_SPEC))
+    with tft_beam.Context(temp_dir=tempfile.mkdtemp()):
+        (transformed, _), _ = ((instances, metadata) | tft_beam.AnalyzeAndTransformDataset(preprocessing_fn))
+    return transformed
+
+
+def test_fused_analyzers_match_per_key_output():
+    # given
+    random = np.random.RandomState(0)
+    instances = [{key: [float(random.choice([0, 1, 5, 1e6]) * random.rand())] for key in tfx_utils.NUMERICAL_KEYS}
+                 for _ in range(200)]
+    for instance in instances:
+        instance["num_7"] = [3.]  # constant column
+    # when
+    per_key = analyze_and_transform(tfx_utils._scale_numerical_per_key, instances)
+    fused = analyze_and_transform(tfx_utils._scale_numerical_fused, instances)
+    # then
+    for per_key_row, fused_row in zip(per_key, fused):
+        for key in tfx_utils.NUMERICAL_KEYS:
+            np.testing.assert_allclose(fused_row[key], per_key_row[key], atol=1e-5)
@@ -0,0 +1,137 @@
+import os
+import tempfile
+
+import apache_beam as beam
+import numpy as np
+import tensorflow as tf
+import tensorflow_transform as tft
+import tensorflow_transform.beam as tft_beam
+from tensorflow_transform.tf_metadata import dataset_metadata, schema_utils
+from tfx.components.trainer.executor import TrainerFnArgs
+
+import tfx_utils
+
+LABEL_KEY = tfx_utils.LABEL_KEYS[0]
+PROTOCOLS = [b"tcp", b"udp", b"icmp"]
+
+
+def feature_spec(weighted):
+    spec = {key: tf.io.VarLenFeature(tf.float32) for key in tfx_utils.NUMERICAL_KEYS}
+    spec.update({key: tf.io.VarLenFeature(tf.string) for key in tfx_utils.CATEGORICAL_KEYS + [LABEL_KEY]})
+    if weighted:
+        spec[tfx_utils.WEIGHT_KEY] = tf.io.VarLenFeature(tf.int64)
+    return spec
+
+
+def instances(num_rows, weighted=False):
+    random = np.random.RandomState(0)
+    rows = []
+    for i in range(num_rows):
+        row = {key: [float(random.rand() * 100)] for key in tfx_utils.NUMERICAL_KEYS}
+        row.update({key: [PROTOCOLS[i % len(PROTOCOLS)]] for key in tfx_utils.CATEGORICAL_KEYS})
+        row[LABEL_KEY] = [b"smurf." if i % 3 == 2 else b"normal."]
+        if weighted:
+            row[tfx_utils.WEIGHT_KEY] = [i % 4 + 1]
+        rows.append(row)
+    return rows
+
+
+def serialized(instance):
+    example = tf.train.Example()
+    for key, values in instance.items():
+        if isinstance(values[0], bytes):
+            example.features.feature[key].bytes_list.value.extend(values)
+        elif isinstance(values[0], int):
+            example.features.feature[key].int64_list.value.extend(values)
+        else:
+            example.features.feature[key].float_list.value.extend(values)
+    return example.SerializeToString()
+
+
+def write_transform(transform_dir, rows, weighted=False):
+    metadata = dataset_metadata.DatasetMetadata(schema_utils.schema_from_feature_spec(feature_spec(weighted)))
+    with beam.Pipeline() as pipeline, tft_beam.Context(temp_dir=tempfile.mkdtemp()):
+        transform_fn = ((pipeline | beam.Create(rows), metadata) | tft_beam.AnalyzeDataset(tfx_utils.preprocessing_fn))
+        _ = transform_fn | tft_beam.WriteTransformFn(transform_dir)
+    return tft.TFTransformOutput(transform_dir)
+
+
+def write_transformed_examples(tf_transform_output, rows, path, compression_type):
+    """Writes the rows like Transform does: transformed, one tf.Example each."""
+    raw = tf.io.parse_example(tf.constant([serialized(row) for row in rows]), tf_transform_output.raw_feature_spec())
+    transformed = {key: value.numpy() for key, value in tf_transform_output.transform_features_layer()(raw).items()}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tf.io.TFRecordWriter(path, tf.io.TFRecordOptions(compression_type=compression_type)) as writer:
+        for i in range(len(rows)):
+            example = tf.train.Example()
+            for key, values in transformed.items():
+                if values.dtype.kind == 'f':
+                    example.features.feature[key].float_list.value.append(float(values[i]))
+                else:
+                    example.features.feature[key].int64_list.value.append(int(values[i]))
+            writer.write(example.SerializeToString())
+    return path
+
+
+def test_reads_batches_of_gzipped_and_uncompressed_examples(tmp_path):
+    # given
+    rows = instances(60)
+    tf_transform_output = write_transform(str(tmp_path / "transform"), rows)
+    patterns = [write_transformed_examples(tf_transform_output, rows, str(tmp_path / "plain" / "part-0"), ""),
+                write_transformed_examples(tf_transform_output, rows, str(tmp_path / "gzip" / "part-0.gz"), "GZIP")]
+    # when
+    batches = [next(iter(tfx_utils._input_fn([pattern], tf_transform_output, batch_size=8, shuffle_buffer=0)))
+               for pattern in patterns]
+    # then
+    for batch in batches:
+        assert len(batch) == 2
+        features, label = batch
+        assert LABEL_KEY not in features
+        assert set(features) == set(tfx_utils.NUMERICAL_KEYS + tfx_utils.CATEGORICAL_KEYS)
+        assert label.shape == (8,) and features["num_0"].shape == (8,) and features["cat_0"].shape == (8,)
+    np.testing.assert_array_equal(batches[0][1], batches[1][1])
+    np.testing.assert_array_equal(batches[0][0]["num_0"], batches[1][0]["num_0"])
+
+
+def test_returns_the_weight_as_third_element(tmp_path):
+    # given
+    rows = instances(60, weighted=True)
+    tf_transform_output = write_transform(str(tmp_path / "transform"), rows, weighted=True)
+    pattern = write_transformed_examples(tf_transform_output, rows, str(tmp_path / "gzip" / "part-0.gz"), "GZIP")
+    # when
+    features, label, weight = next(iter(tfx_utils._input_fn([pattern], tf_transform_output, batch_size=8,
+                                                            shuffle_buffer=0)))
+    # then
+    assert tfx_utils.WEIGHT_KEY not in features and LABEL_KEY not in features
+    assert label.shape == (8,)
+    assert weight.numpy().tolist() == [row[tfx_utils.WEIGHT_KEY][0] for row in rows[:8]]
+
+
+def test_missing_custom_config_keys_fall_back_to_their_default():
+    # given
+    fn_args = TrainerFnArgs(batch_size=16)
+    # when
+    batch_size = tfx_utils._fn_arg(fn_args, 'batch_size', tfx_utils.DEFAULT_BATCH_SIZE)
+    shuffle_buffer = tfx_utils._fn_arg(fn_args, 'shuffle_buffer', tfx_utils.SHUFFLE_BUFFER)
+    # then
+    assert batch_size == 16
+    assert shuffle_buffer == tfx_utils.SHUFFLE_BUFFER
+
+
+def test_run_fn_exports_a_serving_signature(tmp_path):
+    # given
+    rows = instances(60)
+    transform_dir = str(tmp_path / "transform")
+    tf_transform_output = write_transform(transform_dir, rows)
+    pattern = write_transformed_examples(tf_transform_output, rows, str(tmp_path / "gzip" / "part-0.gz"), "GZIP")
+    fn_args = TrainerFnArgs(train_files=[pattern], eval_files=[pattern], transform_output=transform_dir,
+                            serving_model_dir=str(tmp_path / "serving"), train_steps=3, eval_steps=1,
+                            batch_size=8, shuffle_buffer=16, input_benchmark_steps=2)
+    # when
+    tfx_utils.run_fn(fn_args)
+    # then
+    serve = tf.saved_model.load(str(tmp_path / "serving")).signatures['serving_default']
+    outputs = serve(examples=tf.constant([serialized(row) for row in rows[:5]]))
+    probabilities = next(iter(outputs.values())).numpy()
+    assert probabilities.shape == (5, tfx_utils._vocabulary_size(tf_transform_output, LABEL_KEY))
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1., rtol=1e-5)
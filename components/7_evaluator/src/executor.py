@@ -0,0 +1,129 @@
+"""
+Sliced evaluation of the trained classifier on one split of an Examples artifact.
+
+The TFRecord shards, of any codec of example_codec.py, are spread over spawned worker processes. Every worker loads the
+serving model once, runs it on whole batches of serialized examples and adds the batch to the
+confusion matrices of all slices at once (see sliced_metrics.py); the parent merges the workers'
+matrices. Writes to the `evaluation` artifact:
+
+    metrics.json     count, accuracy and per class precision and recall of every slice
+    confusion.json   the merged SlicedConfusion, to merge with the results of other shards
+"""
+import importlib
+import json
+import multiprocessing
+import os
+from typing import Any, Dict, List, NamedTuple, Text
+
+import absl
+import tensorflow as tf
+import tensorflow_transform as tft
+from tfx import types
+from tfx.components.base import base_executor
+from tfx.types import artifact_utils
+from tfx.utils import io_utils, path_utils
+
+from custom_components.example_codec.src import example_codec
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+from custom_components.resource_planner.src import resource_planner
+
+sliced_metrics = importlib.import_module('custom_components.7_evaluator.src.sliced_metrics')
+
+LABEL_KEY = 'label_0'
+WEIGHT_KEY = 'weight'
+DEFAULT_SLICING_KEYS = ('transport_protocol', 'application_protocol')
+BATCH_SIZE = 4096
+OOV_CLASS = '<oov>'
+METRICS_FILE_NAME = 'metrics.json'
+CONFUSION_FILE_NAME = 'confusion.json'
+
+
+class EvaluationTask(NamedTuple):
+    paths: List[Text]
+    shard: int
+    num_shards: int  # shards of the records of `paths`, if there are fewer files than workers
+    model_dir: Text
+    classes: List[Text]
+    slicing_keys: List[Text]
+    compression_type: Text = example_codec.GZIP
+
+
+def label_classes(transform_graph_uri: Text) -> List[Text]:
+    """Class names in the order of the model outputs: the label vocabulary, then its OOV bucket."""
+    vocabulary = tft.TFTransformOutput(transform_graph_uri).vocabulary_by_name(LABEL_KEY)
+    return [value.decode() if isinstance(value, bytes) else value for value in vocabulary] + [OOV_CLASS]
+
+
+def evaluate_shard(task: EvaluationTask) -> Dict[Text, Any]:
+    """Confusion matrices of one part of the examples, as SlicedConfusion.to_dict."""
+    serve = tf.saved_model.load(task.model_dir).signatures['serving_default']
+    class_ids = {name: i for i, name in enumerate(task.classes[:-1])}
+    feature_spec = {key: tf.io.FixedLenFeature([], tf.string, default_value='')
+                    for key in [LABEL_KEY] + task.slicing_keys}
+    # ExampleDedup writes the occurrence counts as int64_list.
+    feature_spec[WEIGHT_KEY] = tf.io.VarLenFeature(tf.int64)
+    dataset = tf.data.TFRecordDataset(task.paths, compression_type=task.compression_type)
+    if task.num_shards > 1:
+        dataset = dataset.shard(task.num_shards, task.shard)
+    dataset = dataset.batch(BATCH_SIZE).map(
+        lambda records: (records, tf.io.parse_example(records, feature_spec)),
+        num_parallel_calls=tf.data.experimental.AUTOTUNE).prefetch(tf.data.experimental.AUTOTUNE)
+
+    confusion = sliced_metrics.SlicedConfusion(task.classes, task.slicing_keys)
+    for records, features in dataset:
+        outputs = serve(examples=records)
+        predictions = tf.argmax(next(iter(outputs.values())), axis=1).numpy()
+        labels = [class_ids.get(label.decode(), len(class_ids)) for label in features[LABEL_KEY].numpy().tolist()]
+        weights = tf.cast(tf.sparse.to_dense(features[WEIGHT_KEY], default_value=1)[:, 0], tf.float32).numpy() \
+            if features[WEIGHT_KEY].dense_shape[1] else None
+        confusion.update(labels, predictions, {key: features[key].numpy() for key in task.slicing_keys}, weights)
+    return confusion.to_dict()
+
+
+def evaluate(paths: List[Text], model_dir: Text, classes: List[Text], slicing_keys: List[Text],
+             num_workers: int, compression_type: Text = example_codec.GZIP) -> 'sliced_metrics.SlicedConfusion':
+    """Evaluates the examples of `paths` in `num_workers` processes and merges their results."""
+    if len(paths) >= num_workers:
+        tasks = [EvaluationTask(paths[i::num_workers], 0, 1, model_dir, classes, slicing_keys, compression_type)
+                 for i in range(num_workers)]
+    else:
+        tasks = [EvaluationTask(paths, i, num_workers, model_dir, classes, slicing_keys, compression_type)
+                 for i in range(num_workers)]
+    confusion = sliced_metrics.SlicedConfusion(classes, slicing_keys)
+    # Spawned workers start without the TensorFlow runtime state of this process.
+    with multiprocessing.get_context('spawn').Pool(len(tasks)) as pool:
+        for result in pool.imap_unordered(evaluate_shard, tasks):
+            confusion.merge(sliced_metrics.SlicedConfusion.from_dict(result))
+    return confusion
+
+
+class Executor(InstrumentedExecutorMixin, base_executor.BaseExecutor):
+    """Evaluates the serving model per slice on one split of the examples."""
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        self._log_startup(input_dict, output_dict, exec_properties)
+        with self.span('resolve'):
+            split = exec_properties['split']
+            slicing_keys = json.loads(exec_properties['slicing_keys'])
+            split_uri = artifact_utils.get_split_uri(input_dict['examples'], split)
+            paths = sorted(tf.io.gfile.glob(os.path.join(split_uri, '*')))
+            if not paths:
+                raise RuntimeError('Split {} of the examples is empty'.format(split))
+            model_dir = path_utils.serving_model_path(artifact_utils.get_single_uri(input_dict['model']))
+            classes = label_classes(artifact_utils.get_single_uri(input_dict['transform_graph']))
+            compression_type = example_codec.compression_type(
+                artifact_utils.get_single_instance(input_dict['examples']), paths)
+        with self.span('compute'):
+            confusion = evaluate(paths, model_dir, classes, slicing_keys,
+                                 resource_planner.num_workers(self._beam_pipeline_args), compression_type)
+        metrics = confusion.metrics()
+        self.add_rows(metrics['overall']['count'])
+
+        with self.span('write'):
+            evaluation_uri = artifact_utils.get_single_uri(output_dict['evaluation'])
+            io_utils.write_string_file(os.path.join(evaluation_uri, METRICS_FILE_NAME), json.dumps(metrics, indent=2))
+            confusion.save(os.path.join(evaluation_uri, CONFUSION_FILE_NAME))
+        absl.logging.info('Accuracy on {} examples of split {}: {}'.format(
+            metrics['overall']['count'], split, metrics['overall']['accuracy']))
@@ -0,0 +1,52 @@
+import importlib
+import json
+from typing import Optional, Sequence, Text
+
+from tfx import types
+from tfx.components.base import executor_spec
+from tfx.components.base.base_component import BaseComponent
+from tfx.types import ComponentSpec, channel_utils, component_spec, standard_artifacts
+from tfx.types.artifact import Artifact
+
+executor = importlib.import_module('custom_components.7_evaluator.src.executor')
+
+
+class SlicedEvaluation(Artifact):
+    """Metrics and mergeable confusion matrices of every slice, as metrics.json and confusion.json."""
+    TYPE_NAME = 'SlicedEvaluation'
+
+
+class SlicedEvaluator(BaseComponent):
+    """Precision and recall of every attack class, overall and per value of the slicing keys.
+
+    All slices are evaluated in the same single pass over the examples of `split`, spread over one
+    worker process per CPU (or --direct_num_workers of the beam pipeline args).
+    """
+
+    class _ComponentSpec(ComponentSpec):
+        INPUTS = {
+            'examples': component_spec.ChannelParameter(type=standard_artifacts.Examples),
+            'model': component_spec.ChannelParameter(type=standard_artifacts.Model),
+            'transform_graph': component_spec.ChannelParameter(type=standard_artifacts.TransformGraph),
+        }
+        OUTPUTS = {
+            'evaluation': component_spec.ChannelParameter(type=SlicedEvaluation),
+        }
+        PARAMETERS = {
+            'split': component_spec.ExecutionParameter(type=Text),
+            # JSON list of the categorical keys to slice by.
+            'slicing_keys': component_spec.ExecutionParameter(type=Text),
+        }
+
+    SPEC_CLASS = _ComponentSpec
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
+
+    def __init__(self, examples: types.Channel, model: types.Channel, transform_graph: types.Channel,
+                 split: str = 'eval', slicing_keys: Optional[Sequence[str]] = None):
+        if slicing_keys is None:
+            slicing_keys = executor.DEFAULT_SLICING_KEYS
+        spec = self._ComponentSpec(examples=examples, model=model, transform_graph=transform_graph,
+                                   evaluation=channel_utils.as_channel([SlicedEvaluation()]), split=split,
+                                   slicing_keys=json.dumps(list(slicing_keys)))
+        super(SlicedEvaluator, self).__init__(spec)
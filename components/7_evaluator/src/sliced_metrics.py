@@ -0,0 +1,120 @@
+"""
+Confusion matrices of many slices, accumulated together from batches of (label, prediction) ids.
+
+A slice is a value of a slicing key, e.g. transport_protocol=tcp; the key '' has the single slice
+'' of all examples. Every key keeps one [slices, classes, classes] count array, and a batch adds to
+all slices of a key with one np.bincount over the flat index (slice, label, prediction), so the
+number of slices does not add passes over the data. Results of disjoint shards add up with `merge`.
+"""
+import json
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Text
+
+import numpy as np
+
+OVERALL = ''
+
+
+class SlicedConfusion:
+
+    def __init__(self, classes: Sequence[Text], slicing_keys: Sequence[Text] = ()):
+        self.classes = list(classes)
+        self.slicing_keys = [OVERALL] + [key for key in slicing_keys if key != OVERALL]
+        self.slice_values = {key: [] for key in self.slicing_keys}  # type: Dict[Text, List[Text]]
+        self._slice_ids = {key: {} for key in self.slicing_keys}  # type: Dict[Text, Dict[Text, int]]
+        self.counts = {key: np.zeros((0, len(self.classes), len(self.classes)), dtype=np.int64)
+                       for key in self.slicing_keys}
+        self._ids(OVERALL, np.array([OVERALL], dtype=object))
+
+    def _ids(self, key: Text, values: np.ndarray) -> np.ndarray:
+        """Slice ids of a batch of values, adding unseen values as new slices."""
+        unique, inverse = np.unique(values, return_inverse=True)
+        slice_ids = self._slice_ids[key]
+        ids = np.empty(len(unique), dtype=np.int64)
+        for i, value in enumerate(unique.tolist()):
+            value = value.decode() if isinstance(value, bytes) else str(value)
+            if value not in slice_ids:
+                slice_ids[value] = len(self.slice_values[key])
+                self.slice_values[key].append(value)
+            ids[i] = slice_ids[value]
+        self._grow(key)
+        return ids[inverse]
+
+    def _grow(self, key: Text) -> None:
+        missing = len(self.slice_values[key]) - len(self.counts[key])
+        if missing > 0:
+            self.counts[key] = np.concatenate(
+                [self.counts[key], np.zeros((missing,) + self.counts[key].shape[1:], dtype=np.int64)])
+
+    def update(self, labels: np.ndarray, predictions: np.ndarray, features: Mapping[Text, np.ndarray],
+               weights: Optional[np.ndarray] = None) -> None:
+        """Adds a batch.
+
+        Args:
+          labels: Class ids of the true labels.
+          predictions: Class ids of the predictions.
+          features: Values of every slicing key, for the same examples.
+          weights: Optional count of every example, see ExampleDedup.
+        """
+        num_classes = len(self.classes)
+        pairs = np.asarray(labels, dtype=np.int64) * num_classes + np.asarray(predictions, dtype=np.int64)
+        for key in self.slicing_keys:
+            ids = np.zeros(len(pairs), dtype=np.int64) if key == OVERALL else self._ids(key, features[key])
+            counts = self.counts[key]
+            flat = np.bincount(ids * num_classes * num_classes + pairs, weights=weights, minlength=counts.size)
+            counts += flat.astype(np.int64).reshape(counts.shape)
+
+    def merge(self, other: 'SlicedConfusion') -> None:
+        if other.classes != self.classes:
+            raise ValueError("Cannot merge confusion matrices of different classes")
+        for key in other.slicing_keys:
+            if key not in self.counts:
+                raise ValueError(f"Cannot merge confusion matrices sliced by {key}")
+            if other.slice_values[key]:
+                ids = self._ids(key, np.asarray(other.slice_values[key], dtype=object))
+                np.add.at(self.counts[key], ids, other.counts[key])
+
+    def metrics(self) -> Dict[Text, Dict[Text, Any]]:
+        """Count, accuracy and per class precision, recall and support of every slice, by 'key=value'."""
+        results = {}
+        for key in self.slicing_keys:
+            for value, matrix in zip(self.slice_values[key], self.counts[key]):
+                correct = np.diag(matrix)
+                predicted, actual = matrix.sum(axis=0), matrix.sum(axis=1)
+                per_class = {}
+                for i, name in enumerate(self.classes):
+                    if actual[i] or predicted[i]:
+                        per_class[name] = {
+                            'precision': float(correct[i] / predicted[i]) if predicted[i] else None,
+                            'recall': float(correct[i] / actual[i]) if actual[i] else None,
+                            'support': int(actual[i]),
+                        }
+                total = int(matrix.sum())
+                results[f"{key}={value}" if key != OVERALL else 'overall'] = {
+                    'count': total,
+                    'accuracy': float(correct.sum() / total) if total else None,
+                    'classes': per_class,
+                }
+        return results
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {'classes': self.classes, 'slicing_keys': self.slicing_keys, 'slice_values': self.slice_values,
+                'counts': {key: counts.tolist() for key, counts in self.counts.items()}}
+
+    @classmethod
+    def from_dict(cls, state: Dict[Text, Any]) -> 'SlicedConfusion':
+        confusion = cls(state['classes'], state['slicing_keys'])
+        for key in confusion.slicing_keys:
+            confusion.slice_values[key] = list(state['slice_values'][key])
+            confusion._slice_ids[key] = {value: i for i, value in enumerate(confusion.slice_values[key])}
+            confusion.counts[key] = np.asarray(state['counts'][key], dtype=np.int64).reshape(
+                (-1, len(confusion.classes), len(confusion.classes)))
+        return confusion
+
+    def save(self, path: Text) -> None:
+        with open(path, 'w') as confusion_file:
+            json.dump(self.to_dict(), confusion_file)
+
+    @classmethod
+    def load(cls, path: Text) -> 'SlicedConfusion':
+        with open(path) as confusion_file:
+            return cls.from_dict(json.load(confusion_file))
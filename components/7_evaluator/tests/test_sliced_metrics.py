@@ -0,0 +1,53 @@
+import importlib
+
+import numpy as np
+
+sliced_metrics = importlib.import_module('custom_components.7_evaluator.src.sliced_metrics')
+
+CLASSES = ["normal.", "smurf.", "neptune.", "<oov>"]
+
+
+def make_batch(rng, size):
+    labels = rng.integers(0, 4, size=size)
+    predictions = np.where(rng.random(size) < 0.8, labels, rng.integers(0, 4, size=size))
+    features = {"transport_protocol": rng.choice(np.array([b"tcp", b"udp", b"icmp"]), size=size),
+                "application_protocol": rng.choice(np.array([f"p{i}".encode() for i in range(30)]), size=size)}
+    return labels, predictions, features
+
+
+def test_sliced_counts_match_per_slice_loop():
+    # given
+    rng = np.random.default_rng(0)
+    labels, predictions, features = make_batch(rng, 10000)
+    confusion = sliced_metrics.SlicedConfusion(CLASSES, ["transport_protocol", "application_protocol"])
+    # when
+    confusion.update(labels, predictions, features)
+    metrics = confusion.metrics()
+    # then
+    udp = features["transport_protocol"] == b"udp"
+    expected = np.zeros((4, 4), dtype=np.int64)
+    for label, prediction in zip(labels[udp], predictions[udp]):
+        expected[label, prediction] += 1
+    matrix = confusion.counts["transport_protocol"][confusion.slice_values["transport_protocol"].index("udp")]
+    assert (matrix == expected).all()
+    smurf = metrics["overall"]["classes"]["smurf."]
+    assert smurf["recall"] == np.mean(predictions[labels == 1] == 1)
+    assert smurf["precision"] == np.mean(labels[predictions == 1] == 1)
+    assert sum(metrics[f"application_protocol=p{i}"]["count"] for i in range(30)) == 10000
+
+
+def test_merged_shards_equal_one_pass():
+    # given
+    rng = np.random.default_rng(1)
+    batches = [make_batch(rng, 3000) for _ in range(3)]
+    whole = sliced_metrics.SlicedConfusion(CLASSES, ["transport_protocol"])
+    shards = [sliced_metrics.SlicedConfusion(CLASSES, ["transport_protocol"]) for _ in batches]
+    # when
+    for shard, (labels, predictions, features) in zip(shards, batches):
+        whole.update(labels, predictions, features)
+        shard.update(labels, predictions, features)
+    merged = sliced_metrics.SlicedConfusion.from_dict(shards[2].to_dict())
+    merged.merge(shards[1])
+    merged.merge(shards[0])
+    # then
+    assert merged.metrics() == whole.metrics()
@@ -0,0 +1,124 @@
+"""
+Load test of the exported serving model before it is pushed.
+
+The SavedModel of the Trainer is loaded in this process with the GPUs hidden, as a CPU-only
+stand-in for the model server, and its serving signature is called with batches of serialized
+tf.Examples: records of a split of the `examples` artifact or, without one, synthetic KDD99 rows
+(see synthetic_kdd99.py) encoded with the raw feature spec of the transform graph. Every scenario
+of load_test.py is measured and written to the `load_test` artifact:
+
+    measurements.json   thresholds, measurements of every scenario and missed thresholds
+
+The `blessing` InfraBlessing is blessed only if every scenario meets the thresholds, so the Pusher
+does not push a model that misses them.
+"""
+import importlib
+import json
+import os
+from typing import Any, Dict, List, Text
+
+import absl
+import numpy as np
+import tensorflow as tf
+import tensorflow_transform as tft
+from tfx import types
+from tfx.components.base import base_executor
+from tfx.types import artifact_utils
+from tfx.utils import io_utils, path_utils
+
+from custom_components.example_codec.src import example_codec
+from custom_components.file_loader.src import synthetic_kdd99
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+
+load_test = importlib.import_module('custom_components.8_infra_validator.src.load_test')
+
+DEFAULT_NUM_RECORDS = 10000
+MEASUREMENTS_FILE_NAME = 'measurements.json'
+BLESSED_KEY = 'blessed'
+BLESSED_FILE_NAME = 'INFRA_BLESSED'
+NOT_BLESSED_FILE_NAME = 'INFRA_NOT_BLESSED'
+
+
+def recorded_records(examples: types.Artifact, split_uri: Text, num_records: int) -> List[bytes]:
+    paths = sorted(tf.io.gfile.glob(os.path.join(split_uri, '*')))
+    dataset = tf.data.TFRecordDataset(
+        paths, compression_type=example_codec.compression_type(examples, paths)).take(num_records)
+    return [record.numpy() for record in dataset]
+
+
+def synthetic_records(profile_path: Text, raw_feature_spec: Dict[Text, Any], num_records: int,
+                      seed: int = synthetic_kdd99.DEFAULT_SEED) -> List[bytes]:
+    """Serialized tf.Examples of synthetic rows, with the feature types the serving signature parses."""
+    with open(profile_path) as profile_file:
+        profile = json.load(profile_file)
+    block = synthetic_kdd99.generate_block(profile, num_records, np.random.default_rng(seed))
+    records = []
+    for line in block.splitlines():
+        example = tf.train.Example()
+        for name, cell in zip(synthetic_kdd99.COLUMNS, line.split(b',')):
+            spec = raw_feature_spec.get(name)
+            if spec is None:
+                continue
+            feature = example.features.feature[name]
+            if spec.dtype == tf.string:
+                feature.bytes_list.value.append(cell)
+            elif spec.dtype == tf.int64:
+                feature.int64_list.value.append(int(float(cell)))
+            else:
+                feature.float_list.value.append(float(cell))
+        records.append(example.SerializeToString())
+    return records
+
+
+def _mark(blessing: types.Artifact, blessed: bool) -> None:
+    io_utils.write_string_file(os.path.join(blessing.uri, BLESSED_FILE_NAME if blessed else NOT_BLESSED_FILE_NAME), '')
+    blessing.set_int_custom_property(BLESSED_KEY, int(blessed))
+
+
+class Executor(InstrumentedExecutorMixin, base_executor.BaseExecutor):
+    """Measures latency, throughput and memory of the serving model and blesses it if they meet the thresholds."""
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        self._log_startup(input_dict, output_dict, exec_properties)
+        with self.span('resolve'):
+            try:
+                tf.config.set_visible_devices([], 'GPU')
+            except RuntimeError:
+                absl.logging.warning('GPUs were initialized already, the load test may use them')
+            num_records = exec_properties.get('num_records') or DEFAULT_NUM_RECORDS
+            if input_dict.get('examples'):
+                records = recorded_records(
+                    artifact_utils.get_single_instance(input_dict['examples']),
+                    artifact_utils.get_split_uri(input_dict['examples'], exec_properties['split']), num_records)
+            else:
+                raw_feature_spec = tft.TFTransformOutput(
+                    artifact_utils.get_single_uri(input_dict['transform_graph'])).raw_feature_spec()
+                records = synthetic_records(exec_properties['synthetic_profile'], raw_feature_spec, num_records)
+            scenarios = [load_test.Scenario(**scenario) for scenario in json.loads(exec_properties['scenarios'])]
+            thresholds = load_test.Thresholds(**json.loads(exec_properties['thresholds']))
+            serve = tf.saved_model.load(
+                path_utils.serving_model_path(artifact_utils.get_single_uri(input_dict['model']))
+            ).signatures['serving_default']
+
+        def predict(batch: List[bytes]) -> None:
+            serve(examples=tf.constant(batch))
+
+        measurements, missed = [], []
+        with self.span('compute'):
+            for scenario in scenarios:
+                measurement = load_test.run_scenario(predict, records, scenario)
+                measurements.append(measurement)
+                missed.extend(load_test.violations(measurement, thresholds.of(scenario)))
+                absl.logging.info('Load test {}'.format(measurement))
+        self.add_rows(sum(scenario.num_requests * scenario.batch_size for scenario in scenarios))
+
+        with self.span('write'):
+            io_utils.write_string_file(
+                os.path.join(artifact_utils.get_single_uri(output_dict['load_test']), MEASUREMENTS_FILE_NAME),
+                json.dumps({'thresholds': thresholds._asdict(), 'records': len(records),
+                            'measurements': measurements, 'missed': missed}, indent=2))
+            _mark(artifact_utils.get_single_instance(output_dict['blessing']), not missed)
+        for line in missed:
+            absl.logging.warning('Missed threshold: {}'.format(line))
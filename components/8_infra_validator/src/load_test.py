@@ -0,0 +1,113 @@
+"""
+Closed-loop load test of a model scoring function, and the thresholds it has to meet.
+
+Every scenario replays the request records in batches of `batch_size` from `concurrency` threads,
+each sending its next request as soon as the previous one returned, like as many clients of a
+model server. After `warmup_requests` unmeasured requests, `num_requests` requests are timed one
+by one; the scenario reports latency percentiles, request and example throughput and the peak
+resident memory of the process while it ran.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from custom_components.instrumentation.src.instrumentation import ProcessTreeRssSampler
+
+DEFAULT_SCENARIOS = [{'concurrency': 1, 'batch_size': 1}, {'concurrency': 4, 'batch_size': 1},
+                     {'concurrency': 4, 'batch_size': 64}]
+DEFAULT_NUM_REQUESTS = 2000
+DEFAULT_WARMUP_REQUESTS = 50
+
+
+class Scenario(NamedTuple):
+    concurrency: int
+    batch_size: int
+    num_requests: int = DEFAULT_NUM_REQUESTS
+    warmup_requests: int = DEFAULT_WARMUP_REQUESTS
+    # Thresholds fields of this scenario that replace those of all scenarios, e.g. a throughput
+    # only a batched scenario can reach.
+    thresholds: Optional[Dict[str, Optional[float]]] = None
+
+
+class Thresholds(NamedTuple):
+    """Limits every scenario has to meet, None means no limit."""
+    max_p50_ms: Optional[float] = None
+    max_p95_ms: Optional[float] = None
+    max_p99_ms: Optional[float] = None
+    min_examples_per_sec: Optional[float] = None
+    max_memory_mib: Optional[float] = None
+
+    def of(self, scenario: Scenario) -> 'Thresholds':
+        """The thresholds with the overrides of `scenario`."""
+        return self._replace(**(scenario.thresholds or {}))
+
+
+def _batches(records: Sequence[Any], batch_size: int) -> List[List[Any]]:
+    """Requests of consecutive records, repeating the records if there are fewer than one batch."""
+    if len(records) < batch_size:
+        records = list(itertools.islice(itertools.cycle(records), batch_size))
+    return [list(records[i:i + batch_size]) for i in range(0, len(records) - batch_size + 1, batch_size)]
+
+
+def run_scenario(predict: Callable[[List[Any]], Any], records: Sequence[Any],
+                 scenario: Scenario) -> Dict[str, Any]:
+    """Measures `predict` under the load of one scenario.
+
+    Args:
+      predict: Scores one request, a list of records.
+      records: Recorded or synthetic request records, replayed in order and repeated as needed.
+      scenario: Concurrency, batch size and number of requests.
+    Returns:
+      The scenario and its latency percentiles in milliseconds, throughput and peak memory.
+    """
+    batches = _batches(records, scenario.batch_size)
+    for i in range(scenario.warmup_requests):
+        predict(batches[i % len(batches)])
+
+    latencies = np.zeros(scenario.num_requests)
+    next_request = itertools.count()
+    lock = threading.Lock()
+
+    def client() -> None:
+        while True:
+            with lock:
+                request = next(next_request)
+            if request >= scenario.num_requests:
+                return
+            start = time.perf_counter()
+            predict(batches[request % len(batches)])
+            latencies[request] = time.perf_counter() - start
+
+    sampler = ProcessTreeRssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(scenario.concurrency) as pool:
+        for future in [pool.submit(client) for _ in range(scenario.concurrency)]:
+            future.result()
+    seconds = time.perf_counter() - start
+    peak_bytes = sampler.stop()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return dict(scenario._asdict(), p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99),
+                mean_ms=float(latencies.mean() * 1000), seconds=seconds,
+                requests_per_sec=scenario.num_requests / seconds,
+                examples_per_sec=scenario.num_requests * scenario.batch_size / seconds,
+                peak_memory_mib=peak_bytes / (1 << 20))
+
+
+def violations(measurement: Dict[str, Any], thresholds: Thresholds) -> List[str]:
+    """Descriptions of the thresholds a scenario's measurement misses, empty if it meets all."""
+    name = f"concurrency {measurement['concurrency']}, batch size {measurement['batch_size']}"
+    missed = []
+    for key, limit in (('p50_ms', thresholds.max_p50_ms), ('p95_ms', thresholds.max_p95_ms),
+                       ('p99_ms', thresholds.max_p99_ms), ('peak_memory_mib', thresholds.max_memory_mib)):
+        if limit is not None and measurement[key] > limit:
+            missed.append(f"{name}: {key} {measurement[key]:.1f} > {limit}")
+    minimum = thresholds.min_examples_per_sec
+    if minimum is not None and measurement['examples_per_sec'] < minimum:
+        missed.append(f"{name}: examples_per_sec {measurement['examples_per_sec']:.0f} < {minimum}")
+    return missed
@@ -0,0 +1,65 @@
+import importlib
+import json
+from typing import Any, Dict, List, Optional
+
+from tfx import types
+from tfx.components.base import executor_spec
+from tfx.components.base.base_component import BaseComponent
+from tfx.types import ComponentSpec, channel_utils, component_spec, standard_artifacts
+from tfx.types.artifact import Artifact
+
+executor = importlib.import_module('custom_components.8_infra_validator.src.executor')
+load_test = importlib.import_module('custom_components.8_infra_validator.src.load_test')
+
+
+class LoadTestResult(Artifact):
+    """Latency, throughput and memory of a model under load, as measurements.json."""
+    TYPE_NAME = 'LoadTestResult'
+
+
+class LoadTestValidator(BaseComponent):
+    """Infra validation by load test: blesses the model only if it meets the latency, throughput and memory thresholds.
+
+    Replays the records of `split` of `examples`, or synthetic rows drawn from `synthetic_profile`
+    (written by synthetic_kdd99.py) if no examples are given, which needs `transform_graph` for the
+    feature types. Pass `blessing` to the Pusher as `infra_blessing`.
+    """
+
+    class _ComponentSpec(ComponentSpec):
+        INPUTS = {
+            'model': component_spec.ChannelParameter(type=standard_artifacts.Model),
+            'examples': component_spec.ChannelParameter(type=standard_artifacts.Examples, optional=True),
+            'transform_graph': component_spec.ChannelParameter(type=standard_artifacts.TransformGraph,
+                                                               optional=True),
+        }
+        OUTPUTS = {
+            'blessing': component_spec.ChannelParameter(type=standard_artifacts.InfraBlessing),
+            'load_test': component_spec.ChannelParameter(type=LoadTestResult),
+        }
+        PARAMETERS = {
+            'split': component_spec.ExecutionParameter(type=str),
+            'synthetic_profile': component_spec.ExecutionParameter(type=str, optional=True),
+            'num_records': component_spec.ExecutionParameter(type=int, optional=True),
+            # JSON list of load_test.Scenario fields and JSON object of load_test.Thresholds fields,
+            # which the `thresholds` of a scenario override for it.
+            'scenarios': component_spec.ExecutionParameter(type=str),
+            'thresholds': component_spec.ExecutionParameter(type=str),
+        }
+
+    SPEC_CLASS = _ComponentSpec
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
+
+    def __init__(self, model: types.Channel, examples: Optional[types.Channel] = None,
+                 transform_graph: Optional[types.Channel] = None, split: str = 'eval',
+                 synthetic_profile: Optional[str] = None, num_records: Optional[int] = None,
+                 scenarios: Optional[List[Dict[str, int]]] = None, thresholds: Optional[Dict[str, Any]] = None):
+        if examples is None and (synthetic_profile is None or transform_graph is None):
+            raise ValueError('Either examples or synthetic_profile and transform_graph are required')
+        spec = self._ComponentSpec(model=model, examples=examples, transform_graph=transform_graph,
+                                   blessing=channel_utils.as_channel([standard_artifacts.InfraBlessing()]),
+                                   load_test=channel_utils.as_channel([LoadTestResult()]), split=split,
+                                   synthetic_profile=synthetic_profile, num_records=num_records,
+                                   scenarios=json.dumps(scenarios or load_test.DEFAULT_SCENARIOS),
+                                   thresholds=json.dumps(thresholds or {}))
+        super(LoadTestValidator, self).__init__(spec)
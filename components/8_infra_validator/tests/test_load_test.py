@@ -0,0 +1,47 @@
+import importlib
+import time
+
+load_test = importlib.import_module('custom_components.8_infra_validator.src.load_test')
+
+
+def fake_model(seconds_per_example: float):
+    def predict(batch):
+        time.sleep(seconds_per_example * len(batch))
+    return predict
+
+
+def test_measures_latency_and_throughput():
+    # given
+    scenario = load_test.Scenario(concurrency=4, batch_size=8, num_requests=200, warmup_requests=5)
+    # when
+    measurement = load_test.run_scenario(fake_model(0.0002), list(range(100)), scenario)
+    # then
+    # Every request sleeps 8 * 0.2 ms; upper bounds would depend on how loaded the machine is.
+    assert 1.6 <= measurement["p50_ms"] <= measurement["p95_ms"] <= measurement["p99_ms"]
+    assert measurement["examples_per_sec"] == measurement["requests_per_sec"] * 8
+    assert measurement["peak_memory_mib"] > 0
+
+
+def test_reports_missed_thresholds():
+    # given
+    measurement = {"concurrency": 1, "batch_size": 1, "p50_ms": 2., "p95_ms": 9., "p99_ms": 30.,
+                   "peak_memory_mib": 300., "examples_per_sec": 400.}
+    thresholds = load_test.Thresholds(max_p50_ms=5, max_p99_ms=20, min_examples_per_sec=500, max_memory_mib=1024)
+    # when
+    missed = load_test.violations(measurement, thresholds)
+    # then
+    assert missed == ["concurrency 1, batch size 1: p99_ms 30.0 > 20",
+                      "concurrency 1, batch size 1: examples_per_sec 400 < 500"]
+    assert load_test.violations(measurement, load_test.Thresholds()) == []
+
+
+def test_scenario_overrides_thresholds():
+    # given
+    measurement = {"concurrency": 4, "batch_size": 64, "p50_ms": 40., "p95_ms": 70., "p99_ms": 90.,
+                   "peak_memory_mib": 300., "examples_per_sec": 800.}
+    scenario = load_test.Scenario(concurrency=4, batch_size=64,
+                                  thresholds={"max_p99_ms": 100., "min_examples_per_sec": 1000.})
+    # when
+    missed = load_test.violations(measurement, load_test.Thresholds(max_p99_ms=50.).of(scenario))
+    # then
+    assert missed == ["concurrency 4, batch size 64: examples_per_sec 800 < 1000.0"]
@@ -0,0 +1,101 @@
+"""
+Push of the serving model together with its inference-optimized export.
+
+Like the stock Pusher, the SavedModel of the Trainer is copied to `<serving_model_dir>/<unix time>`
+for TF Serving, if the optional model and infra blessings allow it. Next to it the `optimized` dir
+holds the export of optimized_export.py, which scorer.py serves:
+
+    optimized/model.tflite          transform and model folded into one TFLite model, maybe quantized
+    optimized/scoring_config.json   input keys, vocabularies and classes of scorer.Encoder
+    optimized/accuracy.json         accuracy of the SavedModel and the export on eval records
+
+The push is skipped if the accuracy of the export is more than `max_accuracy_delta` below that of
+the SavedModel; the `pushed_model` artifact keeps both and the report either way.
+"""
+import importlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Text
+
+import absl
+import tensorflow as tf
+from tfx import types
+from tfx.components.pusher import executor as pusher_executor
+from tfx.components.util import model_utils
+from tfx.types import artifact_utils
+from tfx.utils import io_utils, path_utils
+
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+
+infra_validator = importlib.import_module('custom_components.8_infra_validator.src.executor')
+optimized_export = importlib.import_module('custom_components.9_pusher.src.optimized_export')
+scorer = importlib.import_module('custom_components.9_pusher.src.scorer')
+
+DEFAULT_NUM_RECORDS = 10000
+ACCURACY_FILE_NAME = 'accuracy.json'
+
+
+class Executor(InstrumentedExecutorMixin, pusher_executor.Executor):
+    """Pushes the SavedModel and its optimized export if blessed and the export is accurate enough."""
+
+    def CheckBlessing(self, input_dict: Dict[Text, List[types.Artifact]]) -> bool:
+        """Like the stock Pusher, but the model blessing is optional too."""
+        if input_dict.get(pusher_executor.MODEL_BLESSING_KEY) and not model_utils.is_model_blessed(
+                artifact_utils.get_single_instance(input_dict[pusher_executor.MODEL_BLESSING_KEY])):
+            absl.logging.info('Model was not blessed by model validation')
+            return False
+        if input_dict.get(pusher_executor.INFRA_BLESSING_KEY) and not model_utils.is_infra_validated(
+                artifact_utils.get_single_instance(input_dict[pusher_executor.INFRA_BLESSING_KEY])):
+            absl.logging.info('Model was not blessed by infra validation')
+            return False
+        return True
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        self._log_startup(input_dict, output_dict, exec_properties)
+        model_push = artifact_utils.get_single_instance(output_dict[pusher_executor.PUSHED_MODEL_KEY])
+        if not self.CheckBlessing(input_dict):
+            self._MarkNotPushed(model_push)
+            return
+        with self.span('resolve'):
+            model_dir = path_utils.serving_model_path(
+                artifact_utils.get_single_uri(input_dict[pusher_executor.MODEL_KEY]))
+            transform_graph_uri = artifact_utils.get_single_uri(input_dict['transform_graph'])
+            split = exec_properties['split']
+            records = infra_validator.recorded_records(
+                artifact_utils.get_single_instance(input_dict['examples']),
+                artifact_utils.get_split_uri(input_dict['examples'], split),
+                exec_properties.get('num_records') or DEFAULT_NUM_RECORDS)
+            if not records:
+                raise RuntimeError('Split {} of the examples is empty'.format(split))
+            # The export goes next to the SavedModel, which copy_dir would remove.
+            io_utils.copy_dir(model_dir, model_push.uri)
+            export_dir = os.path.join(model_push.uri, scorer.OPTIMIZED_DIR)
+
+        with self.span('compute'):
+            optimized_export.export(model_dir, transform_graph_uri, export_dir, exec_properties['quantization'],
+                                    records)
+            report = optimized_export.accuracy_check(model_dir, export_dir, records)
+        self.add_rows(report['records'])
+        report['max_accuracy_delta'] = exec_properties['max_accuracy_delta']
+        io_utils.write_string_file(os.path.join(export_dir, ACCURACY_FILE_NAME), json.dumps(report, indent=2))
+        absl.logging.info('Accuracy of the optimized export: {}'.format(report))
+        if report['accuracy_delta'] > exec_properties['max_accuracy_delta']:
+            absl.logging.warning('Not pushed: the optimized export is {:.4f} less accurate than the SavedModel, '
+                                 'more than {}'.format(report['accuracy_delta'], exec_properties['max_accuracy_delta']))
+            self._MarkNotPushed(model_push)
+            return
+
+        with self.span('write'):
+            model_version = str(int(time.time()))
+            serving_path = os.path.join(exec_properties['serving_model_dir'], model_version)
+            if tf.io.gfile.exists(serving_path):
+                absl.logging.info('Destination directory {} already exists, skipping current push.'.format(
+                    serving_path))
+            else:
+                # tf.serving won't load partial model, it will retry until fully copied.
+                io_utils.copy_dir(model_push.uri, serving_path)
+        self._MarkPushed(model_push, pushed_destination=serving_path, pushed_version=model_version)
+        absl.logging.info('Model and optimized export pushed to {}'.format(serving_path))
@@ -0,0 +1,210 @@
+"""
+Inference-optimized export of the Trainer's model for scoring on CPUs.
+
+The serving signature of run_fn parses serialized tf.Examples and runs the transform graph and the
+Keras model as nested functions on every request. The export folds both into one TFLite model:
+
+1. The transform graph is probed with synthetic examples. Every numerical input of the model has to
+   come out as an affine function of its raw value, like the z-score and [0, 1] scaling of
+   tfx_utils.py, and every categorical input as the index in its vocabulary with unknown values in
+   a single OOV bucket. Otherwise the export fails rather than scoring differently from the
+   SavedModel.
+2. The scales and offsets become constants in front of the Keras model, which then takes the raw
+   numerical values and the vocabulary ids as two dense tensors. The vocabularies and the classes
+   go to scoring_config.json for scorer.Encoder.
+3. The TFLite converter folds the constants and optionally quantizes after training: `float16`
+   weights, `dynamic` int8 weights, or `int8` weights and activations calibrated on eval records,
+   with float kernels where there is no int8 one.
+
+`accuracy_check` scores eval records with the SavedModel and, through the scorer's encoder like in
+serving, with the export, and reports both accuracies, their delta, the agreement and the time per
+record of each.
+"""
+import importlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_transform as tft
+from tfx.utils import io_utils
+
+scorer = importlib.import_module('custom_components.9_pusher.src.scorer')
+evaluator = importlib.import_module('custom_components.7_evaluator.src.executor')
+
+NONE, FLOAT16, DYNAMIC, INT8 = 'none', 'float16', 'dynamic', 'int8'
+QUANTIZATIONS = (NONE, FLOAT16, DYNAMIC, INT8)
+NUMERICAL_INPUT, CATEGORICAL_INPUT = 'numerical', 'categorical'
+AFFINE_TOLERANCE = 1e-4
+CALIBRATION_RECORDS = 1000
+BATCH_SIZE = 256
+
+
+def example_to_record(serialized: bytes) -> Dict[Text, Any]:
+    """The raw columns of a serialized tf.Example as a JSON record of the scorer."""
+    record = {}
+    for key, feature in tf.train.Example.FromString(serialized).features.feature.items():
+        kind = feature.WhichOneof('kind')
+        values = getattr(feature, kind).value if kind else []
+        if values:
+            record[key] = values[0].decode() if isinstance(values[0], bytes) else values[0]
+    return record
+
+
+def model_keys(model: tf.keras.Model) -> Tuple[List[Text], List[Text]]:
+    """Numerical (float) and categorical (integer id) input keys of the Keras model, in input order."""
+    numerical, categorical = [], []
+    for name, tensor in zip(model.input_names, model.inputs):
+        (numerical if tensor.dtype.is_floating else categorical).append(name)
+    return numerical, categorical
+
+
+def _dense(tensor) -> np.ndarray:
+    if isinstance(tensor, tf.SparseTensor):
+        tensor = tf.sparse.to_dense(tensor)
+    return tensor.numpy().reshape(-1)
+
+
+def _probe_examples(raw_feature_spec: Dict[Text, Any], numerical_keys: List[Text],
+                    vocabularies: Dict[Text, List[Text]], num_rows: int) -> List[bytes]:
+    """Row i has the raw value i in every numerical key and the i-th vocabulary value, or an unknown
+    one past the end of the vocabulary, in every categorical key.
+    """
+    records = []
+    for row in range(num_rows):
+        example = tf.train.Example()
+        for key in numerical_keys:
+            feature = example.features.feature[key]
+            if raw_feature_spec[key].dtype == tf.int64:
+                feature.int64_list.value.append(row)
+            else:
+                feature.float_list.value.append(float(row))
+        for key, vocabulary in vocabularies.items():
+            unknown = '<unknown>'
+            while unknown in vocabulary:
+                unknown += '_'
+            value = vocabulary[row] if row < len(vocabulary) else unknown
+            example.features.feature[key].bytes_list.value.append(value.encode())
+        records.append(example.SerializeToString())
+    return records
+
+
+def fold_constants(tf_transform_output: tft.TFTransformOutput, numerical_keys: List[Text],
+                   categorical_keys: List[Text]) -> Tuple[np.ndarray, np.ndarray, Dict[Text, List[Text]]]:
+    """Scales, offsets and vocabularies that reproduce the transform of the model inputs.
+
+    Raises:
+      ValueError: If the transform of an input is not affine, or no plain vocabulary lookup.
+    """
+    vocabularies = {key: [value.decode() if isinstance(value, bytes) else value
+                          for value in tf_transform_output.vocabulary_by_name(key)] for key in categorical_keys}
+    num_rows = max([3] + [len(vocabulary) + 1 for vocabulary in vocabularies.values()])
+    raw_feature_spec = tf_transform_output.raw_feature_spec()
+    serialized = _probe_examples(raw_feature_spec, numerical_keys, vocabularies, num_rows)
+    transformed = tf_transform_output.transform_features_layer()(
+        tf.io.parse_example(tf.constant(serialized), raw_feature_spec))
+
+    raw = np.arange(num_rows, dtype=np.float64)
+    scales, offsets = [], []
+    for key in numerical_keys:
+        values = _dense(transformed[key]).astype(np.float64)
+        offset, scale = values[0], values[1] - values[0]
+        if not np.allclose(values, offset + scale * raw, rtol=AFFINE_TOLERANCE, atol=AFFINE_TOLERANCE):
+            raise ValueError(f"The transform of {key} is not affine and cannot be folded into the model")
+        scales.append(scale)
+        offsets.append(offset)
+    for key in categorical_keys:
+        expected = [min(row, len(vocabularies[key])) for row in range(num_rows)]
+        if _dense(transformed[key]).tolist() != expected:
+            raise ValueError(f"The ids of {key} are no vocabulary indices with one OOV bucket and cannot be folded")
+    return np.array(scales, np.float32), np.array(offsets, np.float32), vocabularies
+
+
+def fold(model: tf.keras.Model, numerical_keys: List[Text], categorical_keys: List[Text],
+         scales: np.ndarray, offsets: np.ndarray) -> tf.keras.Model:
+    """The Keras model behind the folded scaling, on dense numerical values and categorical ids."""
+    numerical = tf.keras.Input(shape=(len(numerical_keys),), name=NUMERICAL_INPUT, dtype=tf.float32)
+    categorical = tf.keras.Input(shape=(len(categorical_keys),), name=CATEGORICAL_INPUT, dtype=tf.int64)
+    scaled = numerical * tf.constant(scales) + tf.constant(offsets)
+    features = {key: scaled[:, i] for i, key in enumerate(numerical_keys)}
+    features.update({key: categorical[:, i] for i, key in enumerate(categorical_keys)})
+    return tf.keras.Model(inputs=[numerical, categorical], outputs=model(features))
+
+
+def convert(folded: tf.keras.Model, quantization: Text,
+            calibration: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> bytes:
+    """TFLite model of the folded model, quantized with one of QUANTIZATIONS."""
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization}, expected one of {QUANTIZATIONS}")
+    converter = tf.lite.TFLiteConverter.from_keras_model(folded)
+    if quantization != NONE:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == FLOAT16:
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == INT8:
+        numerical, categorical = calibration
+        converter.representative_dataset = lambda: ([numerical[i:i + 1], categorical[i:i + 1]]
+                                                    for i in range(len(numerical)))
+    return converter.convert()
+
+
+def export(model_dir: Text, transform_graph_uri: Text, export_dir: Text, quantization: Text,
+           records: List[bytes]) -> 'scorer.ScoringConfig':
+    """Writes the TFLite model and scoring_config.json of the SavedModel of `model_dir` to `export_dir`.
+    The serialized eval `records` calibrate the int8 quantization.
+    """
+    model = tf.keras.models.load_model(model_dir)
+    numerical_keys, categorical_keys = model_keys(model)
+    scales, offsets, vocabularies = fold_constants(tft.TFTransformOutput(transform_graph_uri), numerical_keys,
+                                                   categorical_keys)
+    config = scorer.ScoringConfig(numerical_keys, categorical_keys, vocabularies,
+                                  evaluator.label_classes(transform_graph_uri), quantization)
+    calibration = None
+    if quantization == INT8:
+        calibration = scorer.Encoder(config).encode([example_to_record(record)
+                                                     for record in records[:CALIBRATION_RECORDS]])
+    content = convert(fold(model, numerical_keys, categorical_keys, scales, offsets), quantization, calibration)
+
+    tf.io.gfile.makedirs(export_dir)
+    with tf.io.gfile.GFile(os.path.join(export_dir, scorer.TFLITE_FILE), 'wb') as model_file:
+        model_file.write(content)
+    io_utils.write_string_file(os.path.join(export_dir, scorer.SCORING_CONFIG_FILE),
+                               json.dumps(config._asdict(), indent=2))
+    return config
+
+
+def accuracy_check(model_dir: Text, export_dir: Text, records: List[bytes],
+                   label_key: Text = evaluator.LABEL_KEY) -> Dict[Text, Any]:
+    """Accuracy of the SavedModel and of the export on the serialized `records`, their delta
+    (SavedModel minus export), the share of equal predictions and the milliseconds per record.
+    """
+    serve = tf.saved_model.load(model_dir).signatures['serving_default']
+    config = scorer.ScoringConfig.load(os.path.join(export_dir, scorer.SCORING_CONFIG_FILE))
+    encoder = scorer.Encoder(config)
+    model = scorer.TfliteModel(os.path.join(export_dir, scorer.TFLITE_FILE))
+    class_ids = {name: i for i, name in enumerate(config.classes[:-1])}
+    json_records = [example_to_record(record) for record in records]
+    labels = np.array([class_ids.get(str(record.get(label_key, '')), len(class_ids)) for record in json_records])
+
+    reference, optimized = [], []
+    reference_seconds = optimized_seconds = 0.
+    for start in range(0, len(records), BATCH_SIZE):
+        begin = time.perf_counter()
+        outputs = serve(examples=tf.constant(records[start:start + BATCH_SIZE]))
+        reference.append(tf.argmax(next(iter(outputs.values())), axis=1).numpy())
+        middle = time.perf_counter()
+        optimized.append(model.predict(*encoder.encode(json_records[start:start + BATCH_SIZE])).argmax(axis=1))
+        reference_seconds += middle - begin
+        optimized_seconds += time.perf_counter() - middle
+    reference, optimized = np.concatenate(reference), np.concatenate(optimized)
+    reference_accuracy = float(np.mean(reference == labels))
+    optimized_accuracy = float(np.mean(optimized == labels))
+    return {'records': len(records), 'quantization': config.quantization,
+            'reference_accuracy': reference_accuracy, 'optimized_accuracy': optimized_accuracy,
+            'accuracy_delta': reference_accuracy - optimized_accuracy,
+            'agreement': float(np.mean(reference == optimized)),
+            'reference_ms_per_record': reference_seconds * 1000 / max(len(records), 1),
+            'optimized_ms_per_record': optimized_seconds * 1000 / max(len(records), 1),
+            'tflite_bytes': tf.io.gfile.stat(os.path.join(export_dir, scorer.TFLITE_FILE)).length}
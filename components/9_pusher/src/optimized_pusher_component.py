@@ -0,0 +1,56 @@
+import importlib
+from typing import Optional, Text
+
+from tfx import types
+from tfx.components.base import executor_spec
+from tfx.components.base.base_component import BaseComponent
+from tfx.types import ComponentSpec, channel_utils, component_spec, standard_artifacts
+
+executor = importlib.import_module('custom_components.9_pusher.src.executor')
+optimized_export = importlib.import_module('custom_components.9_pusher.src.optimized_export')
+
+
+class OptimizedPusher(BaseComponent):
+    """Pushes the SavedModel for TF Serving together with a TFLite export folded and quantized for CPU scoring.
+
+    The export is checked on the records of `split` of `examples` and only pushed if its accuracy is
+    at most `max_accuracy_delta` below that of the SavedModel. Pass the `blessing` of
+    LoadTestValidator as `infra_blessing`; either blessing, if given, has to be blessed.
+    """
+
+    class _ComponentSpec(ComponentSpec):
+        INPUTS = {
+            'model': component_spec.ChannelParameter(type=standard_artifacts.Model),
+            'transform_graph': component_spec.ChannelParameter(type=standard_artifacts.TransformGraph),
+            'examples': component_spec.ChannelParameter(type=standard_artifacts.Examples),
+            'model_blessing': component_spec.ChannelParameter(type=standard_artifacts.ModelBlessing, optional=True),
+            'infra_blessing': component_spec.ChannelParameter(type=standard_artifacts.InfraBlessing, optional=True),
+        }
+        OUTPUTS = {
+            'pushed_model': component_spec.ChannelParameter(type=standard_artifacts.PushedModel),
+        }
+        PARAMETERS = {
+            'serving_model_dir': component_spec.ExecutionParameter(type=Text),
+            # One of optimized_export.QUANTIZATIONS.
+            'quantization': component_spec.ExecutionParameter(type=Text),
+            'max_accuracy_delta': component_spec.ExecutionParameter(type=float),
+            'split': component_spec.ExecutionParameter(type=Text),
+            'num_records': component_spec.ExecutionParameter(type=int, optional=True),
+        }
+
+    SPEC_CLASS = _ComponentSpec
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
+
+    def __init__(self, model: types.Channel, transform_graph: types.Channel, examples: types.Channel,
+                 serving_model_dir: Text, model_blessing: Optional[types.Channel] = None,
+                 infra_blessing: Optional[types.Channel] = None, quantization: Text = optimized_export.DYNAMIC,
+                 max_accuracy_delta: float = 0.005, split: Text = 'eval', num_records: Optional[int] = None):
+        if quantization not in optimized_export.QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization}, expected one of {optimized_export.QUANTIZATIONS}")
+        spec = self._ComponentSpec(model=model, transform_graph=transform_graph, examples=examples,
+                                   model_blessing=model_blessing, infra_blessing=infra_blessing,
+                                   pushed_model=channel_utils.as_channel([standard_artifacts.PushedModel()]),
+                                   serving_model_dir=serving_model_dir, quantization=quantization,
+                                   max_accuracy_delta=max_accuracy_delta, split=split, num_records=num_records)
+        super(OptimizedPusher, self).__init__(spec)
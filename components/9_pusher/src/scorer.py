@@ -0,0 +1,274 @@
+"""
+Micro-batching scorer of the inference-optimized export of OptimizedPusher.
+
+Records are JSON objects of the raw KDD99 columns, one per line (JSONL), for example
+{"id": 7, "num_0": 0, "transport_protocol": "tcp", "application_protocol": "http", "cat_0": "SF", ...};
+missing columns count as empty like in the transform. `Encoder` turns a batch of them into the two
+inputs of the TFLite model with the vocabularies of scoring_config.json: the raw numerical values,
+which the model scales itself, and the vocabulary ids of the categorical columns.
+
+`MicroBatcher` collects the records into batches of up to `max_batch_size` and runs a batch as soon
+as it is full, or when waiting any longer would answer its oldest record later than
+`max_latency_ms` after it arrived, given the recent batch run times. Under load the batches grow and
+the throughput with them; at low rates every record is still answered within the deadline.
+
+Usage: python -m custom_components.9_pusher.src.scorer --model-dir <serving_model_dir> \
+           --input records.jsonl --output scores.jsonl --max-batch-size 64 --max-latency-ms 10
+"""
+import argparse
+import collections
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Text, Tuple
+
+import numpy as np
+
+OPTIMIZED_DIR = 'optimized'
+SCORING_CONFIG_FILE = 'scoring_config.json'
+TFLITE_FILE = 'model.tflite'
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_LATENCY_MS = 10.
+SERVICE_TIME_DECAY = 0.2  # weight of the latest batch in the running estimate of the batch run time
+
+
+class ScoringConfig(NamedTuple):
+    numerical_keys: List[Text]
+    categorical_keys: List[Text]
+    vocabularies: Dict[Text, List[Text]]  # ids are the indices, unknown values get the length
+    classes: List[Text]  # in the order of the model outputs
+    quantization: Text
+
+    @classmethod
+    def load(cls, path: Text) -> 'ScoringConfig':
+        with open(path) as config_file:
+            return cls(**json.load(config_file))
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Scores JSONL records with the optimized export in micro-batches')
+    parser.add_argument('--model-dir', type=str, required=True,
+                        help='Serving model dir of OptimizedPusher (latest version), a version or its optimized dir.')
+    parser.add_argument('--input', type=str, default='-', help='JSONL records, - for stdin.')
+    parser.add_argument('--output', type=str, default='-', help='JSONL scores in input order, - for stdout.')
+    parser.add_argument('--id-field', type=str, default='id', help='Field copied from a record to its score.')
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-latency-ms', type=float, default=DEFAULT_MAX_LATENCY_MS)
+    parser.add_argument('--records-per-sec', type=float, default=0.,
+                        help='Replays the input at this rate instead of as fast as it is read.')
+
+    return parser.parse_args()
+
+
+def find_export(model_dir: Text) -> Text:
+    """The optimized dir of a push: `model_dir` itself, its optimized dir or that of its latest version."""
+    if os.path.exists(os.path.join(model_dir, SCORING_CONFIG_FILE)):
+        return model_dir
+    if os.path.isdir(os.path.join(model_dir, OPTIMIZED_DIR)):
+        return os.path.join(model_dir, OPTIMIZED_DIR)
+    versions = sorted((name for name in os.listdir(model_dir)
+                       if name.isdigit() and os.path.isdir(os.path.join(model_dir, name, OPTIMIZED_DIR))), key=int)
+    if not versions:
+        raise FileNotFoundError(f"No optimized export in {model_dir}")
+    return os.path.join(model_dir, versions[-1], OPTIMIZED_DIR)
+
+
+class Encoder:
+    """Turns JSON records into the numerical and categorical id inputs of the TFLite model."""
+
+    def __init__(self, config: ScoringConfig):
+        self._numerical_keys = config.numerical_keys
+        self._vocabularies = [(key, {value: i for i, value in enumerate(config.vocabularies[key])})
+                              for key in config.categorical_keys]
+
+    def encode(self, records: Sequence[Dict[Text, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        numerical = np.array([[float(record.get(key) or 0.) for key in self._numerical_keys] for record in records],
+                             np.float32).reshape(len(records), len(self._numerical_keys))
+        categorical = np.array([[ids.get(_text(record.get(key)), len(ids)) for key, ids in self._vocabularies]
+                                for record in records], np.int64).reshape(len(records), len(self._vocabularies))
+        return numerical, categorical
+
+
+def _text(value: Any) -> Text:
+    return '' if value is None else str(value)
+
+
+class TfliteModel:
+    """The TFLite model of an export. Batches are padded to the next power of two, so there is one
+    interpreter with allocated tensors per padded size instead of a resize for every batch.
+    Not thread-safe; MicroBatcher runs all batches on its own thread.
+    """
+
+    def __init__(self, model_path: Text):
+        import tensorflow as tf
+        self._interpreter_class = tf.lite.Interpreter
+        with open(model_path, 'rb') as model_file:
+            self._content = model_file.read()
+        self._interpreters = {}
+
+    def _interpreter(self, batch_size: int):
+        if batch_size not in self._interpreters:
+            interpreter = self._interpreter_class(model_content=self._content)
+            for detail in interpreter.get_input_details():
+                interpreter.resize_tensor_input(detail['index'], [batch_size, detail['shape'][1]])
+            interpreter.allocate_tensors()
+            # The numerical input is the float one, the categorical ids are integers.
+            inputs = {np.dtype(detail['dtype']).kind: detail['index'] for detail in interpreter.get_input_details()}
+            self._interpreters[batch_size] = (interpreter, inputs['f'], inputs['i'],
+                                              interpreter.get_output_details()[0]['index'])
+        return self._interpreters[batch_size]
+
+    def predict(self, numerical: np.ndarray, categorical: np.ndarray) -> np.ndarray:
+        """Class probabilities of every row."""
+        rows = len(numerical)
+        padded = 1 << max(rows - 1, 0).bit_length()
+        interpreter, numerical_index, categorical_index, output_index = self._interpreter(padded)
+        interpreter.set_tensor(numerical_index, np.pad(numerical, ((0, padded - rows), (0, 0))))
+        interpreter.set_tensor(categorical_index, np.pad(categorical, ((0, padded - rows), (0, 0))))
+        interpreter.invoke()
+        return interpreter.get_tensor(output_index)[:rows]
+
+
+def scoring_function(export_dir: Text) -> Callable[[List[Dict[Text, Any]]], List[Dict[Text, Any]]]:
+    """Scores a batch of JSON records with the export: the most likely class and its probability."""
+    config = ScoringConfig.load(os.path.join(export_dir, SCORING_CONFIG_FILE))
+    encoder = Encoder(config)
+    model = TfliteModel(os.path.join(export_dir, TFLITE_FILE))
+
+    def score(records: List[Dict[Text, Any]]) -> List[Dict[Text, Any]]:
+        probabilities = model.predict(*encoder.encode(records))
+        classes = probabilities.argmax(axis=1)
+        return [{'label': config.classes[class_id], 'probability': float(row[class_id])}
+                for class_id, row in zip(classes, probabilities)]
+
+    return score
+
+
+class MicroBatcher:
+    """Runs `predict` on batches of submitted records, each within `max_latency_ms` of its arrival
+    if the batch run time allows it.
+
+    Args:
+      predict: Scores a list of records, returns one result per record.
+      max_batch_size: Largest batch.
+      max_latency_ms: Deadline of a record after its arrival.
+    """
+
+    def __init__(self, predict: Callable[[List[Any]], Sequence[Any]], max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_latency_ms: float = DEFAULT_MAX_LATENCY_MS):
+        self._predict = predict
+        self._max_batch_size = max_batch_size
+        self._max_latency = max_latency_ms / 1000
+        self._service_seconds = 0.
+        self._queue = queue.Queue()
+        self.batch_sizes = []
+        self.latencies = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, record: Any) -> Future:
+        future = Future()
+        self._queue.put((time.perf_counter(), record, future))
+        return future
+
+    def close(self) -> None:
+        """Scores the records submitted so far and stops."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        pending = []
+        closed = False
+        while pending or not closed:
+            if not pending:
+                item = self._queue.get()
+                if item is None:
+                    closed = True
+                    continue
+                pending.append(item)
+            # Latest start of the batch that still answers its oldest record in time.
+            deadline = pending[0][0] + self._max_latency - self._service_seconds
+            while len(pending) < self._max_batch_size and not closed:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    closed = True
+                else:
+                    pending.append(item)
+            batch, pending = pending[:self._max_batch_size], pending[self._max_batch_size:]
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[Tuple[float, Any, Future]]) -> None:
+        start = time.perf_counter()
+        try:
+            results = self._predict([record for _, record, _ in batch])
+        except Exception as error:  # pylint: disable=broad-except
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+        end = time.perf_counter()
+        seconds = end - start
+        self._service_seconds = seconds if not self.batch_sizes else \
+            (1 - SERVICE_TIME_DECAY) * self._service_seconds + SERVICE_TIME_DECAY * seconds
+        self.batch_sizes.append(len(batch))
+        for (arrival, _, future), result in zip(batch, results):
+            self.latencies.append(end - arrival)
+            future.set_result(result)
+
+    def stats(self) -> Dict[Text, float]:
+        """Records, batches, mean batch size, latency percentiles and deadline misses so far."""
+        latencies_ms = np.array(self.latencies or [0.]) * 1000
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        return {'records': len(self.latencies), 'batches': len(self.batch_sizes),
+                'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.,
+                'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+                'max_ms': float(latencies_ms.max()),
+                'deadline_misses': int(np.sum(latencies_ms > self._max_latency * 1000))}
+
+
+def score_jsonl(lines: Iterable[Text], batcher: MicroBatcher, id_field: Optional[Text] = 'id',
+                records_per_sec: float = 0.) -> Iterable[Dict[Text, Any]]:
+    """Scores of the JSONL records of `lines` in input order, while later records are still being batched."""
+    in_flight = collections.deque()
+    start = time.perf_counter()
+    for i, line in enumerate(line for line in lines if line.strip()):
+        if records_per_sec > 0:
+            time.sleep(max(start + i / records_per_sec - time.perf_counter(), 0.))
+        record = json.loads(line)
+        in_flight.append((record.get(id_field), batcher.submit(record)))
+        while in_flight and in_flight[0][1].done():
+            yield _scored(*in_flight.popleft(), id_field)
+    batcher.close()
+    while in_flight:
+        yield _scored(*in_flight.popleft(), id_field)
+
+
+def _scored(record_id: Any, future: Future, id_field: Optional[Text]) -> Dict[Text, Any]:
+    return dict({id_field: record_id} if id_field and record_id is not None else {}, **future.result())
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    export_dir = find_export(args.model_dir)
+    batcher = MicroBatcher(scoring_function(export_dir), args.max_batch_size, args.max_latency_ms)
+    input_file = sys.stdin if args.input == '-' else open(args.input)
+    output_file = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for score in score_jsonl(input_file, batcher, args.id_field, args.records_per_sec):
+            output_file.write(json.dumps(score) + '\n')
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    stats = batcher.stats()
+    print(f"Scored {stats['records']} records with {export_dir} in {stats['batches']} batches of "
+          f"{stats['mean_batch_size']:.1f} on average; latency p50 {stats['p50_ms']:.1f} ms, "
+          f"p99 {stats['p99_ms']:.1f} ms, {stats['deadline_misses']} over {args.max_latency_ms} ms", file=sys.stderr)
@@ -0,0 +1,119 @@
+import importlib
+import os
+import tempfile
+
+import apache_beam as beam
+import numpy as np
+import pytest
+import tensorflow as tf
+import tensorflow_transform as tft
+import tensorflow_transform.beam as tft_beam
+from tensorflow_transform.tf_metadata import dataset_metadata, schema_utils
+
+import tfx_utils
+
+optimized_export = importlib.import_module('custom_components.9_pusher.src.optimized_export')
+scorer = importlib.import_module('custom_components.9_pusher.src.scorer')
+
+LABEL_KEY = optimized_export.evaluator.LABEL_KEY
+NUMERICAL_KEYS = ["num_0", "num_1"]
+CATEGORICAL_KEYS = ["transport_protocol"]
+FEATURE_SPEC = {"num_0": tf.io.VarLenFeature(tf.float32), "num_1": tf.io.VarLenFeature(tf.int64),
+                "transport_protocol": tf.io.VarLenFeature(tf.string), LABEL_KEY: tf.io.VarLenFeature(tf.string)}
+
+
+def affine_preprocessing_fn(inputs):
+    outputs = {key: tft.compute_and_apply_vocabulary(tfx_utils._fill_in_missing(inputs[key]), num_oov_buckets=1,
+                                                     vocab_filename=key) for key in CATEGORICAL_KEYS + [LABEL_KEY]}
+    outputs["num_0"] = tft.scale_to_0_1(tft.scale_to_z_score(tfx_utils._fill_in_missing(inputs["num_0"])))
+    outputs["num_1"] = tft.scale_to_z_score(tf.cast(tfx_utils._fill_in_missing(inputs["num_1"]), tf.float32))
+    return outputs
+
+
+def log_preprocessing_fn(inputs):
+    outputs = affine_preprocessing_fn(inputs)
+    outputs["num_0"] = tf.math.log1p(tfx_utils._fill_in_missing(inputs["num_0"]))
+    return outputs
+
+
+def instances(num_rows):
+    random = np.random.RandomState(0)
+    protocols = random.choice(["tcp", "udp", "icmp"], size=num_rows, p=[.6, .3, .1])
+    return [{"num_0": [float(random.rand() * 1000)], "num_1": [int(random.randint(0, 50))],
+             "transport_protocol": [protocol.encode()],
+             LABEL_KEY: [b"smurf." if protocol == "icmp" else b"normal."]} for protocol in protocols]
+
+
+def write_transform(preprocessing_fn, transform_dir):
+    metadata = dataset_metadata.DatasetMetadata(schema_utils.schema_from_feature_spec(FEATURE_SPEC))
+    with beam.Pipeline() as pipeline, tft_beam.Context(temp_dir=tempfile.mkdtemp()):
+        transform_fn = ((pipeline | beam.Create(instances(200)), metadata)
+                        | tft_beam.AnalyzeDataset(preprocessing_fn))
+        _ = transform_fn | tft_beam.WriteTransformFn(transform_dir)
+    return tft.TFTransformOutput(transform_dir)
+
+
+def serialized(instance):
+    example = tf.train.Example()
+    for key, values in instance.items():
+        feature = example.features.feature[key]
+        if FEATURE_SPEC[key].dtype == tf.string:
+            feature.bytes_list.value.extend(values)
+        elif FEATURE_SPEC[key].dtype == tf.int64:
+            feature.int64_list.value.extend(values)
+        else:
+            feature.float_list.value.extend(values)
+    return example.SerializeToString()
+
+
+def save_model(tf_transform_output, model_dir):
+    inputs = {key: tf.keras.layers.Input(shape=(), name=key, dtype=tf.float32) for key in NUMERICAL_KEYS}
+    inputs.update({key: tf.keras.layers.Input(shape=(), name=key, dtype=tf.int64) for key in CATEGORICAL_KEYS})
+    columns = [tf.keras.layers.Reshape((1,))(inputs[key]) for key in NUMERICAL_KEYS]
+    for key in CATEGORICAL_KEYS:
+        embedding = tf.keras.layers.Embedding(tfx_utils._vocabulary_size(tf_transform_output, key), 4)
+        columns.append(tf.keras.layers.Flatten()(embedding(tf.keras.layers.Reshape((1,))(inputs[key]))))
+    hidden = tf.keras.layers.Dense(8, activation='relu')(tf.keras.layers.concatenate(columns))
+    output = tf.keras.layers.Dense(tfx_utils._vocabulary_size(tf_transform_output, LABEL_KEY),
+                                   activation='softmax')(hidden)
+    model = tf.keras.Model(inputs=inputs, outputs=output)
+    model.compile(optimizer=tf.keras.optimizers.Adam(), loss='sparse_categorical_crossentropy')
+    signatures = {
+        'serving_default':
+            tfx_utils._get_serve_tf_examples_fn(model, tf_transform_output).get_concrete_function(
+                tf.TensorSpec(shape=[None], dtype=tf.string, name='examples')),
+    }
+    model.save(model_dir, save_format='tf', signatures=signatures)
+    return model
+
+
+def test_export_scores_like_transform_and_model():
+    # given
+    root = tempfile.mkdtemp()
+    transform_dir, model_dir, export_dir = (os.path.join(root, name) for name in ("transform", "model", "export"))
+    tf_transform_output = write_transform(affine_preprocessing_fn, transform_dir)
+    model = save_model(tf_transform_output, model_dir)
+    test_instances = instances(50) + [{"num_0": [3.], "num_1": [7], "transport_protocol": [b"igmp"]}]
+    records = [serialized(instance) for instance in test_instances]
+    # when
+    config = optimized_export.export(model_dir, transform_dir, export_dir, optimized_export.NONE, records)
+    report = optimized_export.accuracy_check(model_dir, export_dir, records)
+    # then
+    transformed = tf_transform_output.transform_features_layer()(
+        tf.io.parse_example(tf.constant(records), FEATURE_SPEC))
+    expected = model({key: transformed[key] for key in NUMERICAL_KEYS + CATEGORICAL_KEYS}).numpy()
+    encoder = scorer.Encoder(config)
+    actual = scorer.TfliteModel(os.path.join(export_dir, scorer.TFLITE_FILE)).predict(
+        *encoder.encode([optimized_export.example_to_record(record) for record in records]))
+    assert config.numerical_keys == NUMERICAL_KEYS and config.categorical_keys == CATEGORICAL_KEYS
+    assert config.classes == optimized_export.evaluator.label_classes(transform_dir)
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+    assert report["records"] == len(records) and report["agreement"] == 1.
+
+
+def test_non_affine_transform_is_not_folded():
+    # given
+    tf_transform_output = write_transform(log_preprocessing_fn, os.path.join(tempfile.mkdtemp(), "transform"))
+    # when / then
+    with pytest.raises(ValueError, match="num_0"):
+        optimized_export.fold_constants(tf_transform_output, NUMERICAL_KEYS, CATEGORICAL_KEYS)
@@ -0,0 +1,66 @@
+import importlib
+import json
+import threading
+import time
+
+scorer = importlib.import_module('custom_components.9_pusher.src.scorer')
+
+
+def fake_model(seconds_per_batch: float, seconds_per_record: float):
+    def predict(records):
+        time.sleep(seconds_per_batch + seconds_per_record * len(records))
+        return [{"label": "normal.", "probability": 1.} for _ in records]
+    return predict
+
+
+def gated_model(gate: threading.Event):
+    def predict(records):
+        gate.wait(5)
+        return [{"id": record["id"]} for record in records]
+    return predict
+
+
+def test_encodes_records_of_the_latest_export(tmp_path):
+    # given
+    config = scorer.ScoringConfig(numerical_keys=["num_0", "num_1"], categorical_keys=["transport_protocol"],
+                                  vocabularies={"transport_protocol": ["tcp", "udp"]},
+                                  classes=["normal.", "smurf.", "<oov>"], quantization="dynamic")
+    for version in ("1590000000", "1600000000"):
+        (tmp_path / version / scorer.OPTIMIZED_DIR).mkdir(parents=True)
+        (tmp_path / version / scorer.OPTIMIZED_DIR / scorer.SCORING_CONFIG_FILE).write_text(
+            json.dumps(config._asdict()))
+    # when
+    export_dir = scorer.find_export(str(tmp_path))
+    encoder = scorer.Encoder(scorer.ScoringConfig.load(f"{export_dir}/{scorer.SCORING_CONFIG_FILE}"))
+    numerical, categorical = encoder.encode([{"num_0": 3, "num_1": 0.5, "transport_protocol": "udp"},
+                                             {"num_0": 1, "transport_protocol": "icmp"}, {}])
+    # then
+    assert export_dir == str(tmp_path / "1600000000" / scorer.OPTIMIZED_DIR)
+    assert numerical.tolist() == [[3., .5], [1., 0.], [0., 0.]]
+    assert categorical.tolist() == [[1], [2], [2]]
+
+
+def test_batches_fill_up_while_the_model_is_busy():
+    # given
+    model_busy = threading.Event()
+    batcher = scorer.MicroBatcher(gated_model(model_busy), max_batch_size=64, max_latency_ms=50)
+    # when
+    futures = [batcher.submit({"id": i}) for i in range(400)]
+    model_busy.set()
+    batcher.close()
+    # then
+    assert [future.result()["id"] for future in futures] == list(range(400))
+    assert sum(batcher.batch_sizes) == 400
+    # Whatever the first batch got, the records queued behind it go out in full batches.
+    assert batcher.batch_sizes[1:-1] == [64] * (len(batcher.batch_sizes) - 2)
+
+
+def test_lone_records_do_not_wait_for_a_full_batch():
+    # given
+    lines = [json.dumps({"id": i, "num_0": i}) for i in range(5)]
+    batcher = scorer.MicroBatcher(fake_model(0.001, 0.), max_batch_size=64, max_latency_ms=10)
+    # when
+    scores = list(scorer.score_jsonl(lines, batcher, records_per_sec=10))
+    # then
+    assert [score["id"] for score in scores] == list(range(5))
+    assert len(batcher.batch_sizes) > 1
@@ -0,0 +1,198 @@
+"""
+Memory-mapped columnar cache of the KDD99 csv files.
+
+The cache is built once per content fingerprint of the input files:
+
+    <cache_root>/<fingerprint>/meta.json        row count, column names and vocabularies
+    <cache_root>/<fingerprint>/numerical.f32    all num_* columns as one row-major float32 matrix
+    <cache_root>/<fingerprint>/<key>.i32        dictionary encoded ids of every other column
+    <cache_root>/<fingerprint>/row_hash.u64     first 8 bytes of the sha256 of every csv line
+
+Readers memory-map the files, so slices are views of the page cache instead of re-parsed text.
+The row hashes are those KddExampleGen buckets the rows by, so `split_rows` selects the rows it
+writes to a split with the same hash_buckets.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterator, List, Optional, Text
+
+import numpy as np
+
+META_FILE = 'meta.json'
+NUMERICAL_FILE = 'numerical.f32'
+CODES_SUFFIX = '.i32'
+ROW_HASH_FILE = 'row_hash.u64'
+# Part of the fingerprint, so caches of an older layout are rebuilt rather than misread.
+LAYOUT_VERSION = b'2'
+CHUNK_SIZE = 1 << 20
+BLOCK_LINES = 100000
+
+
+def _open(path: Text):
+    with open(path, 'rb') as file:
+        magic = file.read(2)
+    return gzip.open(path, 'rb') if magic == b'\x1f\x8b' else open(path, 'rb')
+
+
+def fingerprint(paths: List[Text], chunk_size: int = CHUNK_SIZE) -> Text:
+    """sha256 over the contents of the files in sorted order."""
+    digest = hashlib.sha256(LAYOUT_VERSION)
+    for path in sorted(paths):
+        digest.update(str(os.path.getsize(path)).encode())
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_hash(line: bytes) -> int:
+    """Hash of a csv line without its newline, as KddExampleGen computes it."""
+    return int.from_bytes(hashlib.sha256(line).digest()[:8], 'big')
+
+
+def _iter_blocks(paths: List[Text], block_lines: int) -> Iterator[List[bytes]]:
+    """Yields the non-empty data lines, without newline, in blocks of `block_lines`."""
+    for path in sorted(paths):
+        with _open(path) as file:
+            file.readline()  # header
+            block = []
+            for line in file:
+                line = line.rstrip(b'\n')
+                if line.strip():
+                    block.append(line)
+                if len(block) == block_lines:
+                    yield block
+                    block = []
+            if block:
+                yield block
+
+
+def build_cache(paths: List[Text], cache_root: Text, block_lines: int = BLOCK_LINES) -> Text:
+    """Builds the cache of the csv files `paths` unless it exists already.
+
+    Args:
+      paths: csv files with header line, optionally gzipped. All files need the same header.
+      cache_root: Directory holding one cache per input fingerprint.
+      block_lines: Number of rows converted at once.
+    Returns:
+      Directory of the cache.
+    """
+    cache_dir = os.path.join(cache_root, fingerprint(paths))
+    if os.path.exists(os.path.join(cache_dir, META_FILE)):
+        print(f"Columnar cache {cache_dir} is up to date")
+        return cache_dir
+
+    with _open(sorted(paths)[0]) as file:
+        column_names = file.readline().decode().strip().split(',')
+    numerical_indices = [i for i, name in enumerate(column_names) if name.startswith('num_')]
+    categorical_indices = [i for i, name in enumerate(column_names) if not name.startswith('num_')]
+    vocabularies = {column_names[i]: {} for i in categorical_indices}  # type: Dict[Text, Dict[bytes, int]]
+
+    os.makedirs(cache_root, exist_ok=True)
+    # Build next to the final location and rename, so readers never see a half written cache.
+    build_dir = tempfile.mkdtemp(dir=cache_root, prefix='.build-')
+    rows = 0
+    try:
+        code_files = {column_names[i]: open(os.path.join(build_dir, column_names[i] + CODES_SUFFIX), 'wb')
+                      for i in categorical_indices}
+        with open(os.path.join(build_dir, NUMERICAL_FILE), 'wb') as numerical_file, \
+                open(os.path.join(build_dir, ROW_HASH_FILE), 'wb') as row_hash_file:
+            for block in _iter_blocks(paths, block_lines):
+                table = np.array([line.rstrip(b'\r').split(b',') for line in block], dtype=np.bytes_)
+                if table.ndim != 2 or table.shape[1] != len(column_names):
+                    raise ValueError(f"Rows {rows} to {rows + len(block)} do not have {len(column_names)} columns")
+                table[:, numerical_indices].astype(np.float32).tofile(numerical_file)
+                np.array([row_hash(line) for line in block], dtype=np.uint64).tofile(row_hash_file)
+                for i in categorical_indices:
+                    vocabulary = vocabularies[column_names[i]]
+                    values, inverse = np.unique(table[:, i], return_inverse=True)
+                    ids = np.array([vocabulary.setdefault(value, len(vocabulary)) for value in values.tolist()],
+                                   dtype=np.int32)
+                    ids[inverse].tofile(code_files[column_names[i]])
+                rows += len(block)
+        for code_file in code_files.values():
+            code_file.close()
+        with open(os.path.join(build_dir, META_FILE), 'w') as meta_file:
+            json.dump({'rows': rows,
+                       'numerical_keys': [column_names[i] for i in numerical_indices],
+                       'categorical_keys': [column_names[i] for i in categorical_indices],
+                       'vocabularies': {key: [value.decode() for value in vocabulary]
+                                        for key, vocabulary in vocabularies.items()}}, meta_file)
+        os.rename(build_dir, cache_dir)
+    except OSError:
+        if os.path.exists(os.path.join(cache_dir, META_FILE)):
+            # Another process finished the same cache first.
+            shutil.rmtree(build_dir, ignore_errors=True)
+            return cache_dir
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    print(f"Built columnar cache {cache_dir} with {rows} rows")
+    return cache_dir
+
+
+class ColumnarCache:
+    """Read-only, memory-mapped view of a cache built by `build_cache`."""
+
+    def __init__(self, cache_dir: Text):
+        with open(os.path.join(cache_dir, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        self.cache_dir = cache_dir
+        self.rows = meta['rows']
+        self.numerical_keys = meta['numerical_keys']
+        self.categorical_keys = meta['categorical_keys']
+        self._vocabularies = meta['vocabularies']
+        self.numerical = self._memmap(NUMERICAL_FILE, np.float32, (self.rows, len(self.numerical_keys)))
+        self._codes = {key: self._memmap(key + CODES_SUFFIX, np.int32, (self.rows,))
+                       for key in self.categorical_keys}
+        self.row_hashes = self._memmap(ROW_HASH_FILE, np.uint64, (self.rows,))
+
+    def _memmap(self, filename: Text, dtype, shape) -> np.ndarray:
+        if self.rows == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.cache_dir, filename), dtype=dtype, mode='r', shape=shape)
+
+    def codes(self, key: Text) -> np.ndarray:
+        """Dictionary encoded ids of a categorical column."""
+        return self._codes[key]
+
+    def vocabulary(self, key: Text) -> List[Text]:
+        """Values of a categorical column, indexed by id."""
+        return self._vocabularies[key]
+
+    def column(self, key: Text, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Zero-copy view of a numerical column or decoded values of a categorical one."""
+        if key in self._codes:
+            return np.array(self._vocabularies[key], dtype=object)[self._codes[key][start:stop]]
+        return self.numerical[start:stop, self.numerical_keys.index(key)]
+
+    def split_rows(self, hash_buckets: List[int], split: int) -> np.ndarray:
+        """Indices of the rows KddExampleGen writes to the `split`-th of splits with these hash_buckets."""
+        cumulative = np.cumsum(hash_buckets).tolist()
+        buckets = self.row_hashes % np.uint64(cumulative[-1])
+        lower = cumulative[split - 1] if split > 0 else 0
+        return np.flatnonzero((buckets >= lower) & (buckets < cumulative[split]))
+
+    def batches(self, batch_size: int, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict[Text, np.ndarray]]:
+        """Yields dicts of column slices; numerical columns are views, categoricals decoded bytes."""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        vocabularies = {key: np.array([value.encode() for value in self._vocabularies[key]], dtype=object)
+                        for key in self.categorical_keys}
+        for begin in range(start, stop, batch_size):
+            end = min(begin + batch_size, stop)
+            batch = {key: self.numerical[begin:end, i] for i, key in enumerate(self.numerical_keys)}
+            for key in self.categorical_keys:
+                batch[key] = vocabularies[key][self._codes[key][begin:end]]
+            yield batch
+
+
+def cache_dir_of(artifact_uri: Text) -> Text:
+    """Reads the cache location recorded in a ColumnarCache artifact."""
+    with open(os.path.join(artifact_uri, 'cache.json')) as pointer_file:
+        return json.load(pointer_file)['cache_dir']
@@ -0,0 +1,36 @@
+from typing import Text
+
+from tfx import types
+from tfx.components.base import executor_spec
+from tfx.components.base.base_component import BaseComponent
+from tfx.types import ComponentSpec, channel_utils, component_spec, standard_artifacts
+from tfx.types.artifact import Artifact
+
+from custom_components.columnar_cache.src import executor
+
+
+class ColumnarCache(Artifact):
+    """Pointer to a memory-mapped columnar cache on the shared volume."""
+    TYPE_NAME = 'ColumnarCache'
+
+
+class ColumnarCacheComponent(BaseComponent):
+    class _ComponentSpec(ComponentSpec):
+        INPUTS = {
+            'input': component_spec.ChannelParameter(type=standard_artifacts.ExternalArtifact),
+        }
+        OUTPUTS = {
+            'cache': component_spec.ChannelParameter(type=ColumnarCache),
+        }
+        PARAMETERS = {
+            'cache_root': component_spec.ExecutionParameter(type=Text),
+        }
+
+    SPEC_CLASS = _ComponentSpec
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
+
+    def __init__(self, input: types.Channel, cache_root: str):  # pylint: disable=redefined-builtin
+        cache = channel_utils.as_channel([ColumnarCache()])
+        spec = self._ComponentSpec(input=input, cache=cache, cache_root=cache_root)
+        super(ColumnarCacheComponent, self).__init__(spec)
@@ -0,0 +1,31 @@
+import json
+import os
+from typing import Any, Dict, List, Text
+
+from tfx import types
+from tfx.components.base import base_executor
+from tfx.types import artifact_utils
+
+from custom_components.columnar_cache.src import columnar_cache
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+
+
+class Executor(InstrumentedExecutorMixin, base_executor.BaseExecutor):
+    """Builds the columnar cache of the input csv files, or reuses it if the fingerprint matches."""
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        with self.span('resolve'):
+            input_base = artifact_utils.get_single_uri(input_dict['input'])
+            paths = [os.path.join(input_base, filename) for filename in sorted(os.listdir(input_base))
+                     if os.path.isfile(os.path.join(input_base, filename))]
+        with self.span('compute'):
+            cache_dir = columnar_cache.build_cache(paths, exec_properties['cache_root'])
+        self.add_rows(columnar_cache.ColumnarCache(cache_dir).rows)
+
+        cache = artifact_utils.get_single_instance(output_dict['cache'])
+        cache.set_string_custom_property('cache_dir', cache_dir)
+        os.makedirs(cache.uri, exist_ok=True)
+        with open(os.path.join(cache.uri, 'cache.json'), 'w') as pointer_file:
+            json.dump({'cache_dir': cache_dir}, pointer_file)
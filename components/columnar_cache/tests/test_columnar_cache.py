@@ -0,0 +1,59 @@
+import numpy as np
+
+from custom_components.columnar_cache.src.columnar_cache import ColumnarCache, build_cache, row_hash
+
+HEADER = "num_0,transport_protocol,num_1,label_0\n"
+ROWS = "0,tcp,1.5,normal.\n2,udp,0.25,smurf.\n4,tcp,3,normal.\n"
+
+
+def write_csv(tmp_path, rows=ROWS) -> str:
+    path = tmp_path / "input" / "kddcup.csv"
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(HEADER + rows)
+    return str(path)
+
+
+def test_builds_columns(tmp_path):
+    # given
+    csv_path = write_csv(tmp_path)
+    # when
+    cache = ColumnarCache(build_cache([csv_path], str(tmp_path / "cache"), block_lines=2))
+    # then
+    assert cache.rows == 3
+    np.testing.assert_array_equal(cache.numerical, [[0, 1.5], [2, 0.25], [4, 3]])
+    assert list(cache.column("transport_protocol")) == ["tcp", "udp", "tcp"]
+    assert cache.vocabulary("label_0")[cache.codes("label_0")[1]] == "smurf."
+
+
+def test_reuses_cache_of_same_content(tmp_path):
+    # given
+    cache_dir = build_cache([write_csv(tmp_path)], str(tmp_path / "cache"))
+    # when
+    same_dir = build_cache([write_csv(tmp_path)], str(tmp_path / "cache"))
+    changed_dir = build_cache([write_csv(tmp_path, ROWS + "1,icmp,0,smurf.\n")], str(tmp_path / "cache"))
+    # then
+    assert same_dir == cache_dir
+    assert changed_dir != cache_dir
+
+
+def test_batches_are_views(tmp_path):
+    # given
+    cache = ColumnarCache(build_cache([write_csv(tmp_path)], str(tmp_path / "cache")))
+    # when
+    batches = list(cache.batches(2))
+    # then
+    assert [len(batch["num_1"]) for batch in batches] == [2, 1]
+    assert np.shares_memory(batches[0]["num_1"], cache.numerical)
+    assert list(batches[1]["label_0"]) == [b"normal."]
+
+
+def test_splits_rows_like_kdd_example_gen(tmp_path):
+    # given
+    rows = "".join(f"{i},tcp,{i / 2},normal.\n" for i in range(300))
+    cache = ColumnarCache(build_cache([write_csv(tmp_path, rows)], str(tmp_path / "cache"), block_lines=64))
+    # when
+    train, eval_ = cache.split_rows([2, 1], 0), cache.split_rows([2, 1], 1)
+    # then
+    expected_eval = [i for i, line in enumerate(rows.encode().splitlines()) if row_hash(line) % 3 == 2]
+    assert eval_.tolist() == expected_eval
+    assert sorted(train.tolist() + eval_.tolist()) == list(range(300))
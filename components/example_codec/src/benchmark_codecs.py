@@ -0,0 +1,116 @@
+"""
+Read throughput and disk size of KDD99 examples with every codec, and the codec for a disk budget.
+
+A sample of the records of an Examples split is rewritten with each codec; the files are read back
+with tf.data in batches like tfx_utils._input_fn does, without parsing. The sizes are extrapolated
+to `--total-records` examples and the fastest codec to read whose examples fit the budget is
+recommended.
+
+Usage: python -m custom_components.example_codec.src.benchmark_codecs \
+           --examples <pipeline root>/KddExampleGen/examples/<id>/train --disk-budget-gib 1.5
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Sequence, Text
+
+import tensorflow as tf
+
+from custom_components.example_codec.src import example_codec
+
+DEFAULT_CODECS = ['none', 'zlib-1', 'zlib-6', 'gzip-1', 'gzip-6', 'gzip-9']
+DEFAULT_SAMPLE_RECORDS = 200000
+KDD99_RECORDS = 4898431
+READ_BATCH_SIZE = 1024
+READ_PASSES = 3
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark of the example codecs on KDD99 examples')
+    parser.add_argument('--examples', type=str, required=True,
+                        help='Directory of the TFRecord files of one split, of any codec.')
+    parser.add_argument('--codecs', type=str, nargs='+', default=DEFAULT_CODECS)
+    parser.add_argument('--sample-records', type=int, default=DEFAULT_SAMPLE_RECORDS)
+    parser.add_argument('--total-records', type=int, default=KDD99_RECORDS,
+                        help='Examples the disk budget has to hold, by default all of KDD99.')
+    parser.add_argument('--disk-budget-gib', type=float, default=None,
+                        help='Space for one copy of the examples; without it the fastest codec is recommended.')
+    parser.add_argument('--work-dir', type=str, default='/tmp/codec_benchmark')
+    parser.add_argument('--output', type=str, default=None, help='Result JSON.')
+
+    return parser.parse_args()
+
+
+def read_sample(paths: Sequence[Text], num_records: int) -> List[bytes]:
+    dataset = tf.data.TFRecordDataset(list(paths), compression_type=example_codec.Codec(
+        example_codec.compression_of_files(paths)).compression_type)
+    return [record.numpy() for record in dataset.take(num_records)]
+
+
+def measure(records: List[bytes], codec: example_codec.Codec, work_dir: Text,
+            total_records: int) -> Dict[Text, Any]:
+    """Write and best-of-READ_PASSES read time of the records with one codec, and their size."""
+    path = os.path.join(work_dir, codec.name, 'data_tfrecord' + codec.suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    start = time.time()
+    with tf.io.TFRecordWriter(path, options=codec.record_options()) as writer:
+        for record in records:
+            writer.write(record)
+    write_seconds = time.time() - start
+
+    read_seconds = float('inf')
+    for _ in range(READ_PASSES):
+        dataset = tf.data.TFRecordDataset(path, compression_type=codec.compression_type).batch(READ_BATCH_SIZE)
+        start = time.time()
+        for _ in dataset:
+            pass
+        read_seconds = min(read_seconds, time.time() - start)
+    size = os.path.getsize(path)
+    raw_bytes = sum(len(record) for record in records)
+    return {'codec': codec.name,
+            'bytes': size,
+            'ratio': raw_bytes / max(size, 1),
+            'total_gib': size / len(records) * total_records / (1 << 30),
+            'write_records_per_sec': len(records) / max(write_seconds, 1e-9),
+            'read_records_per_sec': len(records) / max(read_seconds, 1e-9),
+            'read_mib_per_sec': raw_bytes / (1 << 20) / max(read_seconds, 1e-9)}
+
+
+def recommend(results: List[Dict[Text, Any]], disk_budget_gib: Optional[float]) -> Dict[Text, Any]:
+    """The fastest codec to read whose extrapolated size fits the budget, else the smallest one."""
+    fitting = [result for result in results if disk_budget_gib is None or result['total_gib'] <= disk_budget_gib]
+    if fitting:
+        return max(fitting, key=lambda result: result['read_records_per_sec'])
+    return min(results, key=lambda result: result['total_gib'])
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    paths = sorted(path for path in glob.glob(os.path.join(args.examples, '*')) if os.path.isfile(path))
+    records = read_sample(paths, args.sample_records)
+    print(f"Read {len(records)} records of {len(paths)} files in {args.examples}")
+    shutil.rmtree(args.work_dir, ignore_errors=True)
+    results = [measure(records, example_codec.parse_codec(name), args.work_dir, args.total_records)
+               for name in args.codecs]
+    shutil.rmtree(args.work_dir, ignore_errors=True)
+
+    print(f"{'codec':<10}{'ratio':>8}{'GiB total':>11}{'write rec/s':>13}{'read rec/s':>12}{'read MiB/s':>12}")
+    for result in results:
+        print(f"{result['codec']:<10}{result['ratio']:>8.1f}{result['total_gib']:>11.2f}"
+              f"{result['write_records_per_sec']:>13.0f}{result['read_records_per_sec']:>12.0f}"
+              f"{result['read_mib_per_sec']:>12.1f}")
+    best = recommend(results, args.disk_budget_gib)
+    if args.disk_budget_gib is not None and best['total_gib'] > args.disk_budget_gib:
+        print(f"No codec fits {args.disk_budget_gib} GiB for {args.total_records} examples, "
+              f"the smallest is {best['codec']} with {best['total_gib']:.2f} GiB")
+    else:
+        print(f"Recommended: EXAMPLE_CODEC={best['codec']} ({best['total_gib']:.2f} GiB for {args.total_records} "
+              f"examples, {best['read_records_per_sec']:.0f} records/s)")
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'sample_records': len(records), 'total_records': args.total_records,
+                       'disk_budget_gib': args.disk_budget_gib, 'results': results,
+                       'recommended': best['codec']}, output_file, indent=2)
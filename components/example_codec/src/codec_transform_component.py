@@ -0,0 +1,12 @@
+from tfx.components import Transform
+from tfx.components.base import executor_spec
+
+from custom_components.example_codec.src import transform_executor
+
+
+class CodecTransform(Transform):
+    """Drop-in replacement of Transform whose transformed examples are compressed with the codec of
+    EXAMPLE_CODEC, see example_codec.py. With the default gzip codec it writes what Transform writes.
+    """
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(transform_executor.Executor)
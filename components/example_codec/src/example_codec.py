@@ -0,0 +1,124 @@
+"""
+Compression of the TFRecord files of Examples artifacts.
+
+A codec is `none`, `zlib` or `gzip`, the latter two with an optional level from 0 to 9, e.g. `zlib-1`.
+KddExampleGen, ExampleDedup and CodecTransform write their examples with the codec of the
+environment variable EXAMPLE_CODEC (default gzip, what the stock components write) and record it
+on the artifact as the custom properties `compression` and `compression_level`. Readers of an
+artifact take the compression from there; readers of plain files, like run_fn of tfx_utils.py,
+which only gets file patterns, and readers of artifacts of other components sniff it from the
+first bytes of a file. The file names end in .gz, .deflate or nothing, from which the Beam readers
+of the stock components, like StatisticsGen and Transform, infer the compression on their own.
+
+Uncompressed examples spare the Trainer the inflate work but take many times the disk space;
+benchmark_codecs.py measures both on KDD99 data and recommends a codec for a disk budget.
+"""
+import os
+import zlib
+from typing import Iterable, NamedTuple, Optional, Text
+
+CODEC_ENV = 'EXAMPLE_CODEC'
+COMPRESSION_PROPERTY = 'compression'
+LEVEL_PROPERTY = 'compression_level'
+NONE, ZLIB, GZIP = 'NONE', 'ZLIB', 'GZIP'
+_SUFFIXES = {NONE: '', ZLIB: '.deflate', GZIP: '.gz'}
+_GZIP_MAGIC = b'\x1f\x8b'
+_SNIFF_BYTES = 64
+
+
+class Codec(NamedTuple):
+    compression: Text = GZIP  # NONE, ZLIB or GZIP
+    level: Optional[int] = None  # 0 to 9, None is the zlib default of 6
+
+    @property
+    def name(self) -> Text:
+        name = self.compression.lower()
+        return name if self.level is None or self.compression == NONE else f"{name}-{self.level}"
+
+    @property
+    def compression_type(self) -> Text:
+        """The compression_type of tf.data.TFRecordDataset and tf.io.TFRecordOptions."""
+        return '' if self.compression == NONE else self.compression
+
+    @property
+    def suffix(self) -> Text:
+        return _SUFFIXES[self.compression]
+
+    def record_options(self):
+        """tf.io.TFRecordOptions for tf.io.TFRecordWriter."""
+        import tensorflow as tf
+        return tf.io.TFRecordOptions(compression_type=self.compression_type, compression_level=self.level)
+
+    def beam_compression_type(self):
+        """Compression type of Beam's WriteToTFRecord, whose DEFLATE is the zlib format of TF's ZLIB.
+        Beam has no compression levels and always writes the default level.
+        """
+        from apache_beam.io.filesystem import CompressionTypes
+        return {NONE: CompressionTypes.UNCOMPRESSED, ZLIB: CompressionTypes.DEFLATE,
+                GZIP: CompressionTypes.GZIP}[self.compression]
+
+
+DEFAULT_CODEC = Codec()
+
+
+def parse_codec(text: Text) -> Codec:
+    """The codec of a name like `none`, `zlib` or `gzip-9`."""
+    compression, _, level = text.strip().upper().partition('-')
+    if compression not in _SUFFIXES or (level and (compression == NONE or not level.isdigit() or int(level) > 9)):
+        raise ValueError(f"Unknown example codec {text}, expected none, zlib or gzip with an optional level 0-9")
+    return Codec(compression, int(level) if level else None)
+
+
+def from_environment() -> Codec:
+    """The codec writers use, from EXAMPLE_CODEC."""
+    return parse_codec(os.environ.get(CODEC_ENV) or DEFAULT_CODEC.name)
+
+
+def record(artifact, codec: Codec) -> None:
+    """Stores the codec of the files of an Examples artifact in its metadata."""
+    artifact.set_string_custom_property(COMPRESSION_PROPERTY, codec.compression)
+    if codec.level is not None:
+        artifact.set_int_custom_property(LEVEL_PROPERTY, codec.level)
+
+
+def sniff_compression(path: Text) -> Text:
+    """NONE, ZLIB or GZIP, from the first bytes of a TFRecord file.
+
+    A zlib stream starts with two bytes whose big-endian value is a multiple of 31. The record length
+    at the start of an uncompressed file can look like that too, e.g. for 376 byte records, but
+    does not continue as a valid deflate stream.
+    """
+    with open(path, 'rb') as record_file:
+        head = record_file.read(_SNIFF_BYTES)
+    if head.startswith(_GZIP_MAGIC):
+        return GZIP
+    if len(head) >= 2 and head[0] & 0x0f == 8 and (head[0] << 8 | head[1]) % 31 == 0:
+        try:
+            zlib.decompressobj().decompress(head)
+            return ZLIB
+        except zlib.error:
+            pass
+    return NONE
+
+
+def compression_of_files(paths: Iterable[Text]) -> Text:
+    """Compression of a set of TFRecord files written together, sniffed from the first non-empty one.
+    Empty files have no header to sniff and read the same with every compression type.
+    """
+    for path in paths:
+        if os.path.getsize(path):
+            return sniff_compression(path)
+    return DEFAULT_CODEC.compression
+
+
+def compression_type_of_files(paths: Iterable[Text]) -> Text:
+    """compression_type for tf.data of the files, sniffed like in `compression_of_files`."""
+    return Codec(compression_of_files(paths)).compression_type
+
+
+def compression_type(artifact, paths: Iterable[Text]) -> Text:
+    """compression_type of the files of an Examples artifact: from its metadata if a writer of this
+    module recorded it, else sniffed from the files.
+    """
+    compression = artifact.get_string_custom_property(COMPRESSION_PROPERTY) if artifact is not None else ''
+    return Codec(compression).compression_type if compression else compression_type_of_files(paths)
@@ -0,0 +1,39 @@
+import os
+from typing import Any, Dict, List, Optional, Text, Tuple, Union
+
+import apache_beam as beam
+from tfx import types
+from tfx.components.transform import executor as transform_executor
+
+from custom_components.example_codec.src import example_codec
+from custom_components.resource_planner.src import resource_planner
+
+
+class Executor(transform_executor.Executor):
+    """Transform executor that writes the transformed examples with the codec of EXAMPLE_CODEC."""
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        for artifact in output_dict.get('transformed_examples', []):
+            example_codec.record(artifact, example_codec.from_environment())
+        super(Executor, self).Do(input_dict, output_dict, exec_properties)
+
+    def _GetDesiredBatchSize(self, data_format: Union[Text, int]) -> Optional[int]:
+        """The batch size of the resource plan in DESIRED_BATCH_SIZE, else the default of Transform."""
+        batch_size = os.environ.get(resource_planner.BATCH_SIZE_ENV)
+        if batch_size and not self._IsDataFormatSequenceExample(data_format):
+            return int(batch_size)
+        return super(Executor, self)._GetDesiredBatchSize(data_format)
+
+    @staticmethod
+    @beam.ptransform_fn
+    @beam.typehints.with_input_types(Tuple[Optional[bytes], bytes])
+    @beam.typehints.with_output_types(beam.pvalue.PDone)
+    def _WriteExamples(pcoll: beam.pvalue.PCollection, file_format: Text,
+                       transformed_example_path: Text) -> beam.pvalue.PDone:
+        codec = example_codec.from_environment()
+        return (pcoll
+                | 'Values' >> beam.Values()
+                | 'Write' >> beam.io.WriteToTFRecord(transformed_example_path, file_name_suffix=codec.suffix,
+                                                     compression_type=codec.beam_compression_type()))
@@ -0,0 +1,38 @@
+import gzip
+import struct
+import zlib
+
+import pytest
+
+from custom_components.example_codec.src import example_codec
+
+
+def tf_records(lengths):
+    """TFRecord framing with zero checksums, enough for sniffing."""
+    return b''.join(struct.pack('<Q', length) + b'\0' * 4 + b'x' * length + b'\0' * 4 for length in lengths)
+
+
+def test_parses_codec_names():
+    # when
+    codecs = [example_codec.parse_codec(name) for name in ('none', 'zlib-1', 'GZIP', 'gzip-9')]
+    # then
+    assert [codec.name for codec in codecs] == ['none', 'zlib-1', 'gzip', 'gzip-9']
+    assert [codec.compression_type for codec in codecs] == ['', 'ZLIB', 'GZIP', 'GZIP']
+    assert [codec.suffix for codec in codecs] == ['', '.deflate', '.gz', '.gz']
+    for name in ('lz4', 'none-1', 'gzip-10'):
+        with pytest.raises(ValueError):
+            example_codec.parse_codec(name)
+
+
+def test_sniffs_compression_of_files(tmp_path):
+    # given
+    records = tf_records([376, 1200, 40])  # a 376 byte length starts like a zlib header
+    files = {'none': records, 'zlib': zlib.compress(records, 1), 'gzip': gzip.compress(records)}
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+    (tmp_path / 'empty').write_bytes(b'')
+    # when
+    compressions = {name: example_codec.sniff_compression(str(tmp_path / name)) for name in files}
+    # then
+    assert compressions == {'none': 'NONE', 'zlib': 'ZLIB', 'gzip': 'GZIP'}
+    assert example_codec.compression_type_of_files([str(tmp_path / 'empty'), str(tmp_path / 'none')]) == ''
@@ -0,0 +1,133 @@
+"""
+Streaming exact-duplicate collapsing with bounded memory.
+
+Records are counted in a dict keyed by a 16 byte digest of their canonical form. When the distinct
+records held in memory exceed the budget, the partial counts are spilled to hash partitions on disk
+and the dict starts over; afterwards every partition is merged on its own (and split again by the
+next digest byte if it is still larger than the budget). Each distinct record is yielded once with
+its total count.
+"""
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_MEMORY_BUDGET = 512 << 20
+NUM_PARTITIONS = 64
+ENTRY_OVERHEAD = 200  # approximate bytes of dict entry, digest and count besides the record itself
+_HEADER = struct.Struct('<16sQI')  # digest, count, record length
+_MAX_DEPTH = 8
+
+
+def digest(record: bytes) -> bytes:
+    return hashlib.blake2b(record, digest_size=16).digest()
+
+
+def _write_entries(table: Dict[bytes, List], partitions: List[BinaryIO], depth: int) -> None:
+    for key, (count, record) in table.items():
+        partitions[key[depth] % len(partitions)].write(_HEADER.pack(key, count, len(record)) + record)
+
+
+def _read_entries(path: str) -> Iterator[Tuple[bytes, int, bytes]]:
+    with open(path, 'rb') as partition:
+        while True:
+            header = partition.read(_HEADER.size)
+            if not header:
+                return
+            key, count, length = _HEADER.unpack(header)
+            yield key, count, partition.read(length)
+
+
+class _Table:
+    """Distinct records and counts in memory, spilling into partitions when over budget."""
+
+    def __init__(self, memory_budget: int, spill_dir: str, depth: int, num_partitions: int):
+        self._memory_budget = memory_budget
+        self._spill_dir = spill_dir
+        self._depth = depth
+        self._num_partitions = num_partitions
+        self._table = {}  # type: Dict[bytes, List]
+        self._table_bytes = 0
+        self._partitions = None  # type: Optional[List[BinaryIO]]
+        self.spilled = False
+
+    def add(self, key: bytes, count: int, record: bytes) -> None:
+        entry = self._table.get(key)
+        if entry is not None:
+            entry[0] += count
+            return
+        self._table[key] = [count, record]
+        self._table_bytes += len(record) + ENTRY_OVERHEAD
+        if self._table_bytes > self._memory_budget:
+            self._spill()
+
+    def _partition_path(self, index: int) -> str:
+        return os.path.join(self._spill_dir, f"partition-{self._depth}-{index:03d}")
+
+    def _spill(self) -> None:
+        if self._partitions is None:
+            self._partitions = [open(self._partition_path(i), 'wb') for i in range(self._num_partitions)]
+            self.spilled = True
+        _write_entries(self._table, self._partitions, self._depth)
+        self._table.clear()
+        self._table_bytes = 0
+
+    def drain(self) -> Iterator[Tuple[int, bytes]]:
+        if self._partitions is None:
+            for count, record in self._table.values():
+                yield count, record
+            self._table.clear()
+            return
+        self._spill()
+        for partition in self._partitions:
+            partition.close()
+        for index in range(self._num_partitions):
+            path = self._partition_path(index)
+            sub_dir = None
+            if self._depth + 1 < _MAX_DEPTH and os.path.getsize(path) > self._memory_budget:
+                sub_dir = tempfile.mkdtemp(dir=self._spill_dir)
+                table = _Table(self._memory_budget, sub_dir, self._depth + 1, self._num_partitions)
+            else:
+                # Small enough to merge in memory, or as deep as the digest allows.
+                table = _Table(float('inf'), self._spill_dir, self._depth + 1, self._num_partitions)
+            for key, count, record in _read_entries(path):
+                table.add(key, count, record)
+            os.remove(path)
+            yield from table.drain()
+            if sub_dir:
+                shutil.rmtree(sub_dir, ignore_errors=True)
+
+
+def dedup_records(records: Iterable[bytes], key_fn: Callable[[bytes], bytes] = bytes,
+                  memory_budget: int = DEFAULT_MEMORY_BUDGET, spill_dir: Optional[str] = None,
+                  num_partitions: int = NUM_PARTITIONS, stats: Optional[Dict[str, int]] = None
+                  ) -> Iterator[Tuple[int, bytes]]:
+    """Yields (count, record) once per distinct record.
+
+    Args:
+      records: Input records, read once.
+      key_fn: Canonical form of a record; records with the same canonical form are duplicates.
+      memory_budget: Approximate bytes of distinct records held in memory before spilling.
+      spill_dir: Directory for the partitions, a temporary directory by default.
+      num_partitions: Number of partitions per spill level.
+      stats: If given, receives the numbers of input and output records and whether it spilled.
+    """
+    owned_dir = spill_dir is None
+    spill_dir = tempfile.mkdtemp(prefix='dedup-') if owned_dir else spill_dir
+    os.makedirs(spill_dir, exist_ok=True)
+    table = _Table(memory_budget, spill_dir, 0, num_partitions)
+    rows_in = rows_out = 0
+    try:
+        for record in records:
+            table.add(digest(key_fn(record)), 1, record)
+            rows_in += 1
+        for count, record in table.drain():
+            rows_out += 1
+            yield count, record
+    finally:
+        if owned_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        if stats is not None:
+            stats.update(rows_in=rows_in, rows_out=rows_out, spilled=int(table.spilled))
@@ -0,0 +1,41 @@
+from typing import Optional
+
+from tfx import types
+from tfx.components.base import executor_spec
+from tfx.components.base.base_component import BaseComponent
+from tfx.types import ComponentSpec, artifact_utils, channel_utils, component_spec, standard_artifacts
+
+from custom_components.example_dedup.src import executor
+
+
+class ExampleDedup(BaseComponent):
+    """Emits every distinct example once, with the number of its occurrences as `weight` feature.
+
+    Placed between ExampleGen and StatisticsGen; StatisticsGen, preprocessing_fn and run_fn use the
+    weight, so statistics and model match those of the full data.
+    """
+
+    class _ComponentSpec(ComponentSpec):
+        INPUTS = {
+            'examples': component_spec.ChannelParameter(type=standard_artifacts.Examples),
+        }
+        OUTPUTS = {
+            'deduplicated_examples': component_spec.ChannelParameter(type=standard_artifacts.Examples),
+        }
+        PARAMETERS = {
+            # Distinct examples held in memory before spilling to disk, per split.
+            'memory_budget_mib': component_spec.ExecutionParameter(type=int, optional=True),
+        }
+
+    SPEC_CLASS = _ComponentSpec
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
+
+    def __init__(self, examples: types.Channel, memory_budget_mib: Optional[int] = None,
+                 split_names=('train', 'eval')):
+        deduplicated_examples = standard_artifacts.Examples()
+        deduplicated_examples.split_names = artifact_utils.encode_split_names(list(split_names))
+        spec = self._ComponentSpec(examples=examples,
+                                   deduplicated_examples=channel_utils.as_channel([deduplicated_examples]),
+                                   memory_budget_mib=memory_budget_mib)
+        super(ExampleDedup, self).__init__(spec)
@@ -0,0 +1,67 @@
+import os
+from typing import Any, Dict, List, Text
+
+import absl
+import tensorflow as tf
+from tfx import types
+from tfx.components.base import base_executor
+from tfx.types import artifact_utils
+
+from custom_components.example_codec.src import example_codec
+from custom_components.example_dedup.src.dedup import DEFAULT_MEMORY_BUDGET, dedup_records
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+
+WEIGHT_KEY = 'weight'
+DEFAULT_FILE_NAME = 'data_tfrecord-00000-of-00001'
+
+
+def canonical_example(record: bytes) -> bytes:
+    """Serialization with sorted feature keys, so equal rows compare equal however they were written."""
+    return tf.train.Example.FromString(record).SerializeToString(deterministic=True)
+
+
+def dedup_split(input_uri: Text, output_uri: Text, memory_budget: int, spill_dir: Text,
+                input_compression: Text = example_codec.GZIP,
+                codec: example_codec.Codec = example_codec.DEFAULT_CODEC) -> Dict[Text, int]:
+    """Writes every distinct example of a split once, with its number of occurrences as `weight`."""
+    paths = sorted(tf.io.gfile.glob(os.path.join(input_uri, '*')))
+    options = tf.io.TFRecordOptions(input_compression)
+    records = (record for path in paths for record in tf.compat.v1.io.tf_record_iterator(path, options))
+    stats = {}
+    tf.io.gfile.makedirs(output_uri)
+    with tf.io.TFRecordWriter(os.path.join(output_uri, DEFAULT_FILE_NAME + codec.suffix),
+                              options=codec.record_options()) as writer:
+        for count, record in dedup_records(records, canonical_example, memory_budget, spill_dir, stats=stats):
+            example = tf.train.Example.FromString(record)
+            if WEIGHT_KEY in example.features.feature:
+                # Input deduplicated before: the counts multiply.
+                count *= example.features.feature[WEIGHT_KEY].int64_list.value[0]
+                del example.features.feature[WEIGHT_KEY]
+            example.features.feature[WEIGHT_KEY].int64_list.value.append(count)
+            writer.write(example.SerializeToString())
+    return stats
+
+
+class Executor(InstrumentedExecutorMixin, base_executor.BaseExecutor):
+    """Collapses exact duplicate examples of every split into one example with a weight."""
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        self._log_startup(input_dict, output_dict, exec_properties)
+        examples = artifact_utils.get_single_instance(input_dict['examples'])
+        memory_budget = (exec_properties.get('memory_budget_mib') or DEFAULT_MEMORY_BUDGET >> 20) << 20
+        codec = example_codec.from_environment()
+        example_codec.record(artifact_utils.get_single_instance(output_dict['deduplicated_examples']), codec)
+        for split in artifact_utils.decode_split_names(examples.split_names):
+            input_uri = artifact_utils.get_split_uri(input_dict['examples'], split)
+            input_compression = example_codec.compression_type(
+                examples, sorted(tf.io.gfile.glob(os.path.join(input_uri, '*'))))
+            with self.span('compute'):
+                stats = dedup_split(input_uri,
+                                    artifact_utils.get_split_uri(output_dict['deduplicated_examples'], split),
+                                    memory_budget, os.path.join(self._get_tmp_dir(), 'dedup', split),
+                                    input_compression, codec)
+            self.add_rows(stats['rows_in'])
+            absl.logging.info('Split {}: {} examples collapsed to {} distinct ones ({}spilled to disk)'.format(
+                split, stats['rows_in'], stats['rows_out'], '' if stats['spilled'] else 'not '))
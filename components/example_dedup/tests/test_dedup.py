@@ -0,0 +1,36 @@
+import collections
+import random
+
+from custom_components.example_dedup.src.dedup import dedup_records
+
+
+def make_records(distinct: int, total: int):
+    rng = random.Random(0)
+    return [f"row-{rng.randrange(distinct)},{'x' * 50}".encode() for _ in range(total)]
+
+
+def test_counts_in_memory(tmp_path):
+    # given
+    records = make_records(100, 5000)
+    stats = {}
+    # when
+    result = dict((record, count) for count, record in dedup_records(records, stats=stats))
+    # then
+    assert result == collections.Counter(records)
+    assert stats == {"rows_in": 5000, "rows_out": 100, "spilled": 0}
+
+
+def test_spills_and_splits_partitions_over_budget(tmp_path):
+    # given
+    records = make_records(3000, 20000)
+    stats = {}
+    # when
+    result = collections.Counter()
+    for count, record in dedup_records(records, memory_budget=20000, spill_dir=str(tmp_path),
+                                       num_partitions=4, stats=stats):
+        assert record not in result
+        result[record] = count
+    # then
+    assert result == collections.Counter(records)
+    assert stats["spilled"] == 1
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,77 @@
+"""
+Compares CsvExampleGen with the KDD99 ExampleGen executor on the same csv file.
+
+Usage: python -m custom_components.example_gen.src.benchmark_example_gen --source kddcup.gz
+"""
+import argparse
+import gzip
+import os
+import shutil
+import time
+from typing import Any, Dict, Text
+
+from google.protobuf import json_format
+from tfx.components.base import base_executor
+from tfx.components.example_gen import utils
+from tfx.components.example_gen.csv_example_gen import executor as csv_executor
+from tfx.types import artifact_utils, standard_artifacts
+
+from custom_components.example_gen.src import executor as kdd_executor
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark of CsvExampleGen against KddExampleGen')
+    parser.add_argument('--source', type=str, default='./kddcup.gz', help='KDD99 csv without header, optionally gzipped.')
+    parser.add_argument('--work-dir', type=str, default='/tmp/example_gen_benchmark')
+    parser.add_argument('--num-workers', type=int, default=0, help='0 means one worker per CPU.')
+
+    return parser.parse_args()
+
+
+def prepare_input(source: Text, input_dir: Text) -> int:
+    """Writes the source with the KDD99 header to `input_dir` and returns the number of rows."""
+    os.makedirs(input_dir, exist_ok=True)
+    rows = 0
+    opener = gzip.open if source.endswith('.gz') else open
+    with opener(source, 'rb') as source_file, open(os.path.join(input_dir, 'kddcup.csv'), 'wb') as csv_file:
+        csv_file.write(KDD99_HEADER.encode() + b'\n')
+        for line in source_file:
+            csv_file.write(line)
+            rows += 1
+    return rows
+
+
+def run_executor(executor_class, input_dir: Text, output_dir: Text, num_workers: int) -> float:
+    input_config = utils.make_default_input_config()
+    output_config = utils.make_default_output_config(input_config)
+    examples = standard_artifacts.Examples()
+    examples.uri = output_dir
+    examples.split_names = artifact_utils.encode_split_names(
+        utils.generate_output_split_names(input_config, output_config))
+    external = standard_artifacts.ExternalArtifact()
+    external.uri = input_dir
+    exec_properties = {
+        'input_config': json_format.MessageToJson(input_config),
+        'output_config': json_format.MessageToJson(output_config),
+    }  # type: Dict[Text, Any]
+    context = base_executor.BaseExecutor.Context(
+        beam_pipeline_args=['--direct_running_mode=multi_processing',
+                            f'--direct_num_workers={num_workers}'],
+        tmp_dir=os.path.join(output_dir, '.temp', ''))
+    start = time.time()
+    executor_class(context).Do({'input': [external]}, {'examples': [examples]}, exec_properties)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    shutil.rmtree(args.work_dir, ignore_errors=True)
+    input_dir = os.path.join(args.work_dir, 'input')
+    rows = prepare_input(args.source, input_dir)
+    results = {}
+    for name, executor_class in (('CsvExampleGen', csv_executor.Executor), ('KddExampleGen', kdd_executor.Executor)):
+        seconds = run_executor(executor_class, input_dir, os.path.join(args.work_dir, name), args.num_workers)
+        results[name] = seconds
+        print(f"{name}: {rows} rows in {seconds:.1f}s ({rows / seconds:.0f} rows/s)")
+    print(f"Speedup: {results['CsvExampleGen'] / results['KddExampleGen']:.1f}x")
@@ -0,0 +1,254 @@
+"""
+ExampleGen executor specialised on the KDD99 csv layout.
+
+Instead of inferring the type of every cell like CsvExampleGen, the `num_*` columns are parsed as
+floats and all other columns are kept as bytes. Large chunks are parsed with NumPy in a process
+pool and each work item writes its own TFRecord shard per split, compressed with the codec of
+EXAMPLE_CODEC (gzip by default, see example_codec.py), so the output is read by `_input_fn` of
+tfx_utils.py.
+
+Splits follow the configs: with a `split_config` in the output config every row goes to a split
+in proportion to its `hash_buckets`, otherwise the split patterns of the input config decide.
+The bucket of a row is taken from the sha256 of its csv line, not from the fingerprint of the
+serialized example like in CsvExampleGen, so the proportions match but not the rows per split.
+"""
+import bisect
+import gzip
+import multiprocessing
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Text, Tuple
+
+import absl
+import numpy as np
+import tensorflow as tf
+from google.protobuf import json_format
+from tfx import types
+from tfx.components.base import base_executor
+from tfx.components.example_gen import utils
+from tfx.proto import example_gen_pb2
+from tfx.types import artifact_utils
+
+from custom_components.columnar_cache.src import columnar_cache
+from custom_components.example_codec.src import example_codec
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+from custom_components.resource_planner.src import resource_planner
+
+DEFAULT_FILE_NAME = 'data_tfrecord'
+RANGE_BYTES = 64 << 20  # work item size of uncompressed inputs
+BLOCK_BYTES = 8 << 20  # size of the chunks parsed at once by NumPy
+
+
+class WorkItem(NamedTuple):
+    path: Text
+    start: int
+    end: int  # -1 reads to the end of the file
+
+
+class ShardTask(NamedTuple):
+    item: WorkItem
+    shard: int
+    num_shards: int
+    column_names: List[Text]
+    split_uris: List[Text]
+    buckets: List[int]  # cumulative hash buckets, empty if the split is given by the input pattern
+    codec: example_codec.Codec = example_codec.DEFAULT_CODEC
+
+
+def _is_gzip(path: Text) -> bool:
+    with open(path, 'rb') as file:
+        return file.read(2) == b'\x1f\x8b'
+
+
+def _open(path: Text):
+    return gzip.open(path, 'rb') if _is_gzip(path) else open(path, 'rb')
+
+
+def read_header(path: Text) -> List[Text]:
+    with _open(path) as file:
+        return file.readline().decode().strip().split(',')
+
+
+def _line_start_after(file, offset: int) -> int:
+    """Returns the offset of the first line starting at or after `offset`."""
+    if offset == 0:
+        return 0
+    file.seek(offset - 1)
+    file.readline()
+    return file.tell()
+
+
+def plan_work(paths: List[Text], range_bytes: int = RANGE_BYTES) -> List[WorkItem]:
+    """Splits uncompressed files at line boundaries into ranges of about `range_bytes`.
+
+    Gzipped files cannot be entered in the middle and are processed as a whole.
+    """
+    items = []
+    for path in paths:
+        if _is_gzip(path):
+            items.append(WorkItem(path, 0, -1))
+            continue
+        size = os.path.getsize(path)
+        with open(path, 'rb') as file:
+            boundaries = sorted({_line_start_after(file, offset) for offset in range(0, size, range_bytes)})
+        boundaries.append(size)
+        items.extend(WorkItem(path, start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end)
+    return items
+
+
+def iter_line_blocks(item: WorkItem, block_bytes: int = BLOCK_BYTES) -> Iterator[List[bytes]]:
+    """Yields the non-empty lines of a work item in blocks of about `block_bytes`."""
+    with _open(item.path) as file:
+        if item.end >= 0:
+            file.seek(item.start)
+        remaining = item.end - item.start if item.end >= 0 else -1
+        rest = b''
+        while remaining != 0:
+            data = file.read(block_bytes if remaining < 0 else min(block_bytes, remaining))
+            if not data:
+                break
+            if remaining > 0:
+                remaining -= len(data)
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            data, rest = data[:cut], data[cut:]
+            yield [line for line in data.split(b'\n') if line.strip()]
+        if rest.strip():
+            yield [rest]
+
+
+def parse_block(lines: List[bytes], column_names: List[Text]) -> Tuple[np.ndarray, List[List[bytes]]]:
+    """Parses csv lines into a float32 matrix of the `num_*` columns and the remaining bytes columns."""
+    numeric_indices = [i for i, name in enumerate(column_names) if name.startswith('num_')]
+    bytes_indices = [i for i, name in enumerate(column_names) if not name.startswith('num_')]
+    cells = [line.rstrip(b'\r').split(b',') for line in lines]
+    bad_rows = [line for line, row in zip(lines, cells) if len(row) != len(column_names)]
+    if bad_rows:
+        raise ValueError('Invalid CSV line: {}'.format(bad_rows[0]))
+    table = np.array(cells, dtype=np.bytes_)
+    numeric = table[:, numeric_indices].astype(np.float32)
+    return numeric, table[:, bytes_indices].tolist()
+
+
+def convert_shard(task: ShardTask) -> List[int]:
+    """Converts one work item into one TFRecord shard per split."""
+    column_names = task.column_names
+    header = ','.join(column_names).encode()
+    numeric_names = [name for name in column_names if name.startswith('num_')]
+    bytes_names = [name for name in column_names if not name.startswith('num_')]
+
+    # Filling a single Example in place is much cheaper than building a new proto per row.
+    example = tf.train.Example()
+    float_values = [example.features.feature[name].float_list.value for name in numeric_names]
+    bytes_values = [example.features.feature[name].bytes_list.value for name in bytes_names]
+    for value in float_values:
+        value.append(0.)
+    for value in bytes_values:
+        value.append(b'')
+
+    file_name = '{}-{:05d}-of-{:05d}{}'.format(DEFAULT_FILE_NAME, task.shard, task.num_shards, task.codec.suffix)
+    writers = [tf.io.TFRecordWriter(os.path.join(uri, file_name), options=task.codec.record_options())
+               for uri in task.split_uris]
+    counts = [0] * len(writers)
+    try:
+        for lines in iter_line_blocks(task.item):
+            if lines and lines[0].rstrip(b'\r') == header:
+                lines = lines[1:]
+            if not lines:
+                continue
+            numeric, strings = parse_block(lines, column_names)
+            for line, numeric_row, bytes_row in zip(lines, numeric.tolist(), strings):
+                for value, cell in zip(float_values, numeric_row):
+                    value[0] = cell
+                for value, cell in zip(bytes_values, bytes_row):
+                    value[0] = cell
+                split = 0
+                if task.buckets:
+                    bucket = columnar_cache.row_hash(line) % task.buckets[-1]
+                    split = bisect.bisect(task.buckets, bucket)
+                writers[split].write(example.SerializeToString())
+                counts[split] += 1
+    finally:
+        for writer in writers:
+            writer.close()
+    return counts
+
+
+def generate_examples(input_base: Text, input_config: example_gen_pb2.Input,
+                      output_config: example_gen_pb2.Output, split_uris: Dict[Text, Text],
+                      num_workers: int, range_bytes: int = RANGE_BYTES,
+                      codec: example_codec.Codec = example_codec.DEFAULT_CODEC) -> Dict[Text, int]:
+    """Writes the examples of all splits and returns the number of examples per split."""
+    tasks = []
+    if output_config.split_config.splits:
+        assert len(input_config.splits) == 1, 'input must have only one split when output split is specified.'
+        buckets, total_buckets = [], 0
+        for split in output_config.split_config.splits:
+            total_buckets += split.hash_buckets
+            buckets.append(total_buckets)
+        uris = [split_uris[split.name] for split in output_config.split_config.splits]
+        tasks.append((input_config.splits[0].pattern, uris, buckets))
+    else:
+        for split in input_config.splits:
+            tasks.append((split.pattern, [split_uris[split.name]], []))
+
+    uri_to_split = {uri: split_name for split_name, uri in split_uris.items()}
+    counts = dict.fromkeys(split_uris, 0)
+    for pattern, uris, buckets in tasks:
+        paths = sorted(tf.io.gfile.glob(os.path.join(input_base, pattern)))
+        if not paths:
+            raise RuntimeError('Split pattern {} does not match any files.'.format(pattern))
+        column_names = read_header(paths[0])
+        items = plan_work(paths, range_bytes)
+        for uri in uris:
+            tf.io.gfile.makedirs(uri)
+        shard_tasks = [ShardTask(item, shard, len(items), column_names, uris, buckets, codec)
+                       for shard, item in enumerate(items)]
+        absl.logging.info('Converting {} files in {} work items with {} workers'.format(
+            len(paths), len(items), num_workers))
+        # Spawned workers start without the TensorFlow runtime state of this process.
+        with multiprocessing.get_context('spawn').Pool(min(num_workers, len(items))) as pool:
+            for shard_counts in pool.imap_unordered(convert_shard, shard_tasks):
+                for uri, count in zip(uris, shard_counts):
+                    counts[uri_to_split[uri]] += count
+    return counts
+
+
+def set_span(input_dict: Dict[Text, List[types.Artifact]], output_dict: Dict[Text, List[types.Artifact]]) -> None:
+    """Copies the span the driver selected for a `{SPAN}` input pattern onto the examples artifact."""
+    span = artifact_utils.get_single_instance(input_dict['input']).get_string_custom_property(
+        utils.SPAN_PROPERTY_NAME)
+    artifact_utils.get_single_instance(output_dict['examples']).span = int(span or 0)
+
+
+def set_codec(output_dict: Dict[Text, List[types.Artifact]]) -> example_codec.Codec:
+    """Records the codec of EXAMPLE_CODEC on the examples artifact and returns it."""
+    codec = example_codec.from_environment()
+    example_codec.record(artifact_utils.get_single_instance(output_dict['examples']), codec)
+    return codec
+
+
+class Executor(InstrumentedExecutorMixin, base_executor.BaseExecutor):
+    """Parallel csv to TFRecord executor for FileBasedExampleGen on KDD99 data."""
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        self._log_startup(input_dict, output_dict, exec_properties)
+        set_span(input_dict, output_dict)
+        codec = set_codec(output_dict)
+        with self.span('resolve'):
+            input_config = example_gen_pb2.Input()
+            json_format.Parse(exec_properties['input_config'], input_config)
+            output_config = example_gen_pb2.Output()
+            json_format.Parse(exec_properties['output_config'], output_config)
+
+            input_base = artifact_utils.get_single_uri(input_dict['input'])
+            split_names = utils.generate_output_split_names(input_config, output_config)
+            split_uris = {split_name: artifact_utils.get_split_uri(output_dict['examples'], split_name)
+                          for split_name in split_names}
+        # Reading, parsing and writing are interleaved in the worker processes.
+        with self.span('compute'):
+            counts = generate_examples(input_base, input_config, output_config, split_uris,
+                                       resource_planner.num_workers(self._beam_pipeline_args), codec=codec)
+        self.add_rows(sum(counts.values()))
+        absl.logging.info('Examples generated: {}'.format(counts))
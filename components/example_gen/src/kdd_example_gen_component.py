@@ -0,0 +1,15 @@
+from tfx.components.base import executor_spec
+from tfx.components.example_gen.component import FileBasedExampleGen
+
+from custom_components.example_gen.src import executor
+
+
+class KddExampleGen(FileBasedExampleGen):
+    """Drop-in replacement of CsvExampleGen for KDD99 csv files.
+
+    Takes the same `input`, `input_config` and `output_config` arguments and produces the same
+    `examples` artifact, but converts the files with the parallel NumPy based executor. Hash
+    bucketed splits have the configured proportions, but assign other rows than CsvExampleGen.
+    """
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
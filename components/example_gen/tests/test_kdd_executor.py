@@ -0,0 +1,27 @@
+from custom_components.example_gen.src.executor import iter_line_blocks, parse_block, plan_work
+
+
+def test_work_items_cover_every_line_once():
+    # given
+    input_csv = "./kddcup.example"
+    with open(input_csv, "rb") as file:
+        lines = [line for line in file.read().split(b"\n") if line.strip()]
+    # when
+    items = plan_work([input_csv], range_bytes=1000)
+    # then
+    assert len(items) > 1
+    assert [line for item in items for block in iter_line_blocks(item, block_bytes=300) for line in block] == lines
+
+
+def test_parses_numeric_and_bytes_columns():
+    # given
+    column_names = ["num_0", "transport_protocol", "application_protocol", "cat_0"] + \
+                   [f"num_{i}" for i in range(1, 38)] + ["label_0"]
+    with open("./kddcup.example", "rb") as file:
+        lines = file.read().split(b"\n")[:3]
+    # when
+    numeric, strings = parse_block(lines, column_names)
+    # then
+    assert numeric.shape == (3, 38)
+    assert numeric[0][1] == 215.
+    assert strings[0] == [b"tcp", b"http", b"SF", b"normal."]
@@ -0,0 +1,312 @@
+"""
+Long-lived host of pre-warmed executor processes, so component runs skip the TensorFlow startup.
+
+Every component runs as run_executor.py in a fresh interpreter that imports TensorFlow, tf.Transform,
+TFDV, Beam and TFX before the executor touches any data; on train.small that startup takes longer
+than the work. `serve` imports these modules once and then forks one worker per execution from the
+warm process:
+
+    python -m custom_components.executor_host.src.executor_host serve --socket /tmp/executor_host.sock
+
+`run` takes the arguments of run_executor.py and hands them to the host listening on the socket,
+together with its stdout and stderr, so the logs of the worker end up where they would without the
+host. Without a reachable host it runs the executor in-process, like run_executor.py does:
+
+    python -m custom_components.executor_host.src.executor_host run --executor_class_path=... --inputs=...
+
+Every execution reports its startup time, until the executor class is imported (measured from the
+fork for a worker, from the start of the process for a cold run), and its work time, the run of the
+executor. The times are printed and appended to the JSON lines file of --timing-file or
+EXECUTOR_TIMING_FILE; `report --timing-file ...` shows the mean times per stage and mode.
+
+The host only imports modules and never runs TensorFlow ops, so there are no runtime threads when it
+forks and every worker initializes the runtime on its own. Workers run in the host's container with
+the working directory and environment of the client. Environment variables that TensorFlow reads at
+import time keep the values of the host.
+
+The host is a tool for manual run_executor.py executions, e.g. re-running one component while
+working on its executor, or measuring the startup share of the stages. No pipeline runner goes
+through it: KubeflowDagRunner starts every component with its own command, container_entrypoint.py,
+whatever the entrypoint of the image, and kdd_pipe_local.py runs all executors in its own process,
+which is warm after the first stage.
+"""
+import argparse
+import array
+import base64
+import collections
+import importlib
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence, Text, Tuple
+
+DEFAULT_SOCKET = '/tmp/executor_host.sock'
+SOCKET_ENV = 'EXECUTOR_HOST_SOCKET'
+TIMING_FILE_ENV = 'EXECUTOR_TIMING_FILE'
+# Imported by the host before it forks; modules that are not installed are skipped.
+PRELOAD_MODULES = [
+    'tensorflow',
+    'tensorflow_transform',
+    'tensorflow_transform.beam',
+    'tensorflow_data_validation',
+    'apache_beam',
+    'tfx.scripts.run_executor',
+    'tfx.components.statistics_gen.executor',
+    'tfx.components.schema_gen.executor',
+    'tfx.components.example_validator.executor',
+    'tfx.components.transform.executor',
+    'tfx.components.trainer.executor',
+    'tfx.components.pusher.executor',
+    'custom_components.example_gen.src.executor',
+    'custom_components.example_dedup.src.executor',
+    'custom_components.span_statistics.src.executor',
+    'custom_components.result_cache.src.caching_executors',
+]
+_HEADER = struct.Struct('!Q')
+_CLIENT_FDS = (1, 2)
+
+
+def process_seconds() -> float:
+    """Seconds since this process started, from /proc, so they include the interpreter startup."""
+    with open('/proc/self/stat') as stat_file:
+        stat = stat_file.read()
+    # The command name in parentheses may contain spaces, the fields after it do not.
+    start_ticks = int(stat[stat.rfind(')') + 2:].split()[19])
+    with open('/proc/uptime') as uptime_file:
+        uptime = float(uptime_file.read().split()[0])
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+def _run_executor_main(argv: List[Text]) -> None:
+    from tfx.scripts import run_executor
+    run_executor.main(argv)
+
+
+def _option(argv: Sequence[Text], name: Text) -> Optional[Text]:
+    """Value of `--name=value` or `--name value` in argv."""
+    for i, arg in enumerate(argv):
+        if arg.startswith(name + '='):
+            return arg[len(name) + 1:]
+        if arg == name and i + 1 < len(argv):
+            return argv[i + 1]
+    return None
+
+
+def stage_name(argv: Sequence[Text]) -> Text:
+    """Component of an execution, from the uri `<pipeline_root>/<component>/<output key>/<execution id>`
+    of its first output artifact, else the executor class.
+    """
+    outputs = _option(argv, '--outputs')
+    if outputs is None and _option(argv, '--outputs-base64'):
+        outputs = base64.b64decode(_option(argv, '--outputs-base64')).decode()
+    try:
+        for artifacts in json.loads(outputs).values():
+            for artifact in artifacts:
+                uri = os.path.normpath(artifact['artifact']['uri'])
+                return os.path.basename(os.path.dirname(os.path.dirname(uri)))
+    except (TypeError, ValueError, KeyError):
+        pass
+    return _option(argv, '--executor_class_path') or 'unknown'
+
+
+def execute(argv: List[Text], mode: Text, started: float,
+            main: Callable[[List[Text]], None] = _run_executor_main) -> Dict[Text, Any]:
+    """Runs one execution in this process and times it.
+
+    Args:
+      argv: Arguments of run_executor.py.
+      mode: 'warm' in a worker of the host, 'cold' in a process of its own.
+      started: time.time() when the startup began, at the fork of the worker or the process start.
+      main: The main function of run_executor.py.
+    Returns:
+      Stage, executor, mode, startup and work seconds and the exit code of the execution.
+    """
+    class_path = _option(argv, '--executor_class_path') or ''
+    work_start = None
+    exit_code = 0
+    try:
+        module_name, _, class_name = class_path.rpartition('.')
+        getattr(importlib.import_module(module_name), class_name)
+        work_start = time.time()
+        main(argv)
+    except SystemExit as exit_error:
+        exit_code = exit_error.code if isinstance(exit_error.code, int) else int(exit_error.code is not None)
+    except Exception:
+        traceback.print_exc()
+        exit_code = 1
+    end = time.time()
+    work_start = work_start or end
+    return {'stage': stage_name(argv), 'executor': class_path, 'mode': mode,
+            'startup_seconds': work_start - started, 'work_seconds': end - work_start, 'exit_code': exit_code}
+
+
+def record(timing: Dict[Text, Any], timing_file: Optional[Text]) -> None:
+    print(f"{timing['stage']}: startup {timing['startup_seconds']:.2f}s, work {timing['work_seconds']:.2f}s "
+          f"({timing['mode']}, exit code {timing['exit_code']})")
+    if timing_file:
+        with open(timing_file, 'a') as timings:
+            timings.write(json.dumps(timing) + '\n')
+
+
+def _recv_exactly(connection: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = connection.recv(size)
+        if not chunk:
+            raise ConnectionError('Connection closed in the middle of a request')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _receive_request(connection: socket.socket) -> Tuple[Dict[Text, Any], List[int]]:
+    """The request of a client and the file descriptors it passed along with the length header."""
+    fds = array.array('i')
+    header, ancillary, _, _ = connection.recvmsg(_HEADER.size, socket.CMSG_LEN(len(_CLIENT_FDS) * fds.itemsize))
+    for level, kind, data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - len(data) % fds.itemsize])
+    header += _recv_exactly(connection, _HEADER.size - len(header))
+    return json.loads(_recv_exactly(connection, _HEADER.unpack(header)[0]).decode()), list(fds)
+
+
+def _work(connection: socket.socket, request: Dict[Text, Any], fds: List[int], started: float,
+          main: Callable[[List[Text]], None]) -> None:
+    """Runs in the forked worker: takes over the client's stdout and stderr, executes and replies."""
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    for fd, target in zip(fds, _CLIENT_FDS):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    timing = execute(request['argv'], 'warm', started, main)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    connection.sendall(json.dumps(timing).encode())
+
+
+def serve(socket_path: Text, modules: Sequence[Text] = tuple(PRELOAD_MODULES),
+          main: Callable[[List[Text]], None] = _run_executor_main,
+          max_executions: Optional[int] = None) -> None:
+    """Preloads `modules` and runs every request on the socket in a worker forked for it."""
+    start = time.time()
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception as error:  # Not only ImportError, e.g. missing native libraries.
+            print(f"Not preloading {name}: {error}")
+    print(f"Preloaded {len(modules)} modules in {time.time() - start:.1f}s, listening on {socket_path}")
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(16)
+    # The kernel reaps finished workers.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    executions = 0
+    try:
+        while max_executions is None or executions < max_executions:
+            connection, _ = listener.accept()
+            with connection:
+                try:
+                    request, fds = _receive_request(connection)
+                except (ConnectionError, ValueError) as error:
+                    print(f"Dropping request: {error}")
+                    continue
+                sys.stdout.flush()
+                sys.stderr.flush()
+                started = time.time()
+                if os.fork() == 0:
+                    listener.close()
+                    exit_code = 0
+                    try:
+                        _work(connection, request, fds, started, main)
+                    except BaseException:
+                        traceback.print_exc()
+                        exit_code = 1
+                    finally:
+                        os._exit(exit_code)
+                for fd in fds:
+                    os.close(fd)
+            executions += 1
+    finally:
+        listener.close()
+        os.unlink(socket_path)
+
+
+def _run_on_host(argv: List[Text], socket_path: Text) -> Optional[Dict[Text, Any]]:
+    """The timing of the execution by a worker of the host, None if no host listens on the socket."""
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        connection.close()
+        return None
+    with connection:
+        payload = json.dumps({'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}).encode()
+        connection.sendmsg([_HEADER.pack(len(payload))],
+                           [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', _CLIENT_FDS))])
+        connection.sendall(payload)
+        reply = b''.join(iter(lambda: connection.recv(1 << 16), b''))
+    if not reply:
+        raise RuntimeError(f"The executor host worker of {stage_name(argv)} exited without a result")
+    return json.loads(reply.decode())
+
+
+def run(argv: List[Text], socket_path: Text, timing_file: Optional[Text] = None,
+        main: Callable[[List[Text]], None] = _run_executor_main) -> int:
+    """Executes on the host of `socket_path` if one listens there, else in this process; returns the exit code."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    timing = _run_on_host(argv, socket_path)
+    if timing is None:
+        print(f"No executor host listens on {socket_path}, running cold")
+        timing = execute(argv, 'cold', time.time() - process_seconds(), main)
+    record(timing, timing_file)
+    return timing['exit_code']
+
+
+def report(timing_file: Text) -> List[Dict[Text, Any]]:
+    """Mean startup and work seconds of the executions in the timing file, per stage and mode."""
+    groups = collections.OrderedDict()  # type: Dict[Tuple[Text, Text], List[Dict[Text, Any]]]
+    with open(timing_file) as timings:
+        for line in timings:
+            timing = json.loads(line)
+            groups.setdefault((timing['stage'], timing['mode']), []).append(timing)
+    rows = []
+    print(f"{'stage':<28}{'mode':>6}{'runs':>6}{'startup s':>11}{'work s':>9}{'startup %':>11}")
+    for (stage, mode), timings in groups.items():
+        startup = sum(timing['startup_seconds'] for timing in timings) / len(timings)
+        work = sum(timing['work_seconds'] for timing in timings) / len(timings)
+        share = startup / max(startup + work, 1e-9)
+        rows.append({'stage': stage, 'mode': mode, 'executions': len(timings), 'startup_seconds': startup,
+                     'work_seconds': work, 'startup_share': share})
+        print(f"{stage:<28}{mode:>6}{len(timings):>6}{startup:>11.2f}{work:>9.2f}{share:>11.0%}")
+    return rows
+
+
+def parse_arguments(argv: Optional[List[Text]] = None) -> Tuple[argparse.Namespace, List[Text]]:
+    parser = argparse.ArgumentParser(
+        description='Pre-warmed host of executor processes; `run` takes the arguments of run_executor.py.',
+        allow_abbrev=False)
+    parser.add_argument('command', choices=['serve', 'run', 'report'])
+    parser.add_argument('--socket', type=str, default=os.environ.get(SOCKET_ENV, DEFAULT_SOCKET))
+    parser.add_argument('--timing-file', type=str, default=os.environ.get(TIMING_FILE_ENV))
+    return parser.parse_known_args(argv)
+
+
+if __name__ == '__main__':
+    args, executor_args = parse_arguments()
+    if args.command == 'serve':
+        serve(args.socket)
+    elif args.command == 'run':
+        sys.exit(run(executor_args, args.socket, args.timing_file))
+    else:
+        report(args.timing_file)
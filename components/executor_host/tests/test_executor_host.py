@@ -0,0 +1,56 @@
+import json
+import multiprocessing
+import os
+import time
+
+from custom_components.executor_host.src import executor_host
+
+
+def fake_main(argv):
+    """Stands in for run_executor.py: writes its pid to the --temp_directory_path file."""
+    with open(executor_host._option(argv, '--temp_directory_path'), 'w') as pid_file:
+        pid_file.write(str(os.getpid()))
+    if '--fail' in argv:
+        raise SystemExit(3)
+
+
+def executor_args(tmp_path, name, *extra):
+    outputs = {'output': [{'artifact': {'uri': str(tmp_path / 'pipeline' / name / 'output' / '7')}}]}
+    return ['--executor_class_path=collections.OrderedDict', '--temp_directory_path', str(tmp_path / name),
+            '--inputs={}', '--outputs', json.dumps(outputs), '--exec-properties={}'] + list(extra)
+
+
+def test_cold_run_reports_startup_and_work(tmp_path):
+    # given
+    timing_file = str(tmp_path / 'timings.jsonl')
+    # when
+    exit_code = executor_host.run(executor_args(tmp_path, 'Trainer'), str(tmp_path / 'missing.sock'),
+                                  timing_file, fake_main)
+    # then
+    assert exit_code == 0
+    assert (tmp_path / 'Trainer').read_text() == str(os.getpid())
+    timing = json.loads(open(timing_file).read())
+    assert timing['stage'] == 'Trainer' and timing['mode'] == 'cold'
+    assert timing['startup_seconds'] > 0 and timing['work_seconds'] >= 0
+    assert executor_host.report(timing_file)[0]['executions'] == 1
+
+
+def test_host_runs_executions_in_forked_workers(tmp_path):
+    # given
+    socket_path = str(tmp_path / 'host.sock')
+    host = multiprocessing.get_context('fork').Process(
+        target=executor_host.serve, args=(socket_path, ['json'], fake_main, 2))
+    host.start()
+    while not os.path.exists(socket_path):
+        time.sleep(0.01)
+    timing_file = str(tmp_path / 'timings.jsonl')
+    # when
+    exit_codes = [executor_host.run(executor_args(tmp_path, 'Transform'), socket_path, timing_file),
+                  executor_host.run(executor_args(tmp_path, 'Trainer', '--fail'), socket_path, timing_file)]
+    host.join(10)
+    # then
+    assert exit_codes == [0, 3]
+    pids = {int((tmp_path / name).read_text()) for name in ('Transform', 'Trainer')}
+    assert len(pids) == 2 and host.pid not in pids and os.getpid() not in pids
+    timings = [json.loads(line) for line in open(timing_file)]
+    assert [(timing['stage'], timing['mode']) for timing in timings] == [('Transform', 'warm'), ('Trainer', 'warm')]
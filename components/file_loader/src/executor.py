@@ -1,14 +1,26 @@
+import os
 from typing import Dict, Text, List, Any
 
 from tfx import types
 from tfx.components.base import base_executor
+from tfx.types import artifact_utils
 
+from custom_components.file_loader.src.file_loader import materialize_split
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
 
-class Executor(base_executor.BaseExecutor):
-    """DemoExecutor for HelloComponent."""
+DEFAULT_INPUT_BASE = '/tfx-src/data'
+
+
+class Executor(InstrumentedExecutorMixin, base_executor.BaseExecutor):
+    """Materializes the files of one split as the data_file artifact, without copying where possible."""
 
     def Do(self, input_dict: Dict[Text, List[types.Artifact]],
            output_dict: Dict[Text, List[types.Artifact]],
            exec_properties: Dict[Text, Any]) -> None:
-        print("Arrived in DemoExecutor!!!")
-        split_to_instance = {}
+        split = exec_properties['split']
+        input_dir = os.path.join(exec_properties.get('input_base') or DEFAULT_INPUT_BASE, split)
+        data_file = artifact_utils.get_single_instance(output_dict['data_file'])
+        with self.span('write'):
+            methods = materialize_split(input_dir, data_file.uri)
+        data_file.set_string_custom_property('split', split)
+        print(f"Materialized split {split} to {data_file.uri}: {methods}")
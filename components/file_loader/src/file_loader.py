@@ -1,41 +1,289 @@
 import argparse
+import errno
+import fcntl
 import gzip
+import hashlib
+import json
 import os
+import resource
+import time
+import urllib.parse
 import urllib.request
-from shutil import copyfile
+from shutil import copyfileobj
+from typing import BinaryIO, Optional
 
 from tfx.utils.dsl_utils import external_input
 
+KDD99_URL = "http://kdd.ics.uci.edu/databases/kddcup99/kddcup.data_10_percent.gz"
+CHUNK_SIZE = 1 << 20  # 1 MiB, keeps memory flat regardless of the input size
+MANIFEST_SUFFIX = '.sha256.json'
+MANIFEST_DIR = '.manifests'
+FICLONE = 0x40049409  # ioctl of linux/fs.h sharing all extents of a file (reflink)
+
 
 def parse_arguments() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='File loader for pipeline')
     parser.add_argument('--split', type=str, help='Either train, test or validate.')
     parser.add_argument('--output-path', type=str, help='Location for the respective csv')
+    parser.add_argument('--source', type=str, default=None,
+                        help='Local path or URL of a gzipped KDD99 file. If given, it is '
+                             'decompressed into the --output-path directory instead of copying a split.')
 
     return parser.parse_args()
 
 
-def download_kdd99(destination: str):
-    url = "http://kdd.ics.uci.edu/databases/kddcup99/kddcup.data_10_percent.gz"
-    compressed_filename = "./kddcup.gz"
+def _is_url(source: str) -> bool:
+    return urllib.parse.urlparse(source).scheme in ('http', 'https', 'ftp', 'file')
+
+
+def _open_source(source: str) -> BinaryIO:
+    if _is_url(source):
+        return urllib.request.urlopen(source)
+    return open(source, 'rb')
+
+
+def sha256_file(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """Computes the sha256 hex digest of a file without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def peak_rss_mib() -> float:
+    """Peak resident set size of this process in MiB (ru_maxrss is in KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _report(action: str, num_bytes: int, seconds: float) -> None:
+    mib = num_bytes / (1 << 20)
+    print(f"{action} {mib:.1f} MiB in {seconds:.2f}s "
+          f"({mib / max(seconds, 1e-9):.1f} MiB/s, peak RSS {peak_rss_mib():.1f} MiB)")
+
+
+class _HashingReader:
+    """File-like wrapper that hashes and counts the compressed bytes as they are read."""
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        self.digest = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._file.read(size)
+        self.digest.update(data)
+        self.bytes_read += len(data)
+        return data
+
+
+def manifest_filename(path: str) -> str:
+    """Path of the checksum manifest of `path`.
+
+    Manifests live in a MANIFEST_DIR next to the directory of `path`, never in it, because that
+    directory is handed to external_input and every file in it is read as data.
+    """
+    directory, filename = os.path.split(os.path.abspath(path))
+    parent, name = os.path.split(directory)
+    return os.path.join(parent, MANIFEST_DIR, name, filename + MANIFEST_SUFFIX)
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    os.makedirs(os.path.dirname(manifest_filename(path)), exist_ok=True)
+    with open(manifest_filename(path), 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+
+
+def _is_materialized(uncompressed_filename: str, source: str) -> bool:
+    """Checks whether a previous run already produced a verified copy of `source`."""
+    manifest_path = manifest_filename(uncompressed_filename)
+    if not (os.path.exists(uncompressed_filename) and os.path.exists(manifest_path)):
+        return False
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('source') != source:
+        return False
+    # A local source can be re-hashed cheaply (it is the compressed file), a URL is trusted by name.
+    if not _is_url(source) and sha256_file(source) != manifest.get('source_sha256'):
+        return False
+    return sha256_file(uncompressed_filename) == manifest.get('sha256')
+
+
+def download_kdd99(destination: str, source: str = KDD99_URL, chunk_size: int = CHUNK_SIZE,
+                   expected_sha256: Optional[str] = None) -> str:
+    """Materializes the gzipped KDD99 data set as `kddcup.csv` in `destination`.
+
+    The source is streamed and decompressed chunk by chunk, so memory stays constant no matter
+    how large the input is. A manifest with the checksums of the source and of the decompressed
+    file is kept outside of `destination` (see manifest_filename); if it still matches, nothing is
+    fetched or decompressed again.
+    Args:
+      destination: Directory the csv is written to.
+      source: Local path or URL of the gzipped data set.
+      chunk_size: Number of bytes decompressed per step.
+      expected_sha256: Optional checksum the compressed source has to match.
+    Returns:
+      The path of the materialized csv.
+    """
+    os.makedirs(destination, exist_ok=True)
     uncompressed_filename = os.path.join(destination, 'kddcup.csv')
-    urllib.request.urlretrieve(url, compressed_filename)
-    with open(uncompressed_filename, "wb") as uncompressed_file:
-        with gzip.open(compressed_filename) as compressed_file:
-            uncompressed_data = compressed_file.read()
-        uncompressed_file.write(uncompressed_data)
+    if _is_materialized(uncompressed_filename, source):
+        print(f"{uncompressed_filename} is up to date with {source}, skipping download")
+        return uncompressed_filename
+
+    print(f"Streaming {source} to {uncompressed_filename}")
+    start = time.time()
+    partial_filename = uncompressed_filename + '.partial'
+    uncompressed_digest = hashlib.sha256()
+    uncompressed_bytes = 0
+    with _open_source(source) as raw_file, open(partial_filename, 'wb') as uncompressed_file:
+        compressed_reader = _HashingReader(raw_file)
+        with gzip.GzipFile(fileobj=compressed_reader) as compressed_file:
+            for chunk in iter(lambda: compressed_file.read(chunk_size), b''):
+                uncompressed_file.write(chunk)
+                uncompressed_digest.update(chunk)
+                uncompressed_bytes += len(chunk)
+    source_sha256 = compressed_reader.digest.hexdigest()
+    if expected_sha256 is not None and source_sha256 != expected_sha256:
+        os.remove(partial_filename)
+        raise ValueError(f"Checksum mismatch for {source}: expected {expected_sha256}, got {source_sha256}")
+    os.replace(partial_filename, uncompressed_filename)
+
+    _write_manifest(uncompressed_filename, {'source': source,
+                                            'source_sha256': source_sha256,
+                                            'sha256': uncompressed_digest.hexdigest(),
+                                            'size': uncompressed_bytes})
+    seconds = time.time() - start
+    _report("Read", compressed_reader.bytes_read, seconds)
+    _report("Decompressed", uncompressed_bytes, seconds)
+    return uncompressed_filename
+
+
+def _stat_signature(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def _copy_is_current(source: str, destination: str) -> bool:
+    """Checks whether `destination` has the content of `source`.
+
+    The checksums are only computed if the manifest of a previous materialization does not vouch
+    for both files being unchanged since.
+    """
+    if not os.path.exists(destination):
+        return False
+    if os.path.samefile(source, destination):
+        return True
+    manifest_path = manifest_filename(destination)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if (manifest.get('source') == os.path.abspath(source)
+                and manifest.get('source_stat') == _stat_signature(source)
+                and manifest.get('stat') == _stat_signature(destination)):
+            return True
+    if os.path.getsize(source) != os.path.getsize(destination):
+        return False
+    source_sha256 = sha256_file(source)
+    if source_sha256 != sha256_file(destination):
+        return False
+    _write_copy_manifest(source, destination, source_sha256)
+    return True
+
+
+def _write_copy_manifest(source: str, destination: str, sha256: Optional[str] = None) -> None:
+    _write_manifest(destination, {'source': os.path.abspath(source),
+                                  'source_stat': _stat_signature(source),
+                                  'sha256': sha256,
+                                  'stat': _stat_signature(destination)})
+
+
+def _reflink(source_file: BinaryIO, destination_file: BinaryIO) -> None:
+    fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+
+
+def _copy_range(source_file: BinaryIO, destination_file: BinaryIO, size: int) -> None:
+    """Copies inside the kernel with copy_file_range (python >= 3.8) or sendfile."""
+    copy = getattr(os, 'copy_file_range', None) or os.sendfile
+    offset = 0
+    while offset < size:
+        if copy is os.sendfile:
+            copied = os.sendfile(destination_file.fileno(), source_file.fileno(), offset, size - offset)
+        else:
+            copied = copy(source_file.fileno(), destination_file.fileno(), size - offset, offset)
+        if copied == 0:
+            raise OSError(errno.EIO, f"Unexpected end of {source_file.name}")
+        offset += copied
+
+
+def materialize(source: str, destination: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """Makes `destination` a file with the content of `source`, copying as few bytes as possible.
+
+    The cheapest method the file systems allow is used: a hard link (source and destination are
+    the same inode afterwards, so neither must be modified in place), a reflink (copy on write
+    extents, e.g. on XFS or btrfs), an in-kernel copy and finally a chunked copy. Nothing is
+    done if the destination already has the content of the source.
+    Args:
+      source: File to materialize.
+      destination: Path of the file to create or update.
+      chunk_size: Number of bytes per step of the chunked copy.
+    Returns:
+      The method used: unchanged, hardlink, reflink, kernel_copy or copy.
+    """
+    if _copy_is_current(source, destination):
+        return 'unchanged'
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    partial_filename = destination + '.partial'
+    if os.path.lexists(partial_filename):
+        os.remove(partial_filename)
+    try:
+        os.link(source, partial_filename)
+        method = 'hardlink'
+    except OSError:
+        with open(source, 'rb') as source_file, open(partial_filename, 'wb') as destination_file:
+            try:
+                _reflink(source_file, destination_file)
+                method = 'reflink'
+            except OSError:
+                try:
+                    _copy_range(source_file, destination_file, os.fstat(source_file.fileno()).st_size)
+                    method = 'kernel_copy'
+                except OSError:
+                    source_file.seek(0)
+                    destination_file.seek(0)
+                    destination_file.truncate()
+                    copyfileobj(source_file, destination_file, chunk_size)
+                    method = 'copy'
+    os.replace(partial_filename, destination)
+    _write_copy_manifest(source, destination)
+    return method
+
+
+def materialize_split(input_dir: str, output_dir: str) -> dict:
+    """Materializes all files of a split directory; returns the number of files per method."""
+    methods = {}
+    start = time.time()
+    num_bytes = 0
+    for filename in sorted(os.listdir(input_dir)):
+        source = os.path.join(input_dir, filename)
+        if not os.path.isfile(source) or filename.endswith(MANIFEST_SUFFIX):
+            continue
+        method = materialize(source, os.path.join(output_dir, filename))
+        methods[method] = methods.get(method, 0) + 1
+        num_bytes += os.path.getsize(source)
+    _report(f"Materialized {input_dir} ({methods}),", num_bytes, time.time() - start)
+    return methods
 
 
 if __name__ == '__main__':
     args = parse_arguments()
-    print(f"Using split: {args.split}")
-    print(f"Writing to {args.output_path}")
-    if args.split == "train":
-        copyfile("./kddcup.train", args.output_path)
-    elif args.split == "test":
-        copyfile("./kddcup.test", args.output_path)
-    elif args.split == "validate":
-        copyfile("./kddcup.validate", args.output_path)
+    if args.source:
+        download_kdd99(args.output_path, args.source)
+    else:
+        print(f"Using split: {args.split}")
+        print(f"Writing to {args.output_path}")
+        if args.split in ("train", "test", "validate"):
+            print(f"Materialized with {materialize(f'./kddcup.{args.split}', args.output_path)}")
     out_file_path = os.path.join(os.getcwd(), "out")
     with open(out_file_path, "w+") as out_file:
         print(f"Writing external_input to {out_file_path}")
@@ -14,9 +14,12 @@ class FileLoaderComponent(BaseComponent):
         INPUTS = {
         }
         OUTPUTS = {
+            'data_file': component_spec.ChannelParameter(type=standard_artifacts.ExternalArtifact),
         }
         PARAMETERS = {
             'split': component_spec.ExecutionParameter(type=Text),
+            # Directory with one folder per split, defaults to the data folder of the image.
+            'input_base': component_spec.ExecutionParameter(type=Text, optional=True),
         }
 
     SPEC_CLASS = _ComponentSpec
@@ -31,8 +34,9 @@ class FileLoaderComponent(BaseComponent):
 
     EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
 
-    def __init__(self, split: str):
-        #        data_file = data_file or types.Channel(type=standard_artifacts.ExternalArtifact,
-        #                                               artifacts=[standard_artifacts.ExternalArtifact()])
-        spec = self._ComponentSpec(split=split)
+    def __init__(self, split: str, input_base: Optional[Text] = None,
+                 data_file: Optional[types.Channel] = None):
+        data_file = data_file or types.Channel(type=standard_artifacts.ExternalArtifact,
+                                               artifacts=[standard_artifacts.ExternalArtifact()])
+        spec = self._ComponentSpec(split=split, input_base=input_base, data_file=data_file)
         super(FileLoaderComponent, self).__init__(spec)
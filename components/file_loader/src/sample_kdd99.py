@@ -0,0 +1,217 @@
+"""
+Stratified sampling of KDD99 csv data into small, representative subsets like data/train.small.
+
+The input is streamed once and every row goes into the reservoir of its label (Algorithm L, so a
+reservoir only draws random numbers when it actually replaces a row). Afterwards the sample size is
+allocated to the labels in proportion to their counts, optionally with a floor per label so rare
+attacks are not lost, or every label is capped at a fixed number of rows. Memory is bounded by the
+number of labels times the reservoir capacity, independent of the input size. Every label has its
+own generator derived from the seed and the label, so the same seed always yields the same sample.
+The sampled rows are written in their input order:
+
+    <output_dir>/<split>/kddcup.<split>-00000-of-00001[.gz]
+
+Usage: python -m custom_components.file_loader.src.sample_kdd99 --input data/train --size 100000 --min-per-label 100
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import math
+import os
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER, SMALL_SPLIT, read_chunks
+
+DEFAULT_SEED = 99
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Stratified KDD99 sampler')
+    parser.add_argument('--input', type=str, nargs='+', required=True,
+                        help='KDD99 csv files or directories of shards, optionally gzipped.')
+    parser.add_argument('--output-dir', type=str, default='./data', help='Directory containing the split folders.')
+    parser.add_argument('--split', type=str, default=SMALL_SPLIT, help='Name of the written split folder.')
+    parser.add_argument('--size', type=int, default=None, help='Total number of sampled rows.')
+    parser.add_argument('--per-label-cap', type=int, default=None, help='Maximum number of rows per label.')
+    parser.add_argument('--min-per-label', type=int, default=0,
+                        help='Rows every label keeps (if it has them) when --size is allocated.')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--gzip', action='store_true', help='Write a gzipped shard.')
+
+    return parser.parse_args()
+
+
+class Reservoir:
+    """Uniform sample of at most `capacity` items of a stream, Algorithm L of Li (1994)."""
+
+    def __init__(self, capacity: int, rng: random.Random):
+        self.capacity = capacity
+        self.items = []  # type: List
+        self.seen = 0
+        self._rng = rng
+        self._weight = 1.0
+        self._next = capacity - 1  # position of the last item that was or will be kept
+
+    def _skip(self) -> None:
+        self._weight *= math.exp(math.log(self._uniform()) / self.capacity)
+        self._next += int(math.log(self._uniform()) / math.log1p(-self._weight)) + 1
+
+    def _uniform(self) -> float:
+        # random() is in [0, 1), the logarithms need (0, 1).
+        return self._rng.random() or 1e-300
+
+    def add(self, item) -> None:
+        if self.seen < self.capacity:
+            self.items.append(item)
+            if len(self.items) == self.capacity:
+                self._skip()
+        elif self.seen == self._next:
+            self.items[self._rng.randrange(self.capacity)] = item
+            self._skip()
+        self.seen += 1
+
+    def extend(self, items: Sequence) -> None:
+        """Adds a batch of items, jumping over the ones that would be skipped anyway."""
+        position = 0
+        while position < len(items):
+            if self.seen < self.capacity or self.seen == self._next:
+                self.add(items[position])
+                position += 1
+            else:
+                skipped = min(self._next - self.seen, len(items) - position)
+                self.seen += skipped
+                position += skipped
+
+
+def label_rng(seed: int, label: bytes) -> random.Random:
+    """Generator of a label, independent of the order in which the labels appear."""
+    digest = hashlib.blake2b(label, digest_size=8, key=str(seed).encode()).digest()
+    return random.Random(int.from_bytes(digest, 'big'))
+
+
+def allocate(counts: Dict[bytes, int], size: int, min_per_label: int = 0) -> Dict[bytes, int]:
+    """Splits `size` rows over the labels in proportion to `counts`, giving each at least `min_per_label`.
+
+    Args:
+      counts: Rows available per label.
+      size: Total number of rows; all rows if there are fewer.
+      min_per_label: Floor per label, limited by its count. Labels whose proportional share is below the
+        floor get the floor, the rest of `size` is shared by the other labels in proportion.
+    Returns:
+      Number of rows per label, never more than its count.
+    """
+    floors = {label: min(count, min_per_label) for label, count in counts.items()}
+    fixed = {}  # type: Dict[bytes, int]
+    while True:
+        free = [label for label in counts if label not in fixed]
+        remaining = size - sum(fixed.values())
+        total = sum(counts[label] for label in free)
+        shares = {label: remaining * counts[label] / total for label in free} if total else {}
+        clamped = {label: min(max(share, floors[label]), counts[label]) for label, share in shares.items()}
+        newly_fixed = {label: int(value) for label, value in clamped.items() if value != shares[label]}
+        if not newly_fixed:
+            break
+        fixed.update(newly_fixed)
+
+    quotas = dict(fixed)
+    quotas.update({label: int(share) for label, share in shares.items()})
+    # Largest remainders first, ties broken by label so the allocation is deterministic.
+    leftover = remaining - sum(int(share) for share in shares.values())
+    for label in sorted(shares, key=lambda label: (int(shares[label]) - shares[label], label))[:max(leftover, 0)]:
+        quotas[label] += 1
+    return quotas
+
+
+def input_files(inputs: Sequence[str]) -> List[str]:
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(sorted(candidate for candidate in glob.glob(os.path.join(path, '*'))
+                                if os.path.isfile(candidate)))
+        else:
+            paths.append(path)
+    return paths
+
+
+def sample_rows(inputs: Sequence[str], size: Optional[int] = None, per_label_cap: Optional[int] = None,
+                min_per_label: int = 0, seed: int = DEFAULT_SEED) -> Tuple[List[bytes], Dict[bytes, int]]:
+    """Streams the inputs once and draws a stratified sample.
+
+    Args:
+      inputs: KDD99 csv files or directories of shards, with or without header, optionally gzipped.
+      size: Total number of rows, allocated in proportion to the label counts; None keeps every row
+        that the cap allows.
+      per_label_cap: Maximum number of rows per label.
+      min_per_label: Rows every label keeps, if it has them, when `size` is allocated.
+      seed: The same seed and inputs always yield the same sample.
+    Returns:
+      The sampled rows in input order and the number of input rows per label.
+    """
+    if size is None and per_label_cap is None:
+        raise ValueError("Either size or per_label_cap is required")
+    # A label never gets more than the whole size, so its reservoir needs no more room.
+    capacity = min(limit for limit in (size, per_label_cap) if limit is not None)
+    reservoirs = {}  # type: Dict[bytes, Reservoir]
+    position = 0
+    for path in input_files(inputs):
+        for chunk in read_chunks(path):
+            for _, row in chunk:
+                label = row.rsplit(b',', 1)[-1]
+                reservoir = reservoirs.get(label)
+                if reservoir is None:
+                    reservoir = reservoirs[label] = Reservoir(capacity, label_rng(seed, label))
+                reservoir.add((position, row))
+                position += 1
+
+    counts = {label: reservoir.seen for label, reservoir in reservoirs.items()}
+    capped = {label: count if per_label_cap is None else min(count, per_label_cap) for label, count in counts.items()}
+    quotas = capped if size is None else allocate(capped, size, min_per_label)
+    sample = []
+    for label in sorted(reservoirs):
+        items = reservoirs[label].items
+        # A uniform subset of a uniform reservoir is a uniform sample of the label.
+        sample.extend(label_rng(seed + 1, label).sample(items, quotas[label]))
+    sample.sort()
+    return [row for _, row in sample], counts
+
+
+def sample_kdd99(inputs: Sequence[str], output_dir: str, split: str = SMALL_SPLIT, size: Optional[int] = None,
+                 per_label_cap: Optional[int] = None, min_per_label: int = 0, seed: int = DEFAULT_SEED,
+                 compress: bool = False) -> Dict[str, int]:
+    """Writes a stratified sample of the inputs to `<output_dir>/<split>`, see `sample_rows`.
+
+    Returns:
+      Number of sampled rows per label.
+    """
+    start = time.time()
+    rows, counts = sample_rows(inputs, size, per_label_cap, min_per_label, seed)
+    split_dir = os.path.join(output_dir, split)
+    os.makedirs(split_dir, exist_ok=True)
+    for filename in os.listdir(split_dir):
+        if filename.startswith(f"kddcup.{split}"):
+            print(f"Removing previous output {os.path.join(split_dir, filename)}")
+            os.remove(os.path.join(split_dir, filename))
+    path = os.path.join(split_dir, f"kddcup.{split}-00000-of-00001" + (".gz" if compress else ""))
+    with (gzip.open if compress else open)(path, 'wb') as output_file:
+        output_file.write(KDD99_HEADER.encode() + b'\n')
+        for row in rows:
+            output_file.write(row + b'\n')
+
+    sampled = {}  # type: Dict[str, int]
+    for row in rows:
+        label = row.rsplit(b',', 1)[-1].decode()
+        sampled[label] = sampled.get(label, 0) + 1
+    seconds = time.time() - start
+    print(f"Sampled {len(rows)} of {sum(counts.values())} rows in {seconds:.2f}s to {path}")
+    for label in sorted(counts, key=counts.get, reverse=True):
+        print(f"  {label.decode():<20}{counts[label]:>10}{sampled.get(label.decode(), 0):>10}")
+    return sampled
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    sample_kdd99(args.input, args.output_dir, args.split, args.size, args.per_label_cap, args.min_per_label,
+                 args.seed, args.gzip)
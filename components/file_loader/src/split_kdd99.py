@@ -0,0 +1,224 @@
+"""
+Splits the raw KDD99 csv into the data/train, data/test, data/validate and data/train.small layout.
+
+Every row is assigned to a split by a keyed hash of its line number and content, so the split is
+reproducible across runs. With --by-content the line number is left out of the hash and identical
+rows always land in the same split, which keeps the many duplicated KDD99 rows from leaking between
+train and test at the price of less exact split sizes. The input is streamed once; worker
+processes hash the rows and write their own shards. For a label stratified train.small, sample the
+train split with sample_kdd99 afterwards.
+"""
+import argparse
+import gzip
+import hashlib
+import multiprocessing
+import os
+import queue as queue_module
+import resource
+import time
+from typing import BinaryIO, Dict, Iterator, List, Sequence, Tuple
+
+KDD99_HEADER = ("num_0,transport_protocol,application_protocol,cat_0,"
+                + ",".join(f"num_{i}" for i in range(1, 38))
+                + ",label_0")
+SPLITS = ("train", "test", "validate")
+SMALL_SPLIT = "train.small"
+DEFAULT_RATIOS = (1 / 3, 1 / 3, 1 / 3)
+DEFAULT_SMALL_RATIO = 0.06  # roughly the 100k rows of the former train.small on the full data set
+DEFAULT_SALT = "kdd99"
+CHUNK_LINES = 20000
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Hash based KDD99 splitter')
+    parser.add_argument('--input', type=str, required=True, help='Raw KDD99 csv, optionally gzipped.')
+    parser.add_argument('--output-dir', type=str, default='./data', help='Directory containing the split folders.')
+    parser.add_argument('--ratios', type=float, nargs=3, default=DEFAULT_RATIOS,
+                        metavar=('TRAIN', 'TEST', 'VALIDATE'), help='Relative sizes of the splits.')
+    parser.add_argument('--small-ratio', type=float, default=DEFAULT_SMALL_RATIO,
+                        help='Fraction of the train split that also goes to train.small.')
+    parser.add_argument('--num-workers', type=int, default=0, help='0 means one worker per CPU.')
+    parser.add_argument('--gzip', action='store_true', help='Write gzipped shards.')
+    parser.add_argument('--salt', type=str, default=DEFAULT_SALT, help='Changes the assignment of rows to splits.')
+    parser.add_argument('--by-content', action='store_true',
+                        help='Hash only the row content, so duplicated rows share a split.')
+
+    return parser.parse_args()
+
+
+def row_fraction(row: bytes, key: bytes, line_number: int = -1) -> float:
+    """Maps a row (and its line number, if not negative) deterministically to a number in [0, 1)."""
+    digest = hashlib.blake2b(row, digest_size=8, key=key)
+    if line_number >= 0:
+        digest.update(line_number.to_bytes(8, 'big'))
+    digest = digest.digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+def split_thresholds(ratios: Sequence[float]) -> List[float]:
+    """Cumulative upper bounds of the splits in [0, 1]."""
+    total = sum(ratios)
+    if total <= 0 or any(ratio < 0 for ratio in ratios):
+        raise ValueError(f"Split ratios must be non-negative and not all zero, got {ratios}")
+    thresholds, cumulative = [], 0.0
+    for ratio in ratios:
+        cumulative += ratio / total
+        thresholds.append(cumulative)
+    thresholds[-1] = 1.0
+    return thresholds
+
+
+def open_input(path: str) -> BinaryIO:
+    with open(path, 'rb') as file:
+        magic = file.read(2)
+    return gzip.open(path, 'rb') if magic == b'\x1f\x8b' else open(path, 'rb')
+
+
+def read_chunks(path: str, chunk_lines: int = CHUNK_LINES) -> Iterator[List[Tuple[int, bytes]]]:
+    """Yields lists of (line number, raw row), skipping blank lines and headers."""
+    header = KDD99_HEADER.encode()
+    chunk = []
+    with open_input(path) as file:
+        for line_number, line in enumerate(file):
+            row = line.rstrip(b'\r\n')
+            if not row or row == header:
+                continue
+            chunk.append((line_number, row))
+            if len(chunk) == chunk_lines:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def shard_path(output_dir: str, split: str, shard: int, num_shards: int, compress: bool) -> str:
+    filename = f"kddcup.{split}-{shard:05d}-of-{num_shards:05d}" + (".gz" if compress else "")
+    return os.path.join(output_dir, split, filename)
+
+
+def _split_worker(shard: int, num_shards: int, queue: multiprocessing.Queue, counts: multiprocessing.Queue,
+                  output_dir: str, thresholds: List[float], small_threshold: float, key: bytes,
+                  compress: bool, by_content: bool) -> None:
+    opener = gzip.open if compress else open
+    split_names = list(SPLITS) + [SMALL_SPLIT]
+    writers = {split: opener(shard_path(output_dir, split, shard, num_shards, compress), 'wb')
+               for split in split_names}
+    split_counts = dict.fromkeys(split_names, 0)
+    try:
+        for writer in writers.values():
+            writer.write(KDD99_HEADER.encode() + b'\n')
+        for chunk in iter(queue.get, None):
+            for line_number, row in chunk:
+                fraction = row_fraction(row, key, -1 if by_content else line_number)
+                index = 0
+                while fraction >= thresholds[index]:
+                    index += 1
+                split = SPLITS[index]
+                writers[split].write(row + b'\n')
+                split_counts[split] += 1
+                # train.small is nested in train: it uses the lowest part of the train hash range.
+                if fraction < small_threshold:
+                    writers[SMALL_SPLIT].write(row + b'\n')
+                    split_counts[SMALL_SPLIT] += 1
+    finally:
+        for writer in writers.values():
+            writer.close()
+    counts.put(split_counts)
+
+
+def _remove_previous_shards(output_dir: str, split: str) -> None:
+    split_dir = os.path.join(output_dir, split)
+    os.makedirs(split_dir, exist_ok=True)
+    for filename in os.listdir(split_dir):
+        if filename.startswith(f"kddcup.{split}"):
+            print(f"Removing previous output {os.path.join(split_dir, filename)}")
+            os.remove(os.path.join(split_dir, filename))
+
+
+def _check_workers(workers: List[multiprocessing.Process]) -> None:
+    for worker in workers:
+        if worker.exitcode not in (None, 0):
+            raise RuntimeError(f"Split worker {worker.name} failed with exit code {worker.exitcode}")
+
+
+def _put(queue: multiprocessing.Queue, item, workers: List[multiprocessing.Process]) -> None:
+    while True:
+        try:
+            return queue.put(item, timeout=1)
+        except queue_module.Full:
+            _check_workers(workers)
+
+
+def split_kdd99(input_path: str, output_dir: str, ratios: Sequence[float] = DEFAULT_RATIOS,
+                small_ratio: float = DEFAULT_SMALL_RATIO, num_workers: int = 0, compress: bool = False,
+                salt: str = DEFAULT_SALT, by_content: bool = False,
+                chunk_lines: int = CHUNK_LINES) -> Dict[str, int]:
+    """Streams `input_path` once and writes the hash based splits below `output_dir`.
+
+    Args:
+      input_path: Raw KDD99 csv, with or without header, optionally gzipped.
+      output_dir: Directory that receives one folder per split (the `data` folder of this repo).
+      ratios: Relative sizes of the train, test and validate splits.
+      small_ratio: Fraction of the train split that is also written to train.small.
+      num_workers: Number of worker processes and thereby shards per split, 0 means one per CPU.
+      compress: Whether to gzip the shards.
+      salt: Key of the row hash, the same salt always yields the same split.
+      by_content: Whether to leave the line number out of the hash, so duplicated rows share a split.
+      chunk_lines: Number of rows handed to a worker at once.
+    Returns:
+      Number of rows written per split.
+    """
+    thresholds = split_thresholds(ratios)
+    small_threshold = thresholds[0] * small_ratio
+    key = salt.encode()[:hashlib.blake2b.MAX_KEY_SIZE]
+    num_workers = num_workers or os.cpu_count() or 1
+    for split in list(SPLITS) + [SMALL_SPLIT]:
+        _remove_previous_shards(output_dir, split)
+
+    start = time.time()
+    # The bounded queue keeps the reader from running ahead of the workers, so memory does not
+    # depend on the input size.
+    queue = multiprocessing.Queue(maxsize=2 * num_workers)
+    counts = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_split_worker,
+                                       args=(shard, num_workers, queue, counts, output_dir, thresholds,
+                                             small_threshold, key, compress, by_content))
+               for shard in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        for chunk in read_chunks(input_path, chunk_lines):
+            _put(queue, chunk, workers)
+        for _ in workers:
+            _put(queue, None, workers)
+        total_counts = dict.fromkeys(list(SPLITS) + [SMALL_SPLIT], 0)
+        finished = 0
+        while finished < num_workers:
+            try:
+                worker_counts = counts.get(timeout=1)
+            except queue_module.Empty:
+                _check_workers(workers)
+                continue
+            for split, count in worker_counts.items():
+                total_counts[split] += count
+            finished += 1
+    except BaseException:
+        for worker in workers:
+            worker.terminate()
+        raise
+    for worker in workers:
+        worker.join()
+
+    seconds = time.time() - start
+    rows = sum(total_counts[split] for split in SPLITS)
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+    print(f"Split {rows} rows in {seconds:.2f}s ({rows / max(seconds, 1e-9):.0f} rows/s, "
+          f"peak RSS {peak_rss:.1f} MiB): {total_counts}")
+    return total_counts
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    split_kdd99(args.input, args.output_dir, args.ratios, args.small_ratio, args.num_workers, args.gzip, args.salt,
+                args.by_content)
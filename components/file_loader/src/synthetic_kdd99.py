@@ -0,0 +1,186 @@
+"""
+Synthetic KDD99 data at any row count, for scaling experiments without the full data set.
+
+A profile is fitted once on a real KDD99 csv: the label mix and, per label, the distribution of
+every column. Columns with few distinct values keep their exact value frequencies, the others an
+inverse CDF of 257 quantiles. Generation draws a label per row and then every column from its
+distribution for that label, so the marginals per label and the label mix match the source while
+the columns are independent given the label. Rows are written in the KDD99_HEADER layout by worker
+processes, each with its own seeded generator and shard:
+
+    <output_dir>/kddcup.synthetic-00000-of-0000N[.gz]
+
+Usage: python -m custom_components.file_loader.src.synthetic_kdd99 --source kddcup.gz --rows 10000000 --output-dir /tmp/synthetic
+"""
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER, read_chunks
+
+COLUMNS = KDD99_HEADER.split(',')
+MAX_DISTINCT = 256  # columns with more distinct values per label are stored as quantiles
+NUM_QUANTILES = 257
+BLOCK_ROWS = 100000
+DEFAULT_SEED = 99
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Synthetic KDD99 generator')
+    parser.add_argument('--source', type=str, default='./kddcup.gz',
+                        help='Real KDD99 csv to fit the profile on, if --profile does not exist yet.')
+    parser.add_argument('--profile', type=str, default='./kdd99_profile.json', help='Fitted profile, created if missing.')
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--output-dir', type=str, required=True)
+    parser.add_argument('--num-shards', type=int, default=0, help='0 means one shard and worker per CPU.')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--gzip', action='store_true', help='Write gzipped shards.')
+
+    return parser.parse_args()
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _compress(counts: Counter, numeric: bool) -> Dict[str, Any]:
+    """Exact value frequencies, or quantiles of numeric columns with many distinct values."""
+    values = sorted(counts, key=float) if numeric else sorted(counts)
+    weights = np.array([counts[value] for value in values], dtype=np.float64)
+    if len(values) <= MAX_DISTINCT or not numeric:
+        return {'values': values, 'p': (weights / weights.sum()).tolist()}
+    numbers = np.array([float(value) for value in values])
+    cumulative = (np.cumsum(weights) - weights / 2) / weights.sum()
+    quantiles = np.interp(np.linspace(0, 1, NUM_QUANTILES), cumulative, numbers)
+    return {'quantiles': quantiles.tolist(),
+            'integer': all(float(value).is_integer() for value in values),
+            'decimals': max(len(value.split('.')[1]) if '.' in value else 0 for value in values)}
+
+
+def fit_profile(source: str, max_rows: Optional[int] = None) -> Dict[str, Any]:
+    """Label mix and per label column distributions of a KDD99 csv, with or without header."""
+    counts = {}  # type: Dict[str, List[Counter]]
+    numeric = [True] * len(COLUMNS)
+    rows = 0
+    for chunk in read_chunks(source):
+        table = np.array([row.split(b',') for _, row in chunk], dtype=np.bytes_)
+        for label in np.unique(table[:, -1]).tolist():
+            label_rows = table[table[:, -1] == label]
+            label_counts = counts.setdefault(label.decode(), [Counter() for _ in COLUMNS[:-1]])
+            for i, column_counts in enumerate(label_counts):
+                values, value_counts = np.unique(label_rows[:, i], return_counts=True)
+                column_counts.update(dict(zip((value.decode() for value in values.tolist()),
+                                              value_counts.tolist())))
+        rows += len(chunk)
+        if max_rows and rows >= max_rows:
+            break
+    for label_counts in counts.values():
+        for i, column_counts in enumerate(label_counts):
+            numeric[i] = numeric[i] and all(_is_number(value) for value in column_counts)
+    return {'rows': rows,
+            'columns': COLUMNS,
+            'labels': {label: sum(label_counts[0].values()) / rows for label, label_counts in counts.items()},
+            'distributions': {label: [_compress(column_counts, numeric[i])
+                                      for i, column_counts in enumerate(label_counts)]
+                              for label, label_counts in counts.items()}}
+
+
+def load_profile(path: str, source: str) -> Dict[str, Any]:
+    if os.path.exists(path):
+        with open(path) as profile_file:
+            return json.load(profile_file)
+    start = time.time()
+    profile = fit_profile(source)
+    with open(path, 'w') as profile_file:
+        json.dump(profile, profile_file)
+    print(f"Fitted profile on {profile['rows']} rows of {source} in {time.time() - start:.1f}s")
+    return profile
+
+
+def _sample_column(distribution: Dict[str, Any], size: int, rng: np.random.Generator) -> np.ndarray:
+    if 'values' in distribution:
+        values = np.array([value.encode() for value in distribution['values']], dtype=np.bytes_)
+        return values[rng.choice(len(values), size=size, p=distribution['p'])]
+    quantiles = np.array(distribution['quantiles'])
+    numbers = np.interp(rng.random(size), np.linspace(0, 1, len(quantiles)), quantiles)
+    if distribution['integer']:
+        return np.round(numbers).astype(np.int64).astype(np.bytes_)
+    return np.char.mod(f"%.{distribution['decimals']}f", numbers).astype(np.bytes_)
+
+
+def generate_block(profile: Dict[str, Any], rows: int, rng: np.random.Generator) -> bytes:
+    """`rows` csv lines drawn from the profile."""
+    labels = list(profile['labels'])
+    probabilities = np.array([profile['labels'][label] for label in labels])
+    label_ids = rng.choice(len(labels), size=rows, p=probabilities / probabilities.sum())
+    table = np.empty((rows, len(COLUMNS)), dtype=object)
+    for label_id in np.unique(label_ids).tolist():
+        selected = np.nonzero(label_ids == label_id)[0]
+        for i, distribution in enumerate(profile['distributions'][labels[label_id]]):
+            table[selected, i] = _sample_column(distribution, len(selected), rng)
+        table[selected, -1] = labels[label_id].encode()
+    return b''.join(b','.join(row) + b'\n' for row in table.tolist())
+
+
+def shard_path(output_dir: str, shard: int, num_shards: int, compress: bool) -> str:
+    return os.path.join(output_dir, f"kddcup.synthetic-{shard:05d}-of-{num_shards:05d}" + (".gz" if compress else ""))
+
+
+def _generate_shard(task) -> int:
+    profile, rows, path, seed_sequence, compress = task
+    rng = np.random.default_rng(seed_sequence)
+    opener = gzip.open if compress else open
+    with opener(path, 'wb') as shard_file:
+        shard_file.write(KDD99_HEADER.encode() + b'\n')
+        for start in range(0, rows, BLOCK_ROWS):
+            shard_file.write(generate_block(profile, min(BLOCK_ROWS, rows - start), rng))
+    return rows
+
+
+def generate(profile: Dict[str, Any], rows: int, output_dir: str, num_shards: int = 0,
+             seed: int = DEFAULT_SEED, compress: bool = False) -> List[str]:
+    """Writes `rows` synthetic rows to `output_dir` in parallel shards.
+
+    Args:
+      profile: Result of `fit_profile`.
+      rows: Total number of rows.
+      output_dir: Directory of the shards, previous synthetic shards are removed.
+      num_shards: Number of shards and worker processes, 0 means one per CPU.
+      seed: The same seed and number of shards always yield the same rows.
+      compress: Whether to gzip the shards.
+    Returns:
+      Paths of the shards.
+    """
+    num_shards = num_shards or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    for filename in os.listdir(output_dir):
+        if filename.startswith('kddcup.synthetic-'):
+            os.remove(os.path.join(output_dir, filename))
+    paths = [shard_path(output_dir, shard, num_shards, compress) for shard in range(num_shards)]
+    shard_rows = [rows // num_shards + (1 if shard < rows % num_shards else 0) for shard in range(num_shards)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(num_shards)
+    tasks = [(profile, shard_rows[shard], paths[shard], seed_sequences[shard], compress)
+             for shard in range(num_shards)]
+    start = time.time()
+    with multiprocessing.Pool(num_shards) as pool:
+        written = sum(pool.imap_unordered(_generate_shard, tasks))
+    seconds = time.time() - start
+    print(f"Generated {written} rows in {num_shards} shards in {seconds:.1f}s ({written / max(seconds, 1e-9):.0f} rows/s)")
+    return paths
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    generate(load_profile(args.profile, args.source), args.rows, args.output_dir, args.num_shards, args.seed,
+             args.gzip)
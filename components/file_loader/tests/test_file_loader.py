@@ -0,0 +1,85 @@
+import gzip
+import os
+
+from custom_components.file_loader.src.file_loader import (download_kdd99, manifest_filename, materialize,
+                                                           materialize_split, sha256_file)
+
+ROWS = b"0,tcp,http,SF,181,5450,normal.\n0,udp,private,SF,105,146,normal.\n"
+
+
+def write_source(tmp_path) -> str:
+    source = str(tmp_path / "kddcup.gz")
+    with gzip.open(source, "wb") as file:
+        file.write(ROWS * 1000)
+    return source
+
+
+def test_streams_local_source(tmp_path):
+    # given
+    source = write_source(tmp_path)
+    # when
+    csv_path = download_kdd99(str(tmp_path / "out"), source, chunk_size=64)
+    # then
+    with open(csv_path, "rb") as file:
+        assert file.read() == ROWS * 1000
+
+
+def test_skips_materialized_file(tmp_path):
+    # given
+    source = write_source(tmp_path)
+    csv_path = download_kdd99(str(tmp_path / "out"), source)
+    modified = os.path.getmtime(csv_path)
+    # when
+    download_kdd99(str(tmp_path / "out"), source)
+    # then
+    assert os.path.getmtime(csv_path) == modified
+
+
+def test_refreshes_when_source_changes(tmp_path):
+    # given
+    source = write_source(tmp_path)
+    csv_path = download_kdd99(str(tmp_path / "out"), source)
+    with gzip.open(source, "wb") as file:
+        file.write(ROWS)
+    # when
+    download_kdd99(str(tmp_path / "out"), source)
+    # then
+    with open(csv_path, "rb") as file:
+        assert file.read() == ROWS
+    assert sha256_file(csv_path) != sha256_file(source)
+
+
+def test_materializes_without_copy_and_skips_unchanged(tmp_path):
+    # given
+    source = tmp_path / "kddcup.train"
+    source.write_bytes(ROWS * 10)
+    destination = str(tmp_path / "out" / "kddcup.train")
+    # when
+    first = materialize(str(source), destination)
+    second = materialize(str(source), destination)
+    # then
+    assert first in ("hardlink", "reflink", "kernel_copy", "copy")
+    assert second == "unchanged"
+    assert sha256_file(destination) == sha256_file(str(source))
+
+
+def test_keeps_the_manifest_outside_the_destination(tmp_path):
+    # given
+    source = write_source(tmp_path)
+    # when
+    download_kdd99(str(tmp_path / "out"), source)
+    # then
+    assert os.listdir(str(tmp_path / "out")) == ["kddcup.csv"]
+    assert os.path.exists(manifest_filename(str(tmp_path / "out" / "kddcup.csv")))
+
+
+def test_materialized_split_holds_only_the_data(tmp_path):
+    # given
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "part-0.csv").write_bytes(ROWS)
+    (tmp_path / "in" / "part-1.csv").write_bytes(ROWS * 2)
+    # when
+    materialize_split(str(tmp_path / "in"), str(tmp_path / "out"))
+    # then
+    assert sorted(os.listdir(str(tmp_path / "out"))) == ["part-0.csv", "part-1.csv"]
+    assert materialize_split(str(tmp_path / "in"), str(tmp_path / "out")) == {"unchanged": 2}
@@ -0,0 +1,55 @@
+import gzip
+from collections import Counter
+
+from custom_components.file_loader.src.sample_kdd99 import Reservoir, allocate, label_rng, sample_rows
+
+LABELS = ["smurf."] * 8 + ["normal."] * 3 + ["guess_passwd."]
+ROWS = [f"{i},tcp,http,SF,{i * 7},0,{LABELS[i % len(LABELS)]}" for i in range(12000)]
+
+
+def write_input(tmp_path) -> str:
+    path = str(tmp_path / "kddcup.data.gz")
+    with gzip.open(path, "wt") as file:
+        file.write("\n".join(ROWS) + "\n")
+    return path
+
+
+def test_reservoir_is_uniform():
+    # given
+    hits = Counter()
+    # when
+    for seed in range(2000):
+        reservoir = Reservoir(10, label_rng(seed, b"label"))
+        for item in range(100):
+            reservoir.add(item)
+        hits.update(reservoir.items)
+    # then
+    assert len(hits) == 100
+    assert all(120 < count < 280 for count in hits.values())
+
+
+def test_reservoir_extend_matches_add():
+    # given
+    added, extended = Reservoir(10, label_rng(1, b"label")), Reservoir(10, label_rng(1, b"label"))
+    # when
+    for item in range(100000):
+        added.add(item)
+    for start in range(0, 100000, 777):
+        extended.extend(range(start, min(start + 777, 100000)))
+    # then
+    assert extended.items == added.items and extended.seen == added.seen == 100000
+
+
+def test_stratified_sample_is_proportional_and_reproducible(tmp_path):
+    # given
+    input_path = write_input(tmp_path)
+    # when
+    rows, counts = sample_rows([input_path], size=600, min_per_label=100, seed=7)
+    again, _ = sample_rows([input_path], size=600, min_per_label=100, seed=7)
+    # then
+    labels = Counter(row.rsplit(b",", 1)[-1] for row in rows)
+    assert rows == again
+    assert counts == {b"smurf.": 8000, b"normal.": 3000, b"guess_passwd.": 1000}
+    assert labels == {b"smurf.": 364, b"normal.": 136, b"guess_passwd.": 100}
+    assert rows == sorted(rows, key=lambda row: int(row.split(b",")[0]))
+    assert allocate({b"a": 5, b"b": 1000}, 100, min_per_label=10) == {b"a": 5, b"b": 95}
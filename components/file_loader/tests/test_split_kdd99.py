@@ -0,0 +1,48 @@
+import glob
+import gzip
+
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER, split_kdd99
+
+ROWS = [f"{i},tcp,http,SF,{i * 7},0,{'normal' if i % 3 else 'smurf'}." for i in range(3000)]
+
+
+def write_input(tmp_path) -> str:
+    path = str(tmp_path / "kddcup.data.gz")
+    with gzip.open(path, "wt") as file:
+        file.write("\n".join(ROWS) + "\n")
+    return path
+
+
+def read_split(output_dir, split):
+    rows = []
+    for path in sorted(glob.glob(f"{output_dir}/{split}/kddcup.{split}-*")):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as file:
+            lines = file.read().splitlines()
+        assert lines[0] == KDD99_HEADER
+        rows.extend(lines[1:])
+    return rows
+
+
+def test_splits_every_row_once(tmp_path):
+    # given
+    input_path = write_input(tmp_path)
+    # when
+    counts = split_kdd99(input_path, str(tmp_path / "data"), num_workers=3)
+    # then
+    splits = {split: read_split(tmp_path / "data", split) for split in ("train", "test", "validate")}
+    assert sorted(sum(splits.values(), [])) == sorted(ROWS)
+    assert {split: len(rows) for split, rows in splits.items()} == {
+        split: counts[split] for split in splits}
+    assert set(read_split(tmp_path / "data", "train.small")) <= set(splits["train"])
+
+
+def test_split_is_reproducible(tmp_path):
+    # given
+    input_path = write_input(tmp_path)
+    split_kdd99(input_path, str(tmp_path / "first"), num_workers=2, compress=True)
+    # when
+    split_kdd99(input_path, str(tmp_path / "second"), num_workers=4)
+    # then
+    for split in ("train", "test", "validate", "train.small"):
+        assert sorted(read_split(tmp_path / "first", split)) == sorted(read_split(tmp_path / "second", split))
@@ -0,0 +1,44 @@
+import collections
+import gzip
+
+import numpy as np
+
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER
+from custom_components.file_loader.src.synthetic_kdd99 import fit_profile, generate, generate_block
+
+NUMBERS = ",".join(["0"] * 37)
+
+
+def write_source(tmp_path) -> str:
+    rows = [f"{i % 50},tcp,http,SF,{NUMBERS},normal." for i in range(300)]
+    rows += [f"0,icmp,ecr_i,SF,{NUMBERS},smurf." for _ in range(700)]
+    path = str(tmp_path / "kddcup.gz")
+    with gzip.open(path, "wt") as file:
+        file.write("\n".join(rows) + "\n")
+    return path
+
+
+def test_reproduces_label_mix_and_conditional_columns(tmp_path):
+    # given
+    profile = fit_profile(write_source(tmp_path))
+    # when
+    lines = generate_block(profile, 20000, np.random.default_rng(0)).decode().splitlines()
+    # then
+    rows = [line.split(",") for line in lines]
+    assert all(len(row) == len(KDD99_HEADER.split(",")) for row in rows)
+    labels = collections.Counter(row[-1] for row in rows)
+    assert abs(labels["smurf."] / len(rows) - 0.7) < 0.02
+    assert all(row[1] == "icmp" for row in rows if row[-1] == "smurf.")
+    assert {int(row[0]) for row in rows if row[-1] == "normal."} == set(range(50))
+
+
+def test_same_seed_same_rows(tmp_path):
+    # given
+    profile = fit_profile(write_source(tmp_path))
+    # when
+    first = generate(profile, 1000, str(tmp_path / "first"), num_shards=2, seed=1)
+    second = generate(profile, 1000, str(tmp_path / "second"), num_shards=2, seed=1)
+    # then
+    for first_path, second_path in zip(first, second):
+        with open(first_path) as first_file, open(second_path) as second_file:
+            assert first_file.read() == second_file.read()
@@ -0,0 +1,288 @@
+"""
+Execution metrics of custom executors.
+
+Deriving an executor from `InstrumentedExecutorMixin` records, for every `Do`:
+
+    spans          wall and CPU seconds plus RSS at the end of the phases setup, resolve, read, compute, write
+    counters       rows processed, bytes read and written
+    peak_rss_mib   of the executor process and of its waited-for children
+
+and writes them to `<pipeline_root>/<component>/execution_metrics/<execution id>/metrics.json`,
+next to the output artifacts. Executors mark their phases with `with self.span('read'):` and count
+with `self.add_rows(n)`; without explicit byte counts the sizes of the input and output artifacts
+are used. The `setup` phase is the instrumentation's own, before `Do` starts: finding the metrics
+dir and sizing the inputs. Setting the environment variable EXECUTOR_PROFILER to `cprofile` or
+`sampling` also stores a profile of `Do` in the same directory (`profile.pstats` or flame graph
+input `profile.folded`).
+"""
+import cProfile
+import collections
+import contextlib
+import glob
+import functools
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Text
+
+METRICS_DIR = 'execution_metrics'
+METRICS_FILE = 'metrics.json'
+PROFILER_ENV = 'EXECUTOR_PROFILER'
+SAMPLING_INTERVAL = 0.01
+RSS_SAMPLE_SECONDS = 0.2
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def current_rss_mib() -> float:
+    """Resident memory of this process right now."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE / (1 << 20)
+    except OSError:
+        return 0.
+
+
+def peak_rss_mib() -> float:
+    """Peak resident memory of this process and its largest waited-for child (ru_maxrss is in KiB)."""
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+
+def tree_bytes(path: Text) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(directory, filename))
+               for directory, _, filenames in os.walk(path) for filename in filenames)
+
+
+def process_tree_rss(root_pid: int) -> int:
+    """Resident bytes of `root_pid` and all its descendants, read from /proc."""
+    parents = {}
+    rss = {}
+    for stat_path in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat_path) as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # The command name in parentheses may contain spaces, the fields after it do not.
+        fields = stat[stat.rfind(')') + 2:].split()
+        pid = int(stat_path.split('/')[2])
+        parents[pid] = int(fields[1])
+        rss[pid] = int(fields[21]) * _PAGE_SIZE
+    tree = {root_pid}
+    added = True
+    while added:
+        children = {pid for pid, parent in parents.items() if parent in tree and pid not in tree}
+        tree |= children
+        added = bool(children)
+    return sum(rss.get(pid, 0) for pid in tree)
+
+
+class ProcessTreeRssSampler(threading.Thread):
+    """Samples the resident memory of this process tree and keeps the maximum."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        super(ProcessTreeRssSampler, self).__init__(daemon=True)
+        self._interval = interval
+        self._stopped = threading.Event()
+        self.peak_bytes = 0
+
+    def run(self):
+        while True:
+            self.peak_bytes = max(self.peak_bytes, process_tree_rss(os.getpid()))
+            if self._stopped.wait(self._interval):
+                return
+
+    def stop(self) -> int:
+        self._stopped.set()
+        self.join()
+        return self.peak_bytes
+
+
+class ExecutionMetrics:
+    """Spans and counters of one execution."""
+
+    def __init__(self):
+        self._start = time.time()
+        self.spans = []  # type: List[Dict[Text, Any]]
+        self.rows = 0
+        self.bytes_read = None  # type: Optional[int]
+        self.bytes_written = None  # type: Optional[int]
+
+    @contextlib.contextmanager
+    def span(self, phase: Text) -> Iterator[None]:
+        start, cpu_start = time.time(), time.process_time()
+        try:
+            yield
+        finally:
+            self.spans.append({'phase': phase,
+                               'start_seconds': start - self._start,
+                               'wall_seconds': time.time() - start,
+                               'cpu_seconds': time.process_time() - cpu_start,
+                               'rss_mib': current_rss_mib()})
+
+    def add_rows(self, rows: int) -> None:
+        self.rows += rows
+
+    def add_bytes_read(self, num_bytes: int) -> None:
+        self.bytes_read = (self.bytes_read or 0) + num_bytes
+
+    def add_bytes_written(self, num_bytes: int) -> None:
+        self.bytes_written = (self.bytes_written or 0) + num_bytes
+
+    def as_dict(self) -> Dict[Text, Any]:
+        seconds = time.time() - self._start
+        return {'wall_seconds': seconds,
+                'spans': self.spans,
+                'rows': self.rows,
+                'rows_per_sec': self.rows / max(seconds, 1e-9),
+                'bytes_read': self.bytes_read or 0,
+                'bytes_written': self.bytes_written or 0,
+                'peak_rss_mib': peak_rss_mib()}
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples the stack of one thread and counts the collapsed stacks, for flame graphs."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLING_INTERVAL):
+        super(SamplingProfiler, self).__init__(daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stopped = threading.Event()
+        self.stacks = collections.Counter()  # type: Dict[Text, int]
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def write(self, path: Text) -> None:
+        with open(path, 'w') as folded_file:
+            for stack, count in self.stacks.most_common():
+                folded_file.write(f"{stack} {count}\n")
+
+
+def metrics_dir(output_dict: Dict[Text, List[Any]], tmp_path: Optional[Text]) -> Optional[Text]:
+    """`<pipeline_root>/<component>/execution_metrics/<execution id>` derived from an output uri
+    `<pipeline_root>/<component>/<output key>/<execution id>`, or below the temp path of the
+    execution for executors without outputs.
+    """
+    for artifacts in output_dict.values():
+        for artifact in artifacts:
+            execution_dir = os.path.normpath(artifact.uri)
+            component_dir = os.path.dirname(os.path.dirname(execution_dir))
+            return os.path.join(component_dir, METRICS_DIR, os.path.basename(execution_dir))
+    return os.path.join(tmp_path, METRICS_DIR) if tmp_path else None
+
+
+def instrument_do(do):
+    """Wraps the `Do` of an executor class with ExecutionMetrics, see InstrumentedExecutorMixin."""
+
+    @functools.wraps(do)
+    def wrapper(self, input_dict: Dict[Text, List[Any]], output_dict: Dict[Text, List[Any]],
+                exec_properties: Dict[Text, Any]) -> None:
+        if getattr(self, '_metrics', None) is not None:
+            # Do of a subclass calling the instrumented Do of its base class.
+            return do(self, input_dict, output_dict, exec_properties)
+        self._metrics = ExecutionMetrics()
+        with self.span('setup'):
+            output_dir = metrics_dir(output_dict, self._execution_tmp_path())
+            input_bytes = sum(tree_bytes(artifact.uri) for artifacts in input_dict.values()
+                              for artifact in artifacts if os.path.exists(artifact.uri))
+
+        profiler_name = os.environ.get(PROFILER_ENV, '')
+        profiler = None
+        if profiler_name == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif profiler_name == 'sampling':
+            profiler = SamplingProfiler(threading.get_ident())
+            profiler.start()
+        try:
+            return do(self, input_dict, output_dict, exec_properties)
+        finally:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+            elif profiler is not None:
+                profiler.stop()
+            if self._metrics.bytes_read is None:
+                self._metrics.add_bytes_read(input_bytes)
+            if self._metrics.bytes_written is None:
+                self._metrics.add_bytes_written(sum(tree_bytes(artifact.uri) for artifacts in output_dict.values()
+                                                    for artifact in artifacts if os.path.exists(artifact.uri)))
+            if output_dir:
+                self._write_metrics(output_dir, profiler)
+            self._metrics = None
+
+    return wrapper
+
+
+class InstrumentedExecutorMixin:
+    """Records ExecutionMetrics of the `Do` of every executor class deriving from it."""
+
+    _metrics = None  # type: Optional[ExecutionMetrics]
+
+    def __init_subclass__(cls, **kwargs):
+        super(InstrumentedExecutorMixin, cls).__init_subclass__(**kwargs)
+        if 'Do' in cls.__dict__:
+            cls.Do = instrument_do(cls.__dict__['Do'])
+
+    @contextlib.contextmanager
+    def span(self, phase: Text) -> Iterator[None]:
+        if self._metrics is None:
+            yield
+            return
+        with self._metrics.span(phase):
+            yield
+
+    def add_rows(self, rows: int) -> None:
+        if self._metrics is not None:
+            self._metrics.add_rows(rows)
+
+    def add_bytes_read(self, num_bytes: int) -> None:
+        if self._metrics is not None:
+            self._metrics.add_bytes_read(num_bytes)
+
+    def add_bytes_written(self, num_bytes: int) -> None:
+        if self._metrics is not None:
+            self._metrics.add_bytes_written(num_bytes)
+
+    def _execution_tmp_path(self) -> Optional[Text]:
+        context = getattr(self, '_context', None)
+        try:
+            return context.get_tmp_path() if context else None
+        except RuntimeError:
+            return None
+
+    def _write_metrics(self, output_dir: Text, profiler) -> None:
+        os.makedirs(output_dir, exist_ok=True)
+        metrics = self._metrics.as_dict()
+        metrics['executor'] = '{}.{}'.format(type(self).__module__, type(self).__name__)
+        if isinstance(profiler, cProfile.Profile):
+            profiler.dump_stats(os.path.join(output_dir, 'profile.pstats'))
+            stats = pstats.Stats(profiler)
+            metrics['profile_top'] = [
+                {'function': '{}:{}({})'.format(*function), 'calls': calls, 'cumulative_seconds': cumulative}
+                for function, (_, calls, _, cumulative, _) in sorted(
+                    stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:20]]
+        elif profiler is not None:
+            profiler.write(os.path.join(output_dir, 'profile.folded'))
+        with open(os.path.join(output_dir, METRICS_FILE), 'w') as metrics_file:
+            json.dump(metrics, metrics_file, indent=2)
+        print(f"Execution metrics written to {output_dir}: {metrics['wall_seconds']:.2f}s, "
+              f"{metrics['rows']} rows, peak RSS {metrics['peak_rss_mib']:.1f} MiB")
@@ -0,0 +1,55 @@
+import json
+import os
+
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+
+
+class Artifact:
+    def __init__(self, uri):
+        self.uri = uri
+
+
+class BaseExecutor:
+    def Do(self, input_dict, output_dict, exec_properties):
+        raise NotImplementedError
+
+
+class CopyExecutor(InstrumentedExecutorMixin, BaseExecutor):
+    def Do(self, input_dict, output_dict, exec_properties):
+        with self.span('read'):
+            with open(os.path.join(input_dict['input'][0].uri, 'data.csv')) as file:
+                lines = file.readlines()
+        with self.span('write'):
+            os.makedirs(output_dict['output'][0].uri, exist_ok=True)
+            with open(os.path.join(output_dict['output'][0].uri, 'data.csv'), 'w') as file:
+                file.writelines(lines)
+        self.add_rows(len(lines))
+
+
+def run_executor(tmp_path, monkeypatch, profiler=''):
+    monkeypatch.setenv('EXECUTOR_PROFILER', profiler)
+    input_dir = tmp_path / 'data'
+    input_dir.mkdir()
+    (input_dir / 'data.csv').write_text('a\nb\nc\n')
+    output_uri = str(tmp_path / 'pipeline' / 'CopyComponent' / 'output' / '7')
+    CopyExecutor().Do({'input': [Artifact(str(input_dir))]}, {'output': [Artifact(output_uri)]}, {})
+    return tmp_path / 'pipeline' / 'CopyComponent' / 'execution_metrics' / '7'
+
+
+def test_writes_metrics_next_to_outputs(tmp_path, monkeypatch):
+    # when
+    metrics_dir = run_executor(tmp_path, monkeypatch)
+    # then
+    metrics = json.loads((metrics_dir / 'metrics.json').read_text())
+    assert [span['phase'] for span in metrics['spans']] == ['setup', 'read', 'write']
+    assert metrics['rows'] == 3
+    assert metrics['bytes_read'] == metrics['bytes_written'] == 6
+    assert metrics['peak_rss_mib'] > 0
+
+
+def test_optional_cprofile(tmp_path, monkeypatch):
+    # when
+    metrics_dir = run_executor(tmp_path, monkeypatch, profiler='cprofile')
+    # then
+    assert (metrics_dir / 'profile.pstats').exists()
+    assert json.loads((metrics_dir / 'metrics.json').read_text())['profile_top']
@@ -0,0 +1,296 @@
+"""
+Beam workers, batch sizes and Kubernetes CPU and memory requests of every component for an input size.
+
+Each component has a cost profile: CPU seconds per million input rows, the memory of its driver
+process, of every Beam worker process (each one imports TensorFlow) and of the data it holds per
+million rows. The defaults below are rough figures of KDD99 runs; `profiles_from_timings` replaces
+them with the measurements in a timing_report.json of kdd_pipe_local.py. For the rows and bytes of
+the input split, `plan` gives every parallel component as many workers as it needs to finish its
+CPU work in about `target_seconds`, at most one per CPU of a node and fewer if their memory would
+not fit it, a batch size whose decoded batches take about BATCH_MEMORY_MIB per worker, and requests
+and limits that cover the estimates.
+
+The op func of `pipeline_operator_func` applies a plan to the component containers: it replaces
+--direct_num_workers in their --beam_pipeline_args, sets the resources and passes the batch size in
+DESIRED_BATCH_SIZE, which CodecTransform reads. The plan for a data size needs no cluster:
+
+Usage: python -m custom_components.resource_planner.src.resource_planner --rows 4898431 --bytes 742579200
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Text
+
+from custom_components.file_loader.src.file_loader import MANIFEST_DIR, MANIFEST_SUFFIX
+
+BATCH_SIZE_ENV = 'DESIRED_BATCH_SIZE'
+BEAM_ARGS_FLAG = '--beam_pipeline_args'
+NUM_WORKERS_ARG = '--direct_num_workers='
+DEFAULT_TARGET_SECONDS = 300.
+BATCH_MEMORY_MIB = 16
+DECODED_EXPANSION = 40  # bytes of a decoded example in memory per byte of its csv row
+MIN_BATCH_SIZE, MAX_BATCH_SIZE = 100, 10000
+MEMORY_HEADROOM = 1.25  # of the limit over the estimate
+MEMORY_STEP_MIB = 128
+CHUNK_SIZE = 1 << 20
+
+
+class CostProfile(NamedTuple):
+    cpu_seconds_per_million_rows: float
+    base_memory_mib: float
+    worker_memory_mib: float = 0.
+    memory_mib_per_million_rows: float = 0.
+    parallel: bool = False  # runs --direct_num_workers workers, or threads for the Trainer
+    batched: bool = False  # takes a desired batch size
+
+
+class InputSize(NamedTuple):
+    rows: int
+    bytes: int  # uncompressed
+
+
+class NodeCapacity(NamedTuple):
+    """Allocatable resources of a node, the most one component pod can request."""
+    cpus: float = 4.
+    memory_mib: float = 16384.
+
+
+class ComponentPlan(NamedTuple):
+    num_workers: int
+    batch_size: Optional[int]
+    cpu_request: float
+    cpu_limit: float
+    memory_request_mib: int
+    memory_limit_mib: int
+    cpu_seconds: float  # estimated
+    fits: bool  # False if even one worker needs more memory than a node has
+
+
+# Per component class; SpanStatistics and SpanTransform process only the rows of the latest span.
+DEFAULT_PROFILES = {
+    'CsvValidator': CostProfile(8., 200., 100., parallel=True),
+    'CsvExampleGen': CostProfile(150., 800., 500., parallel=True),
+    'KddExampleGen': CostProfile(25., 700., 300., parallel=True),
+    'ColumnarCacheComponent': CostProfile(15., 300.),
+    'ExampleDedup': CostProfile(30., 1150.),  # holds at most dedup.DEFAULT_MEMORY_BUDGET of rows
+    'StatisticsGen': CostProfile(90., 900., 600., parallel=True, batched=True),
+    'SpanStatistics': CostProfile(20., 700.),
+    'SchemaGen': CostProfile(1., 500.),
+    'ExampleValidator': CostProfile(1., 500.),
+    'CodecTransform': CostProfile(150., 1000., 700., 20., parallel=True, batched=True),
+    'SpanTransform': CostProfile(150., 1000., 700., 20., parallel=True, batched=True),
+    'Trainer': CostProfile(120., 1500., memory_mib_per_million_rows=400., parallel=True),
+    'SlicedEvaluator': CostProfile(40., 600., 700., parallel=True),
+    'LoadTestValidator': CostProfile(5., 1500.),
+    'OptimizedPusher': CostProfile(5., 2000.),
+    'InputDataVisualizer': CostProfile(20., 400.),
+}
+DEFAULT_PROFILE = CostProfile(50., 1000.)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Resource plan of the kdd_pipe components for an input size')
+    parser.add_argument('--data-root', type=str, default=None,
+                        help='Input split to measure, unless --rows and --bytes are given.')
+    parser.add_argument('--rows', type=int, default=None)
+    parser.add_argument('--bytes', type=int, default=None)
+    parser.add_argument('--node-cpus', type=float, default=NodeCapacity().cpus)
+    parser.add_argument('--node-memory-mib', type=float, default=NodeCapacity().memory_mib)
+    parser.add_argument('--target-seconds', type=float, default=DEFAULT_TARGET_SECONDS)
+    parser.add_argument('--timings', type=str, default=None,
+                        help='timing_report.json of kdd_pipe_local.py with measured profiles.')
+    parser.add_argument('--output', type=str, default=None, help='Plan JSON.')
+
+    return parser.parse_args()
+
+
+def lookup(mapping: Dict[Text, Any], component_id: Text) -> Any:
+    """The value of a component id like `KddExampleGen.validate` or of a container op name, where
+    the dot is an underscore, else the value of its component class, else None.
+    """
+    component_id = component_id.replace('_', '.', 1)
+    return mapping.get(component_id, mapping.get(component_id.split('.')[0]))
+
+
+def measure_input(data_root: Text) -> InputSize:
+    """Rows, without a header line per file, and uncompressed bytes of the csv files below a directory.
+    Checksum manifests of the file loader are no input and are skipped.
+    """
+    rows = size = 0
+    for directory, directories, filenames in os.walk(data_root):
+        directories[:] = [name for name in directories if name != MANIFEST_DIR]
+        for filename in filenames:
+            if filename.endswith(MANIFEST_SUFFIX):
+                continue
+            path = os.path.join(directory, filename)
+            lines, last = 0, b'\n'
+            with (gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')) as csv_file:
+                for chunk in iter(lambda: csv_file.read(CHUNK_SIZE), b''):
+                    lines += chunk.count(b'\n')
+                    size += len(chunk)
+                    last = chunk[-1:]
+            rows += max(lines + (last != b'\n') - 1, 0)
+    return InputSize(rows, size)
+
+
+def _memory_mib(profile: CostProfile, rows: float, num_workers: int) -> float:
+    workers_mib = num_workers * profile.worker_memory_mib if profile.parallel else 0.
+    batches_mib = num_workers * BATCH_MEMORY_MIB if profile.batched else 0.
+    return profile.base_memory_mib + workers_mib + batches_mib + profile.memory_mib_per_million_rows * rows / 1e6
+
+
+def _round_up(value: float, step: int) -> int:
+    return int(math.ceil(value / step) * step)
+
+
+def batch_size(input_size: InputSize) -> int:
+    """Rows per batch whose decoded examples take about BATCH_MEMORY_MIB."""
+    row_bytes = max(input_size.bytes / max(input_size.rows, 1), 1.) * DECODED_EXPANSION
+    return int(min(max(BATCH_MEMORY_MIB * (1 << 20) / row_bytes // 100 * 100, MIN_BATCH_SIZE), MAX_BATCH_SIZE))
+
+
+def plan_component(profile: CostProfile, input_size: InputSize, node: NodeCapacity = NodeCapacity(),
+                   target_seconds: float = DEFAULT_TARGET_SECONDS) -> ComponentPlan:
+    cpu_seconds = profile.cpu_seconds_per_million_rows * input_size.rows / 1e6
+    num_workers = 1
+    if profile.parallel:
+        num_workers = min(max(int(math.ceil(cpu_seconds / target_seconds)), 1), max(int(node.cpus), 1))
+        while num_workers > 1 and _memory_mib(profile, input_size.rows, num_workers) > node.memory_mib:
+            num_workers -= 1
+    memory_mib = _memory_mib(profile, input_size.rows, num_workers)
+    node_memory_mib = int(node.memory_mib)
+    return ComponentPlan(
+        num_workers=num_workers,
+        batch_size=batch_size(input_size) if profile.batched else None,
+        cpu_request=float(num_workers),
+        # The Beam driver runs next to the workers.
+        cpu_limit=float(max(min(num_workers + 1, node.cpus), num_workers)),
+        memory_request_mib=min(_round_up(memory_mib, MEMORY_STEP_MIB), node_memory_mib),
+        memory_limit_mib=min(_round_up(memory_mib * MEMORY_HEADROOM, MEMORY_STEP_MIB), node_memory_mib),
+        cpu_seconds=cpu_seconds,
+        fits=memory_mib <= node.memory_mib)
+
+
+def plan(input_size: InputSize, node: NodeCapacity = NodeCapacity(),
+         profiles: Optional[Dict[Text, CostProfile]] = None,
+         target_seconds: float = DEFAULT_TARGET_SECONDS) -> Dict[Text, ComponentPlan]:
+    """Plans of the components of DEFAULT_PROFILES and `profiles`, by component class or id."""
+    profiles = dict(DEFAULT_PROFILES, **(profiles or {}))
+    return {name: plan_component(profile, input_size, node, target_seconds) for name, profile in profiles.items()}
+
+
+def profiles_from_timings(timings: List[Dict[Text, Any]],
+                          defaults: Dict[Text, CostProfile] = DEFAULT_PROFILES) -> Dict[Text, CostProfile]:
+    """Measured profiles from the timings of a kdd_pipe_local.py run.
+
+    CPU time is taken per row of the pipeline input, the rows ExampleGen wrote, so components behind
+    ExampleDedup are charged for the rows they were spared; named instances like KddExampleGen.validate
+    read inputs of their own and are taken per row they processed. Memory above the default estimate
+    of a profile is taken as part of the base memory, since a single run cannot tell it from memory
+    that grows with the rows.
+    """
+    input_rows = max((timing['rows'] for timing in timings
+                      if timing['component'].endswith('ExampleGen') and timing['rows']), default=0)
+    profiles = {}
+    for timing in timings:
+        component = timing['component']
+        rows = timing['rows'] if '.' in component else input_rows or timing['rows']
+        if not rows:
+            continue
+        default = lookup(defaults, component) or DEFAULT_PROFILE
+        num_workers = timing.get('num_workers', 1) if default.parallel else 1
+        estimate_mib = _memory_mib(default, rows, num_workers)
+        profiles[component] = default._replace(
+            cpu_seconds_per_million_rows=timing['cpu_seconds'] / (rows / 1e6),
+            base_memory_mib=default.base_memory_mib + max(timing['peak_rss_mib'] - estimate_mib, 0.))
+    return profiles
+
+
+def num_workers(beam_pipeline_args: Optional[List[Text]]) -> int:
+    """Reuses --direct_num_workers of the pipeline, 0 (the default) means one worker per CPU."""
+    for arg in beam_pipeline_args or []:
+        if arg.startswith(NUM_WORKERS_ARG):
+            workers = int(arg[len(NUM_WORKERS_ARG):])
+            if workers > 0:
+                return workers
+    return os.cpu_count() or 1
+
+
+def with_num_workers(beam_pipeline_args: List[Text], num_workers: int) -> List[Text]:
+    """The Beam args with --direct_num_workers replaced, or added if they have none."""
+    num_workers_arg = f'{NUM_WORKERS_ARG}{num_workers}'
+    if not any(arg.startswith(NUM_WORKERS_ARG) for arg in beam_pipeline_args):
+        return list(beam_pipeline_args) + [num_workers_arg]
+    return [num_workers_arg if arg.startswith(NUM_WORKERS_ARG) else arg for arg in beam_pipeline_args]
+
+
+def rewrite_arguments(arguments: List[Any], num_workers: int) -> List[Any]:
+    """Container arguments of a TFX component with the workers in the JSON after --beam_pipeline_args.
+    TFX 0.22 has the same Beam args for all components, so they are set per container instead.
+    """
+    arguments = list(arguments)
+    for i, argument in enumerate(arguments[:-1]):
+        if isinstance(argument, str) and argument == BEAM_ARGS_FLAG:
+            arguments[i + 1] = json.dumps(with_num_workers(json.loads(arguments[i + 1]), num_workers))
+    return arguments
+
+
+def pipeline_operator_func(resource_plan: Dict[Text, ComponentPlan]):
+    """Op func setting the planned workers, batch size and resources of every planned component container."""
+
+    def _apply_plan(container_op):
+        component_plan = lookup(resource_plan, container_op.name)
+        if component_plan is None:
+            return
+        container_op.arguments = rewrite_arguments(container_op.arguments, component_plan.num_workers)
+        container = container_op.container
+        container.set_cpu_request(f'{component_plan.cpu_request:g}')
+        container.set_cpu_limit(f'{component_plan.cpu_limit:g}')
+        container.set_memory_request(f'{component_plan.memory_request_mib}Mi')
+        container.set_memory_limit(f'{component_plan.memory_limit_mib}Mi')
+        if component_plan.batch_size:
+            from kubernetes.client import V1EnvVar
+            container.add_env_variable(V1EnvVar(name=BATCH_SIZE_ENV, value=str(component_plan.batch_size)))
+
+    return _apply_plan
+
+
+def misfits(resource_plan: Dict[Text, ComponentPlan]) -> List[Text]:
+    """Descriptions of the components whose estimated memory exceeds a node, empty if all fit."""
+    return [f"{name}: needs more than the {component_plan.memory_limit_mib} MiB of a node even with one worker"
+            for name, component_plan in resource_plan.items() if not component_plan.fits]
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if args.rows is not None and args.bytes is not None:
+        input_size = InputSize(args.rows, args.bytes)
+    elif args.data_root:
+        input_size = measure_input(args.data_root)
+    else:
+        raise SystemExit('Either --data-root or --rows and --bytes are required')
+    profiles = None
+    if args.timings:
+        with open(args.timings) as timings_file:
+            profiles = profiles_from_timings(json.load(timings_file))
+    resource_plan = plan(input_size, NodeCapacity(args.node_cpus, args.node_memory_mib), profiles,
+                         args.target_seconds)
+
+    print(f"Plan for {input_size.rows} rows, {input_size.bytes / (1 << 20):.1f} MiB, on nodes of "
+          f"{args.node_cpus:g} CPUs and {args.node_memory_mib:.0f} MiB")
+    print(f"{'component':<28}{'workers':>8}{'batch':>7}{'cpu req':>9}{'cpu lim':>9}{'mem req Mi':>12}"
+          f"{'mem lim Mi':>12}{'cpu s':>9}")
+    for name, component_plan in resource_plan.items():
+        print(f"{name:<28}{component_plan.num_workers:>8}{component_plan.batch_size or '-':>7}"
+              f"{component_plan.cpu_request:>9g}{component_plan.cpu_limit:>9g}"
+              f"{component_plan.memory_request_mib:>12}{component_plan.memory_limit_mib:>12}"
+              f"{component_plan.cpu_seconds:>9.0f}")
+    for misfit in misfits(resource_plan):
+        print(f"Warning: {misfit}")
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'input_size': input_size._asdict(),
+                       'plan': {name: component_plan._asdict() for name, component_plan in resource_plan.items()}},
+                      output_file, indent=2)
@@ -0,0 +1,88 @@
+import json
+import os
+
+from custom_components.resource_planner.src.resource_planner import (
+    BEAM_ARGS_FLAG, InputSize, NodeCapacity, lookup, measure_input, num_workers, pipeline_operator_func, plan,
+    profiles_from_timings)
+
+KDD99 = InputSize(rows=4898431, bytes=742579200)
+
+
+class FakeContainer:
+    def __init__(self):
+        self.resources = {}
+
+    def set_cpu_request(self, cpu):
+        self.resources['cpu_request'] = cpu
+
+    def set_cpu_limit(self, cpu):
+        self.resources['cpu_limit'] = cpu
+
+    def set_memory_request(self, memory):
+        self.resources['memory_request'] = memory
+
+    def set_memory_limit(self, memory):
+        self.resources['memory_limit'] = memory
+
+
+class FakeContainerOp:
+    def __init__(self, name, beam_pipeline_args):
+        self.name = name
+        self.arguments = ['--pipeline_name', 'kdd-pipe', BEAM_ARGS_FLAG, json.dumps(beam_pipeline_args)]
+        self.container = FakeContainer()
+
+
+def test_plan_scales_with_input_and_node(tmp_path):
+    # given
+    data_root = tmp_path / "train"
+    data_root.mkdir()
+    (data_root / "kddcup.csv").write_text("duration,protocol_type\n0,tcp\n0,udp\n1,icmp")
+    (data_root / "kddcup.csv.sha256.json").write_text('{"sha256": "0"}')
+    small = measure_input(str(data_root))
+    # when
+    small_plan = plan(small)
+    full_plan = plan(KDD99, NodeCapacity(cpus=8, memory_mib=16384))
+    tight_plan = plan(KDD99, NodeCapacity(cpus=8, memory_mib=2048))
+    # then
+    assert small == InputSize(rows=3, bytes=len("duration,protocol_type\n0,tcp\n0,udp\n1,icmp"))
+    assert small_plan['CodecTransform'].num_workers == 1
+    assert full_plan['CodecTransform'].num_workers > 1
+    assert full_plan['CodecTransform'].memory_request_mib > small_plan['CodecTransform'].memory_request_mib
+    assert full_plan['CodecTransform'].batch_size is not None and full_plan['SchemaGen'].batch_size is None
+    assert full_plan['SchemaGen'].num_workers == 1
+    assert tight_plan['CodecTransform'].num_workers < full_plan['CodecTransform'].num_workers
+    assert not tight_plan['Trainer'].fits and tight_plan['Trainer'].memory_limit_mib == 2048
+
+
+def test_measured_profiles_and_operator_func():
+    # given
+    timings = [{'component': 'KddExampleGen', 'rows': 1000000, 'cpu_seconds': 20., 'peak_rss_mib': 900.,
+                'num_workers': 2},
+               {'component': 'CodecTransform', 'rows': 250000, 'cpu_seconds': 1200., 'peak_rss_mib': 6000.,
+                'num_workers': 2}]
+    profiles = profiles_from_timings(timings)
+    resource_plan = plan(KDD99, NodeCapacity(cpus=8, memory_mib=32768), profiles)
+    container_op = FakeContainerOp('KddExampleGen_validate', ['--direct_running_mode=multi_processing',
+                                                              '--direct_num_workers=0'])
+    # when
+    pipeline_operator_func(resource_plan)(container_op)
+    # then
+    assert profiles['CodecTransform'].cpu_seconds_per_million_rows == 1200.
+    assert profiles['CodecTransform'].base_memory_mib > 1000.
+    assert resource_plan['CodecTransform'].num_workers == 8
+    assert lookup(resource_plan, 'KddExampleGen_validate') == resource_plan['KddExampleGen']
+    expected = resource_plan['KddExampleGen']
+    assert json.loads(container_op.arguments[3]) == ['--direct_running_mode=multi_processing',
+                                                     f'--direct_num_workers={expected.num_workers}']
+    assert container_op.container.resources == {
+        'cpu_request': f'{expected.cpu_request:g}', 'cpu_limit': f'{expected.cpu_limit:g}',
+        'memory_request': f'{expected.memory_request_mib}Mi', 'memory_limit': f'{expected.memory_limit_mib}Mi'}
+
+
+def test_num_workers_of_the_beam_args():
+    # when
+    planned = num_workers(['--direct_running_mode=multi_processing', '--direct_num_workers=3'])
+    auto_detected = num_workers(['--direct_num_workers=0'])
+    # then
+    assert planned == 3
+    assert auto_detected == num_workers(None) == (os.cpu_count() or 1)
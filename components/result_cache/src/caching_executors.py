@@ -0,0 +1,135 @@
+"""
+Stock executors of kdd_pipe wrapped with the content-addressed result cache.
+
+`enable_result_cache(component)` swaps the executor of a component for its caching variant, which
+runs in the same container image, since only the executor class path changes.
+"""
+import os
+import time
+from typing import Any, Dict, List, Text
+
+import absl
+from tfx import types
+from tfx.components.base import base_component, executor_spec
+from tfx.components.example_gen.csv_example_gen import executor as csv_example_gen_executor
+from tfx.components.example_validator import executor as example_validator_executor
+from tfx.components.schema_gen import executor as schema_gen_executor
+from tfx.components.statistics_gen import executor as statistics_gen_executor
+from tfx.components.transform import executor as transform_executor
+
+from custom_components.example_codec.src import example_codec
+from custom_components.example_codec.src import transform_executor as codec_transform_executor
+from custom_components.example_gen.src import executor as kdd_example_gen_executor
+from custom_components.result_cache.src import result_cache
+
+
+class CachingExecutorMixin:
+    """Skips `Do` of the executor it is mixed into if the result for the same inputs is cached.
+
+    Has to come before the executor class in the bases, so its `Do` runs first.
+    """
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        start = time.time()
+        outputs = {name: [artifact.uri for artifact in artifacts] for name, artifacts in output_dict.items()}
+        first_uri = next(uri for uris in outputs.values() for uri in uris)
+        component = result_cache.component_of(first_uri)
+        cache = result_cache.ResultCache.from_environment(result_cache.default_root(first_uri))
+        run_id = os.environ.get(result_cache.RUN_ID_ENV, 'local')
+
+        memo = cache.load_fingerprints()
+        input_fingerprints = {name: [result_cache.tree_fingerprint(artifact.uri, memo) for artifact in artifacts]
+                              for name, artifacts in sorted(input_dict.items())}
+        cache.save_fingerprints(memo)
+        executor_name = '{}.{}'.format(type(self).__module__, type(self).__name__)
+        key = result_cache.cache_key(executor_name, input_fingerprints, self._cache_key_properties(exec_properties))
+
+        entry = cache.lookup(key)
+        if entry is not None:
+            cache.restore(key, outputs)
+            absl.logging.info('Result cache hit {} for {}, restored in {:.1f}s instead of {:.1f}s'.format(
+                key, component, time.time() - start, entry['seconds']))
+            cache.record(run_id, component, key, True, entry['seconds'])
+            return
+
+        super(CachingExecutorMixin, self).Do(input_dict, output_dict, exec_properties)
+        seconds = time.time() - start
+        cache.store(key, outputs, component, seconds)
+        cache.record(run_id, component, key, False, seconds)
+        evicted = cache.evict()
+        absl.logging.info('Result cache miss {} for {}, stored after {:.1f}s, evicted {} entries'.format(
+            key, component, seconds, len(evicted)))
+
+    def _cache_key_properties(self, exec_properties: Dict[Text, Any]) -> Dict[Text, Any]:
+        """Exec properties plus the settings from elsewhere that change the result."""
+        return exec_properties
+
+
+class CodecDependentMixin:
+    """For caching executors of examples writers: the codec of EXAMPLE_CODEC changes their files."""
+
+    def _cache_key_properties(self, exec_properties: Dict[Text, Any]) -> Dict[Text, Any]:
+        return dict(exec_properties, example_codec=example_codec.from_environment().name)
+
+
+class CachingCsvExampleGenExecutor(CachingExecutorMixin, csv_example_gen_executor.Executor):
+    pass
+
+
+class CachingKddExampleGenExecutor(CodecDependentMixin, CachingExecutorMixin, kdd_example_gen_executor.Executor):
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        # Artifact properties are not part of the cached files.
+        kdd_example_gen_executor.set_span(input_dict, output_dict)
+        kdd_example_gen_executor.set_codec(output_dict)
+        super(CachingKddExampleGenExecutor, self).Do(input_dict, output_dict, exec_properties)
+
+
+class CachingStatisticsGenExecutor(CachingExecutorMixin, statistics_gen_executor.Executor):
+    pass
+
+
+class CachingSchemaGenExecutor(CachingExecutorMixin, schema_gen_executor.Executor):
+    pass
+
+
+class CachingExampleValidatorExecutor(CachingExecutorMixin, example_validator_executor.Executor):
+    pass
+
+
+class CachingTransformExecutor(CachingExecutorMixin, transform_executor.Executor):
+    pass
+
+
+class CachingCodecTransformExecutor(CodecDependentMixin, CachingExecutorMixin, codec_transform_executor.Executor):
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        # Artifact properties are not part of the cached files.
+        for artifact in output_dict.get('transformed_examples', []):
+            example_codec.record(artifact, example_codec.from_environment())
+        super(CachingCodecTransformExecutor, self).Do(input_dict, output_dict, exec_properties)
+
+
+CACHING_EXECUTORS = {
+    csv_example_gen_executor.Executor: CachingCsvExampleGenExecutor,
+    kdd_example_gen_executor.Executor: CachingKddExampleGenExecutor,
+    statistics_gen_executor.Executor: CachingStatisticsGenExecutor,
+    schema_gen_executor.Executor: CachingSchemaGenExecutor,
+    example_validator_executor.Executor: CachingExampleValidatorExecutor,
+    transform_executor.Executor: CachingTransformExecutor,
+    codec_transform_executor.Executor: CachingCodecTransformExecutor,
+}
+
+
+def enable_result_cache(component: base_component.BaseComponent) -> base_component.BaseComponent:
+    """Replaces the executor of `component` by its caching variant, if there is one."""
+    executor_class = getattr(component.executor_spec, 'executor_class', None)
+    if executor_class in CACHING_EXECUTORS:
+        component.executor_spec = executor_spec.ExecutorClassSpec(CACHING_EXECUTORS[executor_class])
+    return component
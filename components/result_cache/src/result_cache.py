@@ -0,0 +1,315 @@
+"""
+Content-addressed cache of component results on the pipeline volume.
+
+A result is keyed by the content of the input artifacts, the content of the module file and the
+remaining exec properties, so it survives metadata resets and image rebuilds that only touch file
+timestamps. Layout:
+
+    <cache_root>/entries/<key>/entry.json                   component, size and run time of the result
+    <cache_root>/entries/<key>/<output key>/<index>/...     files of the output artifacts
+    <cache_root>/fingerprints.json                          digests of existing files by (path, size, mtime, inode)
+    <cache_root>/ledger.jsonl                               one line per lookup with run id and hit/miss
+
+Entries share their files with the output artifacts through hard links where the file system
+allows it, so caching a result costs almost no extra space on the volume. The mtime of entry.json
+is the last use of the entry, eviction removes entries unused for longer than `max_age_seconds`
+and then the least recently used ones until the entries fit into `max_bytes`. Only files without
+links outside the cache count towards `max_bytes`, as only their removal frees space.
+
+Usage: python -m custom_components.result_cache.src.result_cache --cache-root <root> [--run-id <id>]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Text
+
+CACHE_DIR_NAME = 'result_cache'
+ENTRIES_DIR = 'entries'
+ENTRY_FILE = 'entry.json'
+FINGERPRINTS_FILE = 'fingerprints.json'
+LEDGER_FILE = 'ledger.jsonl'
+CHUNK_SIZE = 1 << 20
+DEFAULT_MAX_BYTES = 2 << 30  # the tfx-pv volume has 5Gi, shared with the pipeline outputs
+DEFAULT_MAX_AGE_SECONDS = 14 * 24 * 3600
+
+ROOT_ENV = 'RESULT_CACHE_ROOT'
+MAX_BYTES_ENV = 'RESULT_CACHE_MAX_BYTES'
+MAX_AGE_ENV = 'RESULT_CACHE_MAX_AGE_SECONDS'
+RUN_ID_ENV = 'WORKFLOW_ID'  # set by KubeflowDagRunner on every component
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Hit/miss report of the component result cache')
+    parser.add_argument('--cache-root', type=str, required=True, help='Root directory of the result cache.')
+    parser.add_argument('--run-id', type=str, default=None, help='Only report this run (Kubeflow WORKFLOW_ID).')
+    parser.add_argument('--evict', action='store_true', help='Apply the eviction limits before reporting.')
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    parser.add_argument('--max-age-seconds', type=float, default=DEFAULT_MAX_AGE_SECONDS)
+
+    return parser.parse_args()
+
+
+def _file_digest(path: Text, chunk_size: int = CHUNK_SIZE) -> Text:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_signature(path: Text) -> Text:
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}"
+
+
+def _is_current(signature: Text) -> bool:
+    """Whether the file of a memo signature still exists unchanged."""
+    path = signature.rsplit(':', 3)[0]
+    try:
+        return _stat_signature(path) == signature
+    except OSError:
+        return False
+
+
+def tree_fingerprint(path: Text, memo: Optional[Dict[Text, Text]] = None) -> Text:
+    """sha256 over the relative paths and contents of all files below `path` (or of the file itself).
+
+    Args:
+      path: File or directory.
+      memo: Digests of files by their stat signature, filled in as files are hashed. Unchanged
+        files are not read again.
+    Returns:
+      Hex digest that only depends on the file names and contents.
+    """
+    if os.path.isfile(path):
+        files = [(os.path.basename(path), path)]
+    else:
+        files = []
+        for directory, _, filenames in os.walk(path):
+            for filename in filenames:
+                file_path = os.path.join(directory, filename)
+                files.append((os.path.relpath(file_path, path), file_path))
+    digest = hashlib.sha256()
+    for relative_path, file_path in sorted(files):
+        signature = _stat_signature(file_path)
+        file_digest = memo.get(signature) if memo is not None else None
+        if file_digest is None:
+            file_digest = _file_digest(file_path)
+            if memo is not None:
+                memo[signature] = file_digest
+        digest.update(relative_path.replace(os.sep, '/').encode() + b'\0' + file_digest.encode() + b'\n')
+    return digest.hexdigest()
+
+
+def cache_key(executor_name: Text, input_fingerprints: Dict[Text, List[Text]],
+              exec_properties: Dict[Text, Any]) -> Text:
+    """Key of a component result.
+
+    Args:
+      executor_name: Identifies the code producing the result.
+      input_fingerprints: `tree_fingerprint` of every input artifact, by input key.
+      exec_properties: Exec properties of the execution. A `module_file` is replaced by the digest
+        of its content, so editing tfx_utils.py invalidates the results that depend on it.
+    Returns:
+      Hex digest of all of the above.
+    """
+    properties = {}
+    for name, value in exec_properties.items():
+        if name == 'module_file' and value and os.path.isfile(value):
+            value = 'sha256:' + _file_digest(value)
+        properties[name] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+    return hashlib.sha256(json.dumps({'executor': executor_name,
+                                      'inputs': input_fingerprints,
+                                      'exec_properties': properties}, sort_keys=True).encode()).hexdigest()
+
+
+def _link_tree(source: Text, destination: Text) -> int:
+    """Hard links (or copies, across file systems) all files of `source` into `destination`."""
+    size = 0
+    for directory, _, filenames in os.walk(source):
+        target_directory = os.path.join(destination, os.path.relpath(directory, source))
+        os.makedirs(target_directory, exist_ok=True)
+        for filename in filenames:
+            source_path, target_path = os.path.join(directory, filename), os.path.join(target_directory, filename)
+            if os.path.lexists(target_path):
+                os.remove(target_path)
+            try:
+                os.link(source_path, target_path)
+            except OSError:
+                shutil.copy2(source_path, target_path)
+            size += os.path.getsize(target_path)
+    return size
+
+
+def _unshared_size(path: Text) -> int:
+    """Bytes of the result files below `path` without hard links elsewhere, i.e. those removing `path` frees."""
+    inodes = {}
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            if filename == ENTRY_FILE:
+                continue
+            stat = os.lstat(os.path.join(directory, filename))
+            size, nlink, links = inodes.get((stat.st_dev, stat.st_ino), (stat.st_size, stat.st_nlink, 0))
+            inodes[(stat.st_dev, stat.st_ino)] = (size, nlink, links + 1)
+    return sum(size for size, nlink, links in inodes.values() if links >= nlink)
+
+
+def component_of(output_uri: Text) -> Text:
+    """Component id of an output artifact uri `<pipeline_root>/<component>/<output key>/<execution id>`."""
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.normpath(output_uri))))
+
+
+def default_root(output_uri: Text) -> Text:
+    """Cache root next to the component folders of the pipeline root the output belongs to."""
+    pipeline_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.normpath(output_uri))))
+    return os.path.join(pipeline_root, CACHE_DIR_NAME)
+
+
+class ResultCache:
+    """Stores, restores and evicts component results below `root`."""
+
+    def __init__(self, root: Text, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._entries_dir = os.path.join(root, ENTRIES_DIR)
+        os.makedirs(self._entries_dir, exist_ok=True)
+
+    @classmethod
+    def from_environment(cls, default_cache_root: Text) -> 'ResultCache':
+        """Cache configured by the RESULT_CACHE_* environment variables of the container."""
+        return cls(os.environ.get(ROOT_ENV, default_cache_root),
+                   int(os.environ.get(MAX_BYTES_ENV, DEFAULT_MAX_BYTES)),
+                   float(os.environ.get(MAX_AGE_ENV, DEFAULT_MAX_AGE_SECONDS)))
+
+    def _entry_dir(self, key: Text) -> Text:
+        return os.path.join(self._entries_dir, key)
+
+    def load_fingerprints(self) -> Dict[Text, Text]:
+        try:
+            with open(os.path.join(self.root, FINGERPRINTS_FILE)) as fingerprints_file:
+                return json.load(fingerprints_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_fingerprints(self, memo: Dict[Text, Text]) -> None:
+        """Stores the digests of the files that still exist unchanged; the others can never match again."""
+        memo = {signature: digest for signature, digest in memo.items() if _is_current(signature)}
+        # Concurrent writers may drop each other's additions, which only costs a re-hash later.
+        fd, path = tempfile.mkstemp(dir=self.root, prefix='.fingerprints-')
+        with os.fdopen(fd, 'w') as fingerprints_file:
+            json.dump(memo, fingerprints_file)
+        os.replace(path, os.path.join(self.root, FINGERPRINTS_FILE))
+
+    def lookup(self, key: Text) -> Optional[Dict[Text, Any]]:
+        """Returns the entry.json of a complete entry and marks it as used, or None."""
+        entry_file = os.path.join(self._entry_dir(key), ENTRY_FILE)
+        try:
+            with open(entry_file) as file:
+                entry = json.load(file)
+            os.utime(entry_file)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def restore(self, key: Text, outputs: Dict[Text, List[Text]]) -> None:
+        """Materializes the cached files of entry `key` at the output artifact uris."""
+        for name, uris in outputs.items():
+            for index, uri in enumerate(uris):
+                _link_tree(os.path.join(self._entry_dir(key), name, str(index)), uri)
+
+    def store(self, key: Text, outputs: Dict[Text, List[Text]], component: Text, seconds: float) -> None:
+        """Adds the files at the output artifact uris as entry `key`."""
+        build_dir = tempfile.mkdtemp(dir=self._entries_dir, prefix='.build-')
+        try:
+            size = sum(_link_tree(uri, os.path.join(build_dir, name, str(index)))
+                       for name, uris in outputs.items() for index, uri in enumerate(uris))
+            with open(os.path.join(build_dir, ENTRY_FILE), 'w') as entry_file:
+                json.dump({'component': component, 'size': size, 'seconds': seconds,
+                           'created': time.time()}, entry_file)
+            os.rename(build_dir, self._entry_dir(key))
+        except OSError:
+            # Another run stored the same result first, or the volume is full; either way the
+            # result of this run is not affected.
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    def entries(self) -> List[Dict[Text, Any]]:
+        """All complete entries with their key, size and last use, least recently used first."""
+        entries = []
+        for key in os.listdir(self._entries_dir):
+            entry_file = os.path.join(self._entry_dir(key), ENTRY_FILE)
+            try:
+                with open(entry_file) as file:
+                    entry = json.load(file)
+                entry.update(key=key, last_used=os.path.getmtime(entry_file))
+            except (OSError, ValueError):
+                continue
+            entries.append(entry)
+        return sorted(entries, key=lambda entry: entry['last_used'])
+
+    def evict(self, now: Optional[float] = None) -> List[Text]:
+        """Removes expired entries, then least recently used ones until the rest fit into max_bytes.
+
+        Files that are still linked from pipeline outputs take no space of their own, so only the
+        bytes of files without links outside the cache count, and an evicted entry frees those of
+        its files that have no other link left.
+        """
+        now = time.time() if now is None else now
+        entries = self.entries()
+        total = _unshared_size(self._entries_dir)
+        evicted = []
+        for entry in entries:
+            if now - entry['last_used'] > self.max_age_seconds or total > self.max_bytes:
+                entry_dir = self._entry_dir(entry['key'])
+                freed = _unshared_size(entry_dir)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= freed
+                evicted.append(entry['key'])
+        for name in os.listdir(self._entries_dir):
+            path = os.path.join(self._entries_dir, name)
+            # Leftovers of interrupted stores.
+            if name.startswith('.build-') and now - os.path.getmtime(path) > 24 * 3600:
+                shutil.rmtree(path, ignore_errors=True)
+        return evicted
+
+    def record(self, run_id: Text, component: Text, key: Text, hit: bool, seconds: float) -> None:
+        """Appends a lookup to the ledger; single short appends do not interleave between pods."""
+        line = json.dumps({'run_id': run_id, 'component': component, 'key': key, 'hit': hit,
+                           'seconds': seconds, 'time': time.time()})
+        with open(os.path.join(self.root, LEDGER_FILE), 'a') as ledger_file:
+            ledger_file.write(line + '\n')
+
+
+def report(cache_root: Text, run_id: Optional[Text] = None) -> Dict[Text, Dict[Text, Any]]:
+    """Hits, misses and the component run time saved by hits, per run in ledger order."""
+    runs = OrderedDict()  # type: Dict[Text, Dict[Text, Any]]
+    try:
+        with open(os.path.join(cache_root, LEDGER_FILE)) as ledger_file:
+            lines = [json.loads(line) for line in ledger_file if line.strip()]
+    except OSError:
+        return runs
+    for line in lines:
+        if run_id is not None and line['run_id'] != run_id:
+            continue
+        run = runs.setdefault(line['run_id'], {'hits': 0, 'misses': 0, 'saved_seconds': 0., 'components': {}})
+        run['hits' if line['hit'] else 'misses'] += 1
+        if line['hit']:
+            run['saved_seconds'] += line['seconds']
+        run['components'][line['component']] = 'hit' if line['hit'] else 'miss'
+    return runs
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if args.evict:
+        evicted = ResultCache(args.cache_root, args.max_bytes, args.max_age_seconds).evict()
+        print(f"Evicted {len(evicted)} entries")
+    for run, counts in report(args.cache_root, args.run_id).items():
+        print(f"{run}: {counts['hits']} hits, {counts['misses']} misses, "
+              f"{counts['saved_seconds']:.1f}s saved - {counts['components']}")
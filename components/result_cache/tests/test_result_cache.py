@@ -0,0 +1,96 @@
+import os
+import shutil
+
+from custom_components.result_cache.src.result_cache import ResultCache, cache_key, report, tree_fingerprint
+
+
+def write_output(path, content="examples") -> str:
+    os.makedirs(os.path.join(path, "train"), exist_ok=True)
+    with open(os.path.join(path, "train", "data.csv"), "w") as file:
+        file.write(content)
+    return str(path)
+
+
+def test_key_depends_on_content_and_module_file(tmp_path):
+    # given
+    data = write_output(tmp_path / "data")
+    module_file = tmp_path / "tfx_utils.py"
+    module_file.write_text("VOCAB = 1\n")
+    inputs = {"examples": [tree_fingerprint(data)]}
+    key = cache_key("Executor", inputs, {"module_file": str(module_file)})
+    # when
+    os.utime(os.path.join(data, "train", "data.csv"), (0, 0))
+    touched_key = cache_key("Executor", {"examples": [tree_fingerprint(data)]}, {"module_file": str(module_file)})
+    module_file.write_text("VOCAB = 2\n")
+    edited_key = cache_key("Executor", inputs, {"module_file": str(module_file)})
+    # then
+    assert touched_key == key
+    assert edited_key != key
+
+
+def test_store_and_restore(tmp_path):
+    # given
+    cache = ResultCache(str(tmp_path / "cache"))
+    output = write_output(tmp_path / "run_1" / "Transform" / "transform_graph" / "1")
+    cache.store("key", {"transform_graph": [output]}, "Transform", 12.)
+    # when
+    entry = cache.lookup("key")
+    restored = str(tmp_path / "run_2" / "Transform" / "transform_graph" / "2")
+    cache.restore("key", {"transform_graph": [restored]})
+    cache.record("run-2", "Transform", "key", True, entry["seconds"])
+    # then
+    assert cache.lookup("missing") is None
+    with open(os.path.join(restored, "train", "data.csv")) as file:
+        assert file.read() == "examples"
+    assert report(cache.root)["run-2"]["hits"] == 1
+
+
+def test_evicts_expired_then_least_recently_used(tmp_path):
+    # given
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=20, max_age_seconds=100)
+    for key in ("old", "used", "new"):
+        cache.store(key, {"out": [write_output(tmp_path / key, "0123456789")]}, "StatisticsGen", 1.)
+        # The pipeline outputs are gone, so the entries hold the only links.
+        shutil.rmtree(str(tmp_path / key))
+    entry_dir = os.path.join(cache.root, "entries")
+    os.utime(os.path.join(entry_dir, "old", "entry.json"), (0, 0))
+    os.utime(os.path.join(entry_dir, "new", "entry.json"), (1000, 1000))
+    os.utime(os.path.join(entry_dir, "used", "entry.json"), (990, 990))
+    # when
+    evicted = cache.evict(now=1050)
+    # then
+    assert evicted == ["old"]
+    assert cache.lookup("used") is not None
+    # when
+    cache.max_bytes = 10
+    evicted = cache.evict(now=1050)
+    # then
+    assert evicted == ["new"]
+
+
+def test_files_linked_from_outputs_take_no_cache_space(tmp_path):
+    # given
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=10, max_age_seconds=100)
+    for key in ("linked", "only_cached"):
+        cache.store(key, {"out": [write_output(tmp_path / key, "0123456789")]}, "StatisticsGen", 1.)
+    shutil.rmtree(str(tmp_path / "only_cached"))
+    entry_dir = os.path.join(cache.root, "entries")
+    os.utime(os.path.join(entry_dir, "linked", "entry.json"), (1000, 1000))
+    os.utime(os.path.join(entry_dir, "only_cached", "entry.json"), (1010, 1010))
+    # when
+    evicted = cache.evict(now=1050)
+    # then
+    assert evicted == []
+
+
+def test_forgets_digests_of_removed_files(tmp_path):
+    # given
+    cache = ResultCache(str(tmp_path / "cache"))
+    memo = {}
+    tree_fingerprint(write_output(tmp_path / "kept"), memo)
+    tree_fingerprint(write_output(tmp_path / "removed"), memo)
+    shutil.rmtree(str(tmp_path / "removed"))
+    # when
+    cache.save_fingerprints(memo)
+    # then
+    assert list(cache.load_fingerprints()) == [signature for signature in memo if "kept" in signature]
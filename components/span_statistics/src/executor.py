@@ -0,0 +1,168 @@
+"""
+Statistics of the latest span, merged with the stored statistics of the spans before it.
+
+Only the examples of the new span are read. Their summaries (see sketches.py) are stored per span
+and split below the persistent state root,
+
+    <state_root>/span-<span>/<split>.json
+
+and the merged summaries of all stored spans up to the new one are written to the
+`merged_statistics` artifact, for the Transform of SpanTransform, and as TFDV statistics to the
+`statistics` artifact, for SchemaGen and ExampleValidator. Running a span again replaces its
+stored summaries, so a corrected span does not count twice.
+"""
+import glob
+import os
+import re
+from typing import Any, Dict, Iterator, List, Text, Tuple
+
+import absl
+import numpy as np
+import tensorflow as tf
+from tensorflow_metadata.proto.v0 import statistics_pb2
+from tfx import types
+from tfx.components.base import base_executor
+from tfx.types import artifact_utils
+
+from custom_components.example_codec.src import example_codec
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+from custom_components.span_statistics.src.sketches import NUMERIC, SplitStatistics, merge_all, statistics_path
+
+BATCH_SIZE = 4096
+NUM_HISTOGRAM_BUCKETS = 10
+NUM_TOP_VALUES = 20
+STATS_FILE_NAME = 'stats_tfrecord'
+_SPAN_DIR = re.compile(r'span-(\d+)$')
+
+
+def span_dir(state_root: Text, span: int) -> Text:
+    return os.path.join(state_root, f"span-{span:05d}")
+
+
+def stored_spans(state_root: Text) -> List[int]:
+    spans = []
+    for path in glob.glob(os.path.join(state_root, 'span-*')):
+        match = _SPAN_DIR.search(path)
+        if match:
+            spans.append(int(match.group(1)))
+    return sorted(spans)
+
+
+def _feature_spec(record: bytes) -> Dict[Text, tf.io.VarLenFeature]:
+    """Parses every feature of the first example as variable length, so missing values are counted."""
+    dtypes = {'float_list': tf.float32, 'int64_list': tf.int64, 'bytes_list': tf.string}
+    example = tf.train.Example.FromString(record)
+    return {name: tf.io.VarLenFeature(dtypes[feature.WhichOneof('kind')])
+            for name, feature in example.features.feature.items() if feature.WhichOneof('kind')}
+
+
+def read_columns(split_uri: Text, batch_size: int = BATCH_SIZE) -> Iterator[Tuple[int, Dict[Text, np.ndarray]]]:
+    """Yields batches of (number of examples, present values per feature) of a split's TFRecords."""
+    paths = sorted(tf.io.gfile.glob(os.path.join(split_uri, '*')))
+    if not paths:
+        return
+    dataset = tf.data.TFRecordDataset(paths, compression_type=example_codec.compression_type_of_files(paths))
+    first = next(iter(dataset.take(1)), None)
+    if first is None:
+        return
+    feature_spec = _feature_spec(first.numpy())
+    dataset = dataset.batch(batch_size).map(
+        lambda records: (tf.shape(records)[0], tf.io.parse_example(records, feature_spec)),
+        num_parallel_calls=tf.data.experimental.AUTOTUNE).prefetch(tf.data.experimental.AUTOTUNE)
+    for num_examples, features in dataset:
+        yield int(num_examples), {name: values.values.numpy() for name, values in features.items()}
+
+
+def compute_split_statistics(split_uri: Text, span: int) -> SplitStatistics:
+    statistics = SplitStatistics(spans=[span])
+    for num_examples, columns in read_columns(split_uri):
+        statistics.update(num_examples, columns)
+    return statistics
+
+
+def to_dataset_statistics(statistics: SplitStatistics, name: Text) -> statistics_pb2.DatasetFeatureStatisticsList:
+    """TFDV statistics of the merged summaries, as StatisticsGen would write them for SchemaGen."""
+    statistics_list = statistics_pb2.DatasetFeatureStatisticsList()
+    dataset = statistics_list.datasets.add(name=name, num_examples=statistics.num_examples)
+    for column, kind in sorted(statistics.kinds.items()):
+        feature = dataset.features.add()
+        feature.path.step.append(column)
+        present = statistics.num_examples - statistics.missing[column]
+        if kind == NUMERIC:
+            feature.type = statistics_pb2.FeatureNameStatistics.FLOAT
+            common = feature.num_stats.common_stats
+            moments, sketch = statistics.moments[column], statistics.quantiles[column]
+            feature.num_stats.mean = moments.mean
+            feature.num_stats.std_dev = moments.variance ** 0.5
+            feature.num_stats.num_zeros = moments.zeros
+            if moments.count:
+                feature.num_stats.min, feature.num_stats.max = moments.min, moments.max
+                feature.num_stats.median = sketch.quantiles([0.5])[0]
+                boundaries = sketch.quantiles(np.linspace(0, 1, NUM_HISTOGRAM_BUCKETS + 1))
+                histogram = feature.num_stats.histograms.add(type=statistics_pb2.Histogram.QUANTILES)
+                for low, high in zip(boundaries, boundaries[1:]):
+                    histogram.buckets.add(low_value=low, high_value=high,
+                                          sample_count=moments.count / NUM_HISTOGRAM_BUCKETS)
+        else:
+            feature.type = statistics_pb2.FeatureNameStatistics.STRING
+            common = feature.string_stats.common_stats
+            top_values = statistics.top_values[column]
+            feature.string_stats.unique = len(top_values.counts)
+            ranked = top_values.top()
+            for value, count in ranked[:NUM_TOP_VALUES]:
+                feature.string_stats.top_values.add(value=value, frequency=count)
+            for rank, (value, count) in enumerate(ranked):
+                feature.string_stats.rank_histogram.buckets.add(low_rank=rank, high_rank=rank, label=value,
+                                                                sample_count=count)
+            if ranked:
+                feature.string_stats.avg_length = (sum(len(value) * count for value, count in ranked)
+                                                   / sum(count for _, count in ranked))
+        common.num_non_missing = present
+        common.num_missing = statistics.missing[column]
+        # KDD99 features hold one value per example.
+        common.min_num_values = common.max_num_values = 1
+        common.avg_num_values = 1.
+        common.tot_num_values = present
+    return statistics_list
+
+
+def _save_atomically(statistics: SplitStatistics, path: Text) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    statistics.save(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+class Executor(InstrumentedExecutorMixin, base_executor.BaseExecutor):
+    """Summarizes the new span and merges it with the stored summaries of the previous spans."""
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        self._log_startup(input_dict, output_dict, exec_properties)
+        examples = artifact_utils.get_single_instance(input_dict['examples'])
+        span = examples.span or 0
+        state_root = exec_properties['state_root']
+        split_names = artifact_utils.decode_split_names(examples.split_names)
+        merged_uri = artifact_utils.get_single_uri(output_dict['merged_statistics'])
+        statistics_artifact = artifact_utils.get_single_instance(output_dict['statistics'])
+        statistics_artifact.split_names = artifact_utils.encode_split_names(split_names)
+
+        for split in split_names:
+            with self.span('compute'):
+                span_statistics = compute_split_statistics(
+                    artifact_utils.get_split_uri(input_dict['examples'], split), span)
+                _save_atomically(span_statistics, statistics_path(span_dir(state_root, span), split))
+            self.add_rows(span_statistics.num_examples)
+            with self.span('merge'):
+                # Later spans may exist if an earlier one is run again; they are not part of its history.
+                history = [SplitStatistics.load(statistics_path(span_dir(state_root, stored), split))
+                           for stored in stored_spans(state_root) if stored <= span
+                           and os.path.exists(statistics_path(span_dir(state_root, stored), split))]
+                merged = merge_all(history)
+                _save_atomically(merged, statistics_path(merged_uri, split))
+                output_uri = artifact_utils.get_split_uri(output_dict['statistics'], split)
+                tf.io.gfile.makedirs(output_uri)
+                with tf.io.TFRecordWriter(os.path.join(output_uri, STATS_FILE_NAME)) as writer:
+                    writer.write(to_dataset_statistics(merged, split).SerializeToString())
+            absl.logging.info('Split {}: {} examples in span {}, {} examples in spans {}'.format(
+                split, span_statistics.num_examples, span, merged.num_examples, merged.spans))
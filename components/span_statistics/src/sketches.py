@@ -0,0 +1,296 @@
+"""
+Mergeable summaries of the feature columns of one span, and of any number of spans merged.
+
+Every summary can be updated with a batch of values, merged with another one of the same kind and
+stored as JSON, so the statistics of the history follow from the stored summaries of its spans
+without reading their examples again:
+
+    Moments     count, mean and sum of squared deviations (merged like Chan et al.), min, max, zeros
+    KllSketch   quantiles with rank error of about 1.7 / k, independent of the number of values
+    MisraGries  counts of the most frequent values; exact while a column has at most `capacity`
+                distinct values, otherwise underestimated by at most `error`
+
+A `SplitStatistics` holds the summaries of all columns of a split: Moments and KllSketch for
+numeric columns, MisraGries for categorical ones.
+"""
+import hashlib
+import json
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Text, Tuple
+
+import numpy as np
+
+KLL_K = 200
+MISRA_GRIES_CAPACITY = 1000
+NUMERIC = 'numeric'
+CATEGORICAL = 'categorical'
+# Set by the SpanTransform executor to the merged_statistics artifact; preprocessing_fn then uses the
+# merged summaries instead of tft analyzers.
+MERGED_STATISTICS_ENV = 'MERGED_STATISTICS_URI'
+# Set by the SpanTransform executor to a directory it removes after the run; preprocessing_fn writes the
+# vocabularies of the merged summaries there, and the transform graph keeps copies as assets.
+MERGED_VOCABULARY_DIR_ENV = 'MERGED_VOCABULARY_DIR'
+
+
+class Moments:
+
+    def __init__(self, count: int = 0, mean: float = 0., m2: float = 0., minimum: float = math.inf,
+                 maximum: float = -math.inf, zeros: int = 0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = minimum
+        self.max = maximum
+        self.zeros = zeros
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values):
+            values = np.asarray(values, dtype=np.float64)
+            mean = float(values.mean())
+            self._combine(len(values), mean, float(np.square(values - mean).sum()), float(values.min()),
+                          float(values.max()), int(np.count_nonzero(values == 0)))
+
+    def merge(self, other: 'Moments') -> None:
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max, other.zeros)
+
+    def _combine(self, count: int, mean: float, m2: float, minimum: float, maximum: float, zeros: int) -> None:
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min, self.max = min(self.min, minimum), max(self.max, maximum)
+        self.zeros += zeros
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max,
+                'zeros': self.zeros}
+
+    @classmethod
+    def from_dict(cls, state: Dict[Text, Any]) -> 'Moments':
+        return cls(state['count'], state['mean'], state['m2'], state['min'], state['max'], state['zeros'])
+
+
+class KllSketch:
+    """Quantile sketch of Karnin, Lang and Liberty (2016).
+
+    Level h holds items of weight 2^h. A full level is sorted and every other item, starting at a
+    pseudo random offset, moves up one level. The offsets are derived from a hash of the level and
+    its number of compactions, so equal inputs always give equal sketches.
+    """
+
+    def __init__(self, k: int = KLL_K, levels: Optional[List[List[float]]] = None,
+                 compactions: Optional[List[int]] = None, n: int = 0):
+        self.k = k
+        self.levels = [np.asarray(level, dtype=np.float64) for level in levels or [[]]]
+        self.compactions = list(compactions or [0] * len(self.levels))
+        self.n = n
+
+    def _capacity(self, level: int) -> int:
+        return max(2, int(math.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level))))
+
+    def _coin(self, level: int) -> int:
+        digest = hashlib.blake2b(f"{level}:{self.compactions[level]}".encode(), digest_size=1).digest()
+        return digest[0] & 1
+
+    def _compress(self) -> None:
+        while sum(len(level) for level in self.levels) > sum(self._capacity(h) for h in range(len(self.levels))):
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) > self._capacity(h):
+                    break
+            else:
+                return
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+                self.compactions.append(0)
+            items = np.sort(self.levels[h])
+            # An odd item out stays on its level, so the total weight does not change.
+            keep, pairs = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+            promoted = pairs[self._coin(h)::2]
+            self.compactions[h] += 1
+            self.levels[h] = keep
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=np.float64)])
+            self.n += len(values)
+            self._compress()
+
+    def merge(self, other: 'KllSketch') -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+            self.compactions.append(0)
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+            self.compactions[h] += other.compactions[h]
+        self.n += other.n
+        self._compress()
+
+    def quantiles(self, fractions: Iterable[float]) -> List[float]:
+        """Values at the given fractions of the ranks, in [0, 1]."""
+        if not self.n:
+            return [math.nan for _ in fractions]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2. ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        ranks = np.asarray(list(fractions)) * cumulative[-1]
+        return items[np.minimum(np.searchsorted(cumulative, ranks), len(items) - 1)].tolist()
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {'k': self.k, 'n': self.n, 'levels': [level.tolist() for level in self.levels],
+                'compactions': self.compactions}
+
+    @classmethod
+    def from_dict(cls, state: Dict[Text, Any]) -> 'KllSketch':
+        return cls(state['k'], state['levels'], state['compactions'], state['n'])
+
+
+class MisraGries:
+    """Heavy hitters of Misra and Gries (1982), merged as in Agarwal et al. (2012)."""
+
+    def __init__(self, capacity: int = MISRA_GRIES_CAPACITY, counts: Optional[Dict[Text, int]] = None,
+                 n: int = 0, error: int = 0):
+        self.capacity = capacity
+        self.counts = dict(counts or {})
+        self.n = n
+        self.error = error  # upper bound of the underestimate of every count
+
+    def _add(self, counts: Iterable[Tuple[Text, int]]) -> None:
+        for value, count in counts:
+            self.counts[value] = self.counts.get(value, 0) + count
+        if len(self.counts) > self.capacity:
+            cut = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {value: count - cut for value, count in self.counts.items() if count > cut}
+            self.error += cut
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values):
+            unique, counts = np.unique(np.asarray(values), return_counts=True)
+            self.n += len(values)
+            self._add(zip((value.decode() if isinstance(value, bytes) else str(value) for value in unique.tolist()),
+                          counts.tolist()))
+
+    def merge(self, other: 'MisraGries') -> None:
+        self.n += other.n
+        self.error += other.error
+        self._add(other.counts.items())
+
+    def top(self, limit: Optional[int] = None) -> List[Tuple[Text, int]]:
+        """(value, count) by decreasing count, ties by decreasing value like tft vocabularies."""
+        return sorted(self.counts.items(), key=lambda item: (item[1], item[0]), reverse=True)[:limit]
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {'capacity': self.capacity, 'n': self.n, 'error': self.error, 'counts': self.counts}
+
+    @classmethod
+    def from_dict(cls, state: Dict[Text, Any]) -> 'MisraGries':
+        return cls(state['capacity'], state['counts'], state['n'], state['error'])
+
+
+class SplitStatistics:
+    """Summaries of every column of a split, see the module docstring."""
+
+    def __init__(self, num_examples: int = 0, spans: Optional[List[int]] = None):
+        self.num_examples = num_examples
+        self.spans = list(spans or [])
+        self.kinds = {}  # type: Dict[Text, Text]
+        self.missing = {}  # type: Dict[Text, int]
+        self.moments = {}  # type: Dict[Text, Moments]
+        self.quantiles = {}  # type: Dict[Text, KllSketch]
+        self.top_values = {}  # type: Dict[Text, MisraGries]
+
+    def _add_column(self, name: Text, kind: Text) -> None:
+        """Starts the summaries of a column, which is missing in all examples seen so far."""
+        if name in self.kinds:
+            if self.kinds[name] != kind:
+                raise ValueError(f"Column {name} is {self.kinds[name]} in one span and {kind} in another")
+            return
+        self.kinds[name] = kind
+        self.missing[name] = self.num_examples
+        if kind == NUMERIC:
+            self.moments[name], self.quantiles[name] = Moments(), KllSketch()
+        else:
+            self.top_values[name] = MisraGries()
+
+    def update(self, num_examples: int, columns: Dict[Text, np.ndarray]) -> None:
+        """Adds a batch of `num_examples` examples; `columns` holds the present values per column."""
+        for name, values in columns.items():
+            kind = NUMERIC if np.asarray(values).dtype.kind in 'biuf' else CATEGORICAL
+            self._add_column(name, kind)
+            self.missing[name] += num_examples - len(values)
+            if kind == NUMERIC:
+                self.moments[name].update(values)
+                self.quantiles[name].update(values)
+            else:
+                self.top_values[name].update(values)
+        for name in self.kinds:
+            if name not in columns:
+                self.missing[name] += num_examples
+        self.num_examples += num_examples
+
+    def merge(self, other: 'SplitStatistics') -> None:
+        for name in self.kinds:
+            if name not in other.kinds:
+                self.missing[name] += other.num_examples
+        for name, kind in other.kinds.items():
+            self._add_column(name, kind)
+            self.missing[name] += other.missing[name]
+            if kind == NUMERIC:
+                self.moments[name].merge(other.moments[name])
+                self.quantiles[name].merge(other.quantiles[name])
+            else:
+                self.top_values[name].merge(other.top_values[name])
+        self.num_examples += other.num_examples
+        self.spans = sorted(set(self.spans) | set(other.spans))
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {
+            'num_examples': self.num_examples,
+            'spans': self.spans,
+            'columns': {name: {'kind': kind, 'missing': self.missing[name],
+                               **({'moments': self.moments[name].to_dict(),
+                                   'quantiles': self.quantiles[name].to_dict()} if kind == NUMERIC
+                                  else {'top_values': self.top_values[name].to_dict()})}
+                        for name, kind in sorted(self.kinds.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[Text, Any]) -> 'SplitStatistics':
+        statistics = cls(state['num_examples'], state['spans'])
+        for name, column in state['columns'].items():
+            statistics.kinds[name] = column['kind']
+            statistics.missing[name] = column['missing']
+            if column['kind'] == NUMERIC:
+                statistics.moments[name] = Moments.from_dict(column['moments'])
+                statistics.quantiles[name] = KllSketch.from_dict(column['quantiles'])
+            else:
+                statistics.top_values[name] = MisraGries.from_dict(column['top_values'])
+        return statistics
+
+    def save(self, path: Text) -> None:
+        with open(path, 'w') as statistics_file:
+            json.dump(self.to_dict(), statistics_file)
+
+    @classmethod
+    def load(cls, path: Text) -> 'SplitStatistics':
+        with open(path) as statistics_file:
+            return cls.from_dict(json.load(statistics_file))
+
+
+def merge_all(statistics: Iterable[SplitStatistics]) -> SplitStatistics:
+    merged = SplitStatistics()
+    for split_statistics in statistics:
+        merged.merge(split_statistics)
+    return merged
+
+
+def statistics_path(directory: Text, split: Text) -> Text:
+    return os.path.join(directory, f"{split}.json")
@@ -0,0 +1,47 @@
+from typing import Text
+
+from tfx import types
+from tfx.components.base import executor_spec
+from tfx.components.base.base_component import BaseComponent
+from tfx.types import ComponentSpec, channel_utils, component_spec, standard_artifacts
+from tfx.types.artifact import Artifact
+
+from custom_components.span_statistics.src import executor
+
+
+class MergedStatistics(Artifact):
+    """Mergeable summaries of all spans up to the current one, one JSON file per split."""
+    TYPE_NAME = 'MergedStatistics'
+
+
+class SpanStatistics(BaseComponent):
+    """Replaces StatisticsGen for span based ingestion.
+
+    Reads only the examples of the latest span and merges their summaries with the stored ones of
+    the previous spans. `statistics` holds the merged TFDV statistics for SchemaGen and
+    ExampleValidator, `merged_statistics` the summaries for SpanTransform.
+    """
+
+    class _ComponentSpec(ComponentSpec):
+        INPUTS = {
+            'examples': component_spec.ChannelParameter(type=standard_artifacts.Examples),
+        }
+        OUTPUTS = {
+            'statistics': component_spec.ChannelParameter(type=standard_artifacts.ExampleStatistics),
+            'merged_statistics': component_spec.ChannelParameter(type=MergedStatistics),
+        }
+        PARAMETERS = {
+            # Persistent directory of the summaries of every span, outlives the pipeline runs.
+            'state_root': component_spec.ExecutionParameter(type=Text),
+        }
+
+    SPEC_CLASS = _ComponentSpec
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
+
+    def __init__(self, examples: types.Channel, state_root: str):
+        spec = self._ComponentSpec(examples=examples,
+                                   statistics=channel_utils.as_channel([standard_artifacts.ExampleStatistics()]),
+                                   merged_statistics=channel_utils.as_channel([MergedStatistics()]),
+                                   state_root=state_root)
+        super(SpanStatistics, self).__init__(spec)
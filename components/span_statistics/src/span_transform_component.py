@@ -0,0 +1,38 @@
+from typing import Text
+
+from tfx import types
+from tfx.components.base import executor_spec
+from tfx.components.base.base_component import BaseComponent
+from tfx.types import artifact, artifact_utils, channel_utils, component_spec, standard_artifacts
+from tfx.types.standard_component_specs import TransformSpec
+
+from custom_components.span_statistics.src import transform_executor
+from custom_components.span_statistics.src.span_statistics_component import MergedStatistics
+
+
+class SpanTransform(BaseComponent):
+    """Transform whose analyzer results come from the merged statistics of SpanStatistics.
+
+    Takes the arguments of Transform with a module file plus `merged_statistics`. The vocabularies
+    and scaling constants reflect all spans, while only the examples of the new span are read.
+    """
+
+    class _ComponentSpec(TransformSpec):
+        INPUTS = dict(TransformSpec.INPUTS,
+                      merged_statistics=component_spec.ChannelParameter(type=MergedStatistics))
+
+    SPEC_CLASS = _ComponentSpec
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(transform_executor.Executor)
+
+    def __init__(self, examples: types.Channel, schema: types.Channel, module_file: Text,
+                 merged_statistics: types.Channel):
+        transformed_examples = standard_artifacts.Examples()
+        transformed_examples.split_names = artifact_utils.encode_split_names(artifact.DEFAULT_EXAMPLE_SPLITS)
+        spec = self._ComponentSpec(examples=examples,
+                                   schema=schema,
+                                   module_file=module_file,
+                                   merged_statistics=merged_statistics,
+                                   transform_graph=channel_utils.as_channel([standard_artifacts.TransformGraph()]),
+                                   transformed_examples=channel_utils.as_channel([transformed_examples]))
+        super(SpanTransform, self).__init__(spec)
@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Text
+
+from tfx import types
+from tfx.types import artifact_utils
+
+from custom_components.example_codec.src import transform_executor as codec_transform_executor
+from custom_components.span_statistics.src.sketches import MERGED_STATISTICS_ENV, MERGED_VOCABULARY_DIR_ENV
+
+
+class Executor(codec_transform_executor.Executor):
+    """Transform executor whose preprocessing_fn takes its analyzer results from merged span statistics.
+
+    The preprocessing_fn is traced in this process, so the environment variable reaches it; with the
+    analyzers replaced by constants, tf.Transform only transforms the examples of the new span. The
+    vocabulary files it writes live in a temp dir of the run, removed once the transform graph holds them.
+    """
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        input_dict = dict(input_dict)
+        merged_statistics = input_dict.pop('merged_statistics')
+        os.environ[MERGED_STATISTICS_ENV] = artifact_utils.get_single_uri(merged_statistics)
+        os.environ[MERGED_VOCABULARY_DIR_ENV] = tempfile.mkdtemp(prefix='merged_vocabulary')
+        try:
+            super(Executor, self).Do(input_dict, output_dict, exec_properties)
+        finally:
+            del os.environ[MERGED_STATISTICS_ENV]
+            shutil.rmtree(os.environ.pop(MERGED_VOCABULARY_DIR_ENV), ignore_errors=True)
@@ -0,0 +1,47 @@
+import numpy as np
+
+from custom_components.span_statistics.src.sketches import MisraGries, SplitStatistics, merge_all
+
+
+def make_span(seed: int, rows: int):
+    rng = np.random.default_rng(seed)
+    return {"num_0": rng.exponential(size=rows),
+            "protocol": rng.choice(np.array([b"tcp", b"udp", b"icmp"]), size=rows, p=[0.7, 0.2, 0.1])}
+
+
+def test_merged_spans_match_one_pass():
+    # given
+    spans = [make_span(seed, 20000) for seed in range(5)]
+    whole = {name: np.concatenate([span[name] for span in spans]) for name in spans[0]}
+    span_statistics = []
+    for number, span in enumerate(spans):
+        statistics = SplitStatistics(spans=[number])
+        statistics.update(20000, span)
+        span_statistics.append(SplitStatistics.from_dict(statistics.to_dict()))
+    # when
+    merged = merge_all(span_statistics)
+    # then
+    moments = merged.moments["num_0"]
+    assert merged.num_examples == 100000 and merged.spans == [0, 1, 2, 3, 4]
+    assert np.isclose(moments.mean, whole["num_0"].mean()) and np.isclose(moments.variance, whole["num_0"].var())
+    assert (moments.min, moments.max) == (whole["num_0"].min(), whole["num_0"].max())
+    for fraction, value in zip([0.1, 0.5, 0.9], merged.quantiles["num_0"].quantiles([0.1, 0.5, 0.9])):
+        assert abs(np.mean(whole["num_0"] <= value) - fraction) < 0.02
+    values, counts = np.unique(whole["protocol"], return_counts=True)
+    assert merged.top_values["protocol"].top() == sorted(
+        zip([value.decode() for value in values], counts.tolist()), key=lambda item: item[1], reverse=True)
+
+
+def test_counts_missing_columns_and_bounds_heavy_hitter_error():
+    # given
+    first, second = SplitStatistics(), SplitStatistics()
+    first.update(10, {"num_0": np.arange(10.)})
+    second.update(5, {"num_0": np.arange(3.), "service": np.array([b"http"] * 5)})
+    values = np.array([f"v{i % 50}".encode() for i in range(1000)] + [b"frequent"] * 500)
+    # when
+    first.merge(second)
+    sketch = MisraGries(capacity=10)
+    sketch.update(values)
+    # then
+    assert first.missing == {"num_0": 2, "service": 10}
+    assert sketch.top(1)[0][0] == "frequent" and 500 - sketch.error <= sketch.counts["frequent"] <= 500
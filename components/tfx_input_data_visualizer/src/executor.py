@@ -0,0 +1,34 @@
+import os
+from typing import Any, Dict, List, Text
+
+import absl
+from tfx import types
+from tfx.components.base import base_executor
+from tfx.types import artifact_utils
+
+from custom_components.instrumentation.src.instrumentation import InstrumentedExecutorMixin
+from custom_components.tfx_input_data_visualizer.src import render, summaries
+
+SUMMARY_FILE_NAME = 'summary.json'
+HTML_FILE_NAME = 'summary.html'
+
+
+class Executor(InstrumentedExecutorMixin, base_executor.BaseExecutor):
+    """Summarizes the input csv files in one pass and renders the summary as HTML."""
+
+    def Do(self, input_dict: Dict[Text, List[types.Artifact]],
+           output_dict: Dict[Text, List[types.Artifact]],
+           exec_properties: Dict[Text, Any]) -> None:
+        self._log_startup(input_dict, output_dict, exec_properties)
+        input_base = artifact_utils.get_single_uri(input_dict['input'])
+        summary_uri = artifact_utils.get_single_uri(output_dict['summary'])
+        with self.span('compute'):
+            summary = summaries.summarize([input_base],
+                                          exec_properties.get('sample_size') or summaries.DEFAULT_SAMPLE_SIZE)
+        self.add_rows(summary.num_rows)
+        with self.span('write'):
+            os.makedirs(summary_uri, exist_ok=True)
+            summary_path = os.path.join(summary_uri, SUMMARY_FILE_NAME)
+            summary.save(summary_path)
+            render.render_file(summary_path, os.path.join(summary_uri, HTML_FILE_NAME))
+        absl.logging.info('Summary of {} rows: {} bytes'.format(summary.num_rows, os.path.getsize(summary_path)))
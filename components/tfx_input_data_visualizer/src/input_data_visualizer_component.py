@@ -0,0 +1,43 @@
+from typing import Optional
+
+from tfx import types
+from tfx.components.base import executor_spec
+from tfx.components.base.base_component import BaseComponent
+from tfx.types import ComponentSpec, channel_utils, component_spec, standard_artifacts
+from tfx.types.artifact import Artifact
+
+from custom_components.tfx_input_data_visualizer.src import executor
+
+
+class DataSummary(Artifact):
+    """Histograms, quantile and top-k sketches and a row sample of the input data, with an HTML rendering."""
+    TYPE_NAME = 'DataSummary'
+
+
+class InputDataVisualizer(BaseComponent):
+    """Summarizes the raw csv files of an ExampleGen input in a single streaming pass.
+
+    The `summary` artifact holds summary.json, a few hundred kilobytes for the full KDD99 data, and
+    summary.html rendered from it; render.py renders stored summaries again without the data.
+    """
+
+    class _ComponentSpec(ComponentSpec):
+        INPUTS = {
+            'input': component_spec.ChannelParameter(type=standard_artifacts.ExternalArtifact),
+        }
+        OUTPUTS = {
+            'summary': component_spec.ChannelParameter(type=DataSummary),
+        }
+        PARAMETERS = {
+            # Number of rows in the uniform sample.
+            'sample_size': component_spec.ExecutionParameter(type=int, optional=True),
+        }
+
+    SPEC_CLASS = _ComponentSpec
+
+    EXECUTOR_SPEC = executor_spec.ExecutorClassSpec(executor.Executor)
+
+    def __init__(self, input: types.Channel, sample_size: Optional[int] = None):  # pylint: disable=redefined-builtin
+        spec = self._ComponentSpec(input=input, summary=channel_utils.as_channel([DataSummary()]),
+                                   sample_size=sample_size)
+        super(InputDataVisualizer, self).__init__(spec)
@@ -0,0 +1,86 @@
+"""
+Renders a stored data summary (see summaries.py) as one self-contained HTML page.
+
+Every num_* column gets a bar chart of its histogram and a table of quantiles, every other column a
+bar chart of its most frequent values; the sampled rows follow as a table. Only the summary file is
+read, never the data.
+
+Usage: python -m custom_components.tfx_input_data_visualizer.src.render summary.json --output summary.html
+"""
+import argparse
+import html
+from typing import Any, Dict, List, Sequence, Text, Tuple
+
+from custom_components.tfx_input_data_visualizer.src.summaries import load_summary
+
+QUANTILE_FRACTIONS = (0., 0.01, 0.25, 0.5, 0.75, 0.99, 1.)
+BAR_WIDTH = 14
+CHART_HEIGHT = 80
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Renders a KDD99 data summary as HTML')
+    parser.add_argument('summary', type=str, help='summary.json written by the visualizer component.')
+    parser.add_argument('--output', type=str, default='summary.html')
+
+    return parser.parse_args()
+
+
+def _format_number(value: float) -> Text:
+    return f"{value:.4g}"
+
+
+def bar_chart(bars: Sequence[Tuple[Text, int]]) -> Text:
+    """Inline SVG of labelled bars, the labels show on hover."""
+    highest = max([count for _, count in bars] + [1])
+    rects = []
+    for i, (label, count) in enumerate(bars):
+        height = max(1, round(CHART_HEIGHT * count / highest)) if count else 0
+        rects.append(f'<rect x="{i * BAR_WIDTH}" y="{CHART_HEIGHT - height}" width="{BAR_WIDTH - 2}" '
+                     f'height="{height}"><title>{html.escape(label)}: {count}</title></rect>')
+    return (f'<svg width="{len(bars) * BAR_WIDTH}" height="{CHART_HEIGHT}" fill="steelblue">'
+            + ''.join(rects) + '</svg>')
+
+
+def _numeric_section(column: Text, summary: Dict[Text, Any]) -> List[Text]:
+    buckets = summary['histograms'][column].buckets()
+    quantiles = summary['quantiles'][column].quantiles(QUANTILE_FRACTIONS)
+    return [f'<h3>{html.escape(column)}</h3>',
+            bar_chart([(f"[{_format_number(low)}, {_format_number(high)})", count) for low, high, count in buckets]),
+            '<table><tr>' + ''.join(f'<th>q{fraction:g}</th>' for fraction in QUANTILE_FRACTIONS) + '</tr><tr>'
+            + ''.join(f'<td>{_format_number(value)}</td>' for value in quantiles) + '</tr></table>']
+
+
+def _categorical_section(column: Text, summary: Dict[Text, Any]) -> List[Text]:
+    top_values = summary['top_values'][column]
+    return [f'<h3>{html.escape(column)}</h3>', bar_chart(list(top_values.top.items())),
+            '<table>' + ''.join(f'<tr><td>{html.escape(value)}</td><td>~{count}</td></tr>'
+                                for value, count in top_values.top.items()) + '</table>']
+
+
+def render(summary: Dict[Text, Any]) -> Text:
+    """HTML of a summary loaded with `load_summary`."""
+    parts = ['<html><head><meta charset="utf-8"><title>KDD99 data summary</title></head><body>',
+             f"<h2>{summary['num_rows']} rows</h2>"]
+    for column in summary['columns']:
+        if column in summary['histograms']:
+            parts.extend(_numeric_section(column, summary))
+        else:
+            parts.extend(_categorical_section(column, summary))
+    parts.append(f"<h2>Sample of {len(summary['sample'])} rows</h2><table>")
+    parts.append('<tr>' + ''.join(f'<th>{html.escape(column)}</th>' for column in summary['columns']) + '</tr>')
+    for row in summary['sample']:
+        parts.append('<tr>' + ''.join(f'<td>{html.escape(cell)}</td>' for cell in row.split(',')) + '</tr>')
+    parts.append('</table></body></html>')
+    return '\n'.join(parts)
+
+
+def render_file(summary_path: Text, output_path: Text) -> None:
+    with open(output_path, 'w') as output_file:
+        output_file.write(render(load_summary(summary_path)))
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    render_file(args.summary, args.output)
+    print(f"Rendered {args.summary} to {args.output}")
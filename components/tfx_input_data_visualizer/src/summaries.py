@@ -0,0 +1,176 @@
+"""
+Compact, mergeable summaries of raw KDD99 csv files for looking at the data without loading it.
+
+The files are read once, in chunks of rows, and every column is summarized with fixed memory:
+
+    num_* columns   FixedHistogram, counts in fixed logarithmic bins (the same for every input, so
+                    histograms of different files add up), and a KllSketch of the quantiles
+    other columns   CountMinTopK, a count-min sketch with the k values of highest estimated count
+
+plus a uniform Reservoir sample of whole rows. A summary of the full 4.9M rows is stored as a JSON
+file of a few hundred kilobytes, and render.py draws it.
+"""
+import hashlib
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Text, Tuple
+
+import numpy as np
+
+from custom_components.file_loader.src.sample_kdd99 import Reservoir, input_files
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER, read_chunks
+from custom_components.span_statistics.src.sketches import KllSketch
+
+COLUMNS = KDD99_HEADER.split(',')
+_NUMERIC_INDICES = [i for i, column in enumerate(COLUMNS) if column.startswith('num_')]
+_CATEGORICAL_INDICES = [i for i, column in enumerate(COLUMNS) if not column.startswith('num_')]
+# Bins [2^i, 2^(i+1)) from 2^-10, below them [0, 2^-10) and negative values, above them values of 2^40 or more.
+HISTOGRAM_EDGES = np.concatenate([[0.], 2. ** np.arange(-10, 41)])
+QUANTILE_K = 100
+TOP_K = 20
+COUNT_MIN_DEPTH = 4
+COUNT_MIN_WIDTH = 2048
+DEFAULT_SAMPLE_SIZE = 100
+DEFAULT_SEED = 99
+
+
+class FixedHistogram:
+
+    def __init__(self, counts: Optional[List[int]] = None):
+        self.counts = np.asarray(counts if counts is not None else np.zeros(len(HISTOGRAM_EDGES) + 1),
+                                 dtype=np.int64)
+
+    def update(self, values: np.ndarray) -> None:
+        bins = np.searchsorted(HISTOGRAM_EDGES, values, side='right')
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def merge(self, other: 'FixedHistogram') -> None:
+        self.counts += other.counts
+
+    def buckets(self) -> List[Tuple[float, float, int]]:
+        """(low, high, count) of the non-empty bins."""
+        edges = np.concatenate([[-np.inf], HISTOGRAM_EDGES, [np.inf]])
+        return [(float(edges[i]), float(edges[i + 1]), int(count)) for i, count in enumerate(self.counts) if count]
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {'counts': self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, state: Dict[Text, Any]) -> 'FixedHistogram':
+        return cls(state['counts'])
+
+
+class CountMinTopK:
+    """Count-min sketch of Cormode and Muthukrishnan (2005) with the k most frequent candidates.
+
+    Estimates never undercount and overcount by at most e / width of all values with probability
+    1 - e^-depth. The candidates are the top k and the values of the current batch or merged sketch,
+    ranked by their estimates.
+    """
+
+    def __init__(self, k: int = TOP_K, depth: int = COUNT_MIN_DEPTH, width: int = COUNT_MIN_WIDTH,
+                 table: Optional[List[List[int]]] = None, top: Optional[Dict[Text, int]] = None, n: int = 0):
+        self.k = k
+        self.table = np.asarray(table if table is not None else np.zeros((depth, width)), dtype=np.int64)
+        self.top = dict(top or {})
+        self.n = n
+
+    def _columns(self, value: Text) -> np.ndarray:
+        depth, width = self.table.shape
+        digest = hashlib.blake2b(value.encode(), digest_size=4 * depth).digest()
+        return np.frombuffer(digest, dtype='<u4') % width
+
+    def estimate(self, value: Text) -> int:
+        return int(self.table[np.arange(self.table.shape[0]), self._columns(value)].min())
+
+    def _select(self, candidates: Sequence[Text]) -> None:
+        estimates = {value: self.estimate(value) for value in set(candidates) | set(self.top)}
+        self.top = dict(sorted(estimates.items(), key=lambda item: (-item[1], item[0]))[:self.k])
+
+    def update(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        unique, counts = np.unique(values, return_counts=True)
+        unique = [value.decode() if isinstance(value, bytes) else str(value) for value in unique.tolist()]
+        rows = np.arange(self.table.shape[0])
+        for value, count in zip(unique, counts.tolist()):
+            self.table[rows, self._columns(value)] += count
+        self.n += len(values)
+        self._select(unique)
+
+    def merge(self, other: 'CountMinTopK') -> None:
+        if self.table.shape != other.table.shape:
+            raise ValueError(f"Cannot merge count-min sketches of shape {self.table.shape} and {other.table.shape}")
+        self.table += other.table
+        self.n += other.n
+        self._select(list(other.top))
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {'k': self.k, 'n': self.n, 'top': self.top, 'table': self.table.tolist()}
+
+    @classmethod
+    def from_dict(cls, state: Dict[Text, Any]) -> 'CountMinTopK':
+        return cls(state['k'], table=state['table'], top=state['top'], n=state['n'])
+
+
+class DataSummary:
+    """Summaries of every column of the input files and a sample of their rows, see the module docstring."""
+
+    def __init__(self, sample_size: int = DEFAULT_SAMPLE_SIZE, seed: int = DEFAULT_SEED):
+        self.num_rows = 0
+        self.histograms = {COLUMNS[i]: FixedHistogram() for i in _NUMERIC_INDICES}
+        self.quantiles = {COLUMNS[i]: KllSketch(QUANTILE_K) for i in _NUMERIC_INDICES}
+        self.top_values = {COLUMNS[i]: CountMinTopK() for i in _CATEGORICAL_INDICES}
+        self.sample = Reservoir(sample_size, random.Random(seed))
+
+    def update(self, rows: List[bytes]) -> None:
+        table = np.array([row.split(b',') for row in rows], dtype=np.bytes_)
+        if table.ndim != 2 or table.shape[1] != len(COLUMNS):
+            raise ValueError(f"Rows {self.num_rows} to {self.num_rows + len(rows)} do not have "
+                             f"{len(COLUMNS)} columns")
+        numeric = table[:, _NUMERIC_INDICES].astype(np.float64)
+        for values, column in zip(numeric.T, self.histograms):
+            self.histograms[column].update(values)
+            self.quantiles[column].update(values)
+        for index, column in zip(_CATEGORICAL_INDICES, self.top_values):
+            self.top_values[column].update(table[:, index])
+        self.sample.extend(rows)
+        self.num_rows += len(rows)
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {
+            'num_rows': self.num_rows,
+            'columns': COLUMNS,
+            'histograms': {column: histogram.to_dict() for column, histogram in self.histograms.items()},
+            'quantiles': {column: sketch.to_dict() for column, sketch in self.quantiles.items()},
+            'top_values': {column: sketch.to_dict() for column, sketch in self.top_values.items()},
+            'sample': [row.decode() for row in self.sample.items],
+        }
+
+    def save(self, path: Text) -> None:
+        with open(path, 'w') as summary_file:
+            json.dump(self.to_dict(), summary_file)
+
+
+def summarize(inputs: Sequence[Text], sample_size: int = DEFAULT_SAMPLE_SIZE,
+              seed: int = DEFAULT_SEED) -> DataSummary:
+    """Streams the csv files or directories of shards once, see `DataSummary`."""
+    start = time.time()
+    summary = DataSummary(sample_size, seed)
+    for path in input_files(inputs):
+        for chunk in read_chunks(path):
+            summary.update([row for _, row in chunk])
+    print(f"Summarized {summary.num_rows} rows in {time.time() - start:.2f}s")
+    return summary
+
+
+def load_summary(path: Text) -> Dict[Text, Any]:
+    """The stored summary with the sketches restored, as render.py uses it."""
+    with open(path) as summary_file:
+        state = json.load(summary_file)
+    state['histograms'] = {column: FixedHistogram.from_dict(histogram)
+                           for column, histogram in state['histograms'].items()}
+    state['quantiles'] = {column: KllSketch.from_dict(sketch) for column, sketch in state['quantiles'].items()}
+    state['top_values'] = {column: CountMinTopK.from_dict(sketch) for column, sketch in state['top_values'].items()}
+    return state
@@ -0,0 +1,42 @@
+import numpy as np
+
+from custom_components.file_loader.src.split_kdd99 import KDD99_HEADER
+from custom_components.tfx_input_data_visualizer.src import render
+from custom_components.tfx_input_data_visualizer.src.summaries import CountMinTopK, load_summary, summarize
+
+ROW = "{},tcp,{},SF,181,5450,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,8,8,0.00,0.00,0.00,0.00,1.00,0.00,0.00,9,9,1.00,0.00," \
+      "0.11,0.00,0.00,0.00,0.00,0.00,{}"
+
+
+def test_summary_round_trip_and_render(tmp_path):
+    # given
+    rows = [ROW.format(i, "http" if i % 4 else "smtp", "normal." if i % 10 else "smurf.") for i in range(5000)]
+    (tmp_path / "data.csv").write_text(KDD99_HEADER + "\n" + "\n".join(rows) + "\n")
+    # when
+    summary = summarize([str(tmp_path)], sample_size=10)
+    summary.save(str(tmp_path / "summary.json"))
+    loaded = load_summary(str(tmp_path / "summary.json"))
+    page = render.render(loaded)
+    # then
+    assert loaded["num_rows"] == 5000 and len(loaded["sample"]) == 10
+    assert loaded["top_values"]["application_protocol"].top == {"http": 3750, "smtp": 1250}
+    assert loaded["top_values"]["label_0"].top == {"normal.": 4500, "smurf.": 500}
+    assert sum(loaded["histograms"]["num_0"].counts) == 5000
+    assert abs(loaded["quantiles"]["num_0"].quantiles([0.5])[0] - 2500) < 100
+    assert "smurf." in page and "<svg" in page
+
+
+def test_count_min_top_k_finds_heavy_hitters_after_merge():
+    # given
+    rng = np.random.default_rng(0)
+    values = np.array([f"v{i}".encode() for i in rng.zipf(1.5, size=50000) % 5000])
+    first, second = CountMinTopK(k=5, width=512), CountMinTopK(k=5, width=512)
+    # when
+    first.update(values[:25000])
+    second.update(values[25000:])
+    first.merge(second)
+    # then
+    unique, counts = np.unique(values, return_counts=True)
+    exact = dict(zip([value.decode() for value in unique], counts.tolist()))
+    assert set(first.top) == set(sorted(exact, key=exact.get, reverse=True)[:5])
+    assert all(exact[value] <= estimate <= exact[value] + 2.72 * 50000 / 512 for value, estimate in first.top.items())
@@ -23,8 +23,10 @@ from typing import List, Text
 from kfp import onprem
 from tfx.orchestration import pipeline
 from tfx.orchestration.kubeflow import kubeflow_dag_runner
+from tfx.utils.dsl_utils import external_input
 
-from custom_components.tfx_demo_component.src import demo_component
+from custom_components.resource_planner.src import resource_planner
+from custom_components.tfx_input_data_visualizer.src.input_data_visualizer_component import InputDataVisualizer
 
 _pipeline_name = 'demo-pipe'
 
@@ -44,6 +46,13 @@ _module_file = os.path.join(_input_base, 'utils.py')
 
 _serving_model_dir = os.path.join(_output_base, _pipeline_name, 'serving_model')
 
+# Workers and CPU and memory requests of the components (see resource_planner.py) for the data on the
+# volume, which is not at hand when compiling; the full KDD99 data by default. Off by default, since
+# _node_capacity has to match the nodes of the cluster, a smaller one caps the components.
+_plan_resources = False
+_plan_input_size = resource_planner.InputSize(rows=4898431, bytes=742579200)
+_node_capacity = resource_planner.NodeCapacity(cpus=4, memory_mib=16384)
+
 # Pipeline arguments for Beam powered Components.
 _beam_pipeline_args = [
     '--direct_running_mode=multi_processing',
@@ -57,13 +66,14 @@ def _create_pipeline(pipeline_name: Text, pipeline_root: Text, data_root: Text,
                      module_file: Text, serving_model_dir: Text,
                      beam_pipeline_args: List[Text]) -> pipeline.Pipeline:
     """Implements the chicago taxi pipeline with TFX and Kubeflow Pipelines."""
-    file_loader = demo_component.FileLoaderComponent(split='train')
+    # Summaries of the raw data to look at instead of the csv files themselves.
+    input_data_visualizer = InputDataVisualizer(input=external_input(data_root))
 
     return pipeline.Pipeline(
         pipeline_name=pipeline_name,
         pipeline_root=pipeline_root,
         components=[
-            file_loader
+            input_data_visualizer
         ],
         beam_pipeline_args=beam_pipeline_args)
 
@@ -125,8 +135,9 @@ if __name__ == '__main__':
             # default configurations specifically for GKE on GCP, such as secrets.
             [
                 onprem.mount_pvc(_persistent_volume_claim, _persistent_volume,
-                                 _persistent_volume_mount)
-            ]))
+                                 _persistent_volume_mount),
+            ] + ([resource_planner.pipeline_operator_func(resource_planner.plan(_plan_input_size, _node_capacity))]
+                 if _plan_resources else [])))
 
     kubeflow_dag_runner.KubeflowDagRunner(config=runner_config).run(
         _create_pipeline(
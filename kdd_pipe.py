@@ -17,18 +17,47 @@ Chicago Taxi example using TFX DSL on Kubeflow (runs locally on cluster).
 Source: https://github.com/tensorflow/tfx/blob/master/tfx/examples/chicago_taxi_pipeline/taxi_pipeline_kubeflow_local.py
 """
 
+import importlib
+import json
 import os
-from typing import List, Text
+from typing import Dict, List, Optional, Text
 
+import tensorflow_data_validation as tfdv
 from kfp import onprem
-from tfx.components import CsvExampleGen, ExampleValidator, Transform, Trainer
+from kubernetes.client import V1EnvVar
+from tfx.components import CsvExampleGen, ExampleValidator, Trainer
 from tfx.components import SchemaGen
 from tfx.components import StatisticsGen
+from tfx.components.base import executor_spec
+from tfx.components.trainer import executor as trainer_executor
 from tfx.orchestration import pipeline
 from tfx.orchestration.kubeflow import kubeflow_dag_runner
-from tfx.proto import trainer_pb2
+from ml_metadata.proto import metadata_store_pb2
+from tfx.proto import example_gen_pb2, trainer_pb2
 from tfx.utils.dsl_utils import external_input
 
+from custom_components.columnar_cache.src import columnar_cache
+from custom_components.columnar_cache.src.columnar_cache_component import ColumnarCacheComponent
+from custom_components.example_codec.src import example_codec
+from custom_components.example_codec.src.codec_transform_component import CodecTransform
+from custom_components.example_dedup.src.example_dedup_component import ExampleDedup
+from custom_components.example_gen.src.kdd_example_gen_component import KddExampleGen
+from custom_components.resource_planner.src import resource_planner
+from custom_components.result_cache.src import result_cache
+from custom_components.result_cache.src.caching_executors import enable_result_cache
+from custom_components.span_statistics.src.span_statistics_component import SpanStatistics
+from custom_components.span_statistics.src.span_transform_component import SpanTransform
+
+# Numbered component directories are no valid module names for import statements.
+CsvValidator = importlib.import_module(
+    'custom_components.3_example_validator.src.csv_validator_component').CsvValidator
+SlicedEvaluator = importlib.import_module(
+    'custom_components.7_evaluator.src.sliced_evaluator_component').SlicedEvaluator
+LoadTestValidator = importlib.import_module(
+    'custom_components.8_infra_validator.src.load_test_validator_component').LoadTestValidator
+OptimizedPusher = importlib.import_module(
+    'custom_components.9_pusher.src.optimized_pusher_component').OptimizedPusher
+
 _pipeline_name = 'kdd-pipe'
 
 _persistent_volume_claim = 'tfx-pvc'
@@ -48,26 +77,168 @@ _module_file = os.path.join(_tfx_root, 'tfx_utils.py')
 
 _serving_model_dir = os.path.join(_output_base, _pipeline_name, 'serving_model')
 
+# Memory-mapped columnar copies of the input data, one per content fingerprint.
+_columnar_cache_root = os.path.join(_persistent_volume_mount, 'columnar_cache')
+
+# Converts the csv files with the parallel KDD99 executor instead of CsvExampleGen's generic parser.
+_use_kdd_example_gen = False
+
+# Builds (or reuses) the columnar cache of the input data, and the Trainer reads its train and eval rows
+# from the memory-mapped columns instead of decompressing and parsing the transformed examples. The
+# rows are split the way KddExampleGen splits them, so this needs _use_kdd_example_gen without spans.
+_build_columnar_cache = False
+
+# Collapses exact duplicate rows into one example with a `weight` count. Statistics, preprocessing_fn
+# and run_fn weight by it, so results match the full data while most KDD99 rows are skipped.
+_dedup_examples = False
+
+# Ingests only the latest span, the highest <N> of the span-<N> folders below the data root, with
+# KddExampleGen. SpanStatistics merges its statistics with the stored ones of the previous spans and
+# SpanTransform takes the vocabularies and scaling constants from them instead of re-analyzing the
+# history, so a run costs as much as the new span. The span statistics have no row weights, so this
+# excludes _dedup_examples.
+_use_spans = False
+_span_pattern = 'span-{SPAN}/*'
+_span_state_root = os.path.join(_persistent_volume_mount, 'span_statistics')
+
+# Checks the raw csv files that ExampleGen reads before anything is converted, and fails the run on
+# malformed rows, non-numeric cells or categorical values outside the value sets (schema.pbtxt of a
+# previous SchemaGen run or JSON written with csv_validator.py --write-value-sets; None checks only
+# the row layout).
+_validate_csv = False
+_csv_value_sets_path = None
+
+# Evaluates the trained model on data/validate (written by split_kdd99.py): precision and recall of
+# every attack class, overall and per transport_protocol and application_protocol value.
+_evaluate_slices = False
+_validate_data_root = os.path.join(_tfx_root, 'data/validate')
+
+# Load tests the exported model with the eval examples in a CPU-only stand-in for the model server.
+# Its InfraBlessing is only blessed if every scenario meets the thresholds (see load_test.py). Single
+# example requests are bound by their latency, so only the batched scenario has a throughput target.
+_load_test_model = False
+_load_test_scenarios = [{'concurrency': 1, 'batch_size': 1}, {'concurrency': 8, 'batch_size': 1},
+                        {'concurrency': 4, 'batch_size': 64,
+                         'thresholds': {'max_p99_ms': 200., 'min_examples_per_sec': 1000.}}]
+_load_test_thresholds = {'max_p99_ms': 50., 'max_memory_mib': 2048.}
+
+# Pushes the model to _serving_model_dir with an export for CPU scoring next to the SavedModel: the
+# transform folded into a TFLite model, quantized with _serving_quantization (none, float16, dynamic
+# int8 weights or int8 calibrated on eval records). Not pushed if its accuracy on the eval split is
+# more than _max_accuracy_delta below the SavedModel's, or if the load test did not bless the model.
+# scorer.py micro-batches JSONL records with it.
+_push_model = True
+_serving_quantization = 'dynamic'
+_max_accuracy_delta = 0.005
+
+# Compression of the examples KddExampleGen, ExampleDedup and Transform write: none, zlib or gzip with
+# an optional level, e.g. zlib-1 (see example_codec.py). Readers take it from the artifacts. Less
+# compression saves the Trainer inflate work but takes more of the 5Gi volume; benchmark_codecs.py
+# measures both and recommends a codec for a disk budget.
+_example_codec = 'gzip'
+
+# Plans the Beam workers, batch sizes and CPU and memory requests and limits of every component for
+# the size of the input (see resource_planner.py) instead of one worker per CPU of the node. None
+# measures the data root, or its copy in this checkout when compiling outside the image; for the
+# full KDD99 data, set it to resource_planner.InputSize(rows=4898431, bytes=742579200). A
+# timing_report.json of kdd_pipe_local.py replaces the default cost profiles with measured ones.
+# Off by default, since _node_capacity has to match the nodes of the cluster: a smaller one caps
+# every component, the Trainer included, below the CPUs it would use without a plan.
+_plan_resources = False
+_plan_input_size = None
+_plan_timings_path = None
+_node_capacity = resource_planner.NodeCapacity(cpus=4, memory_mib=16384)
+
+# Skips ExampleGen, StatisticsGen, SchemaGen, ExampleValidator and Transform if a result for the
+# same input contents, module file content and exec properties is stored on the volume. Unlike
+# enable_cache this survives image rebuilds, which change the timestamps of data/ and thereby the
+# ExampleGen fingerprint, and metadata resets.
+_use_result_cache = True
+_result_cache_root = os.path.join(_pipeline_root, result_cache.CACHE_DIR_NAME)
+# The tfx-pv volume has 5Gi; cached entries mostly hard link the pipeline outputs.
+_result_cache_max_bytes = 2 << 30
+_result_cache_max_age_seconds = 14 * 24 * 3600
+
+# Trainer custom_config read by run_fn, see tfx_utils.py.
+_trainer_custom_config = {
+    'batch_size': 256,
+    'shuffle_buffer': 10000,
+    # Keeps the decompressed train records in memory; only for small inputs like data/train.small.
+    'cache_train_data': True,
+}
+
 # Pipeline arguments for Beam powered Components.
 _beam_pipeline_args = [
     '--direct_running_mode=multi_processing',
     # 0 means auto-detect based on the number of CPUs available
-    # during execution time.
+    # during execution time. With _plan_resources each container gets its planned number instead.
     '--direct_num_workers=0',
 ]
 
 
 def _create_pipeline(pipeline_name: Text, pipeline_root: Text, data_root: Text,
                      module_file: Text, serving_model_dir: Text,
-                     beam_pipeline_args: List[Text]) -> pipeline.Pipeline:
-    """Implements the chicago taxi pipeline with TFX and Kubeflow Pipelines."""
+                     beam_pipeline_args: List[Text],
+                     metadata_connection_config: Optional[metadata_store_pb2.ConnectionConfig] = None,
+                     resource_plan: Optional[Dict[Text, resource_planner.ComponentPlan]] = None
+                     ) -> pipeline.Pipeline:
+    """Implements the chicago taxi pipeline with TFX and Kubeflow Pipelines.
+    The metadata connection is left to the runner on Kubeflow; kdd_pipe_local.py passes a SQLite one.
+    Of a resource plan only the StatisticsGen batch size is part of the pipeline, the rest is applied
+    to the containers by its op func.
+    """
+    if _use_spans and _dedup_examples:
+        raise ValueError('SpanStatistics reads the raw examples, so its schema has no weight and SpanTransform '
+                         'and the Trainer would not weight deduplicated rows; set only one of _use_spans and '
+                         '_dedup_examples')
     examples = external_input(data_root)
 
     # Brings data into the pipeline or otherwise joins/converts training data.
-    example_gen = CsvExampleGen(input=examples)
+    input_config = None
+    if _use_spans:
+        input_config = example_gen_pb2.Input(splits=[
+            example_gen_pb2.Input.Split(name='single_split', pattern=_span_pattern)])
+        example_gen = KddExampleGen(input=examples, input_config=input_config)
+    elif _use_kdd_example_gen:
+        example_gen = KddExampleGen(input=examples)
+    else:
+        example_gen = CsvExampleGen(input=examples)
+
+    components = [example_gen]
+    if _validate_csv:
+        csv_validator = CsvValidator(input=examples, input_config=input_config,
+                                     value_sets_path=_csv_value_sets_path)
+        # ExampleGen consumes none of its outputs, so the order is set explicitly.
+        example_gen.add_upstream_node(csv_validator)
+        components.insert(0, csv_validator)
+    trainer_custom_config = _trainer_custom_config
+    columnar_cache_component = None
+    if _build_columnar_cache:
+        if not _use_kdd_example_gen or _use_spans:
+            raise ValueError('The Trainer reads the columnar cache split like KddExampleGen splits its input, '
+                             'so _build_columnar_cache needs _use_kdd_example_gen and no _use_spans')
+        columnar_cache_component = ColumnarCacheComponent(input=examples, cache_root=_columnar_cache_root)
+        components.append(columnar_cache_component)
+        trainer_custom_config = dict(_trainer_custom_config, columnar_cache_dir=_columnar_cache_dir(data_root))
+
+    examples_channel = example_gen.outputs['examples']
+    stats_options_args = {}
+    if _dedup_examples:
+        example_dedup = ExampleDedup(examples=examples_channel)
+        components.append(example_dedup)
+        examples_channel = example_dedup.outputs['deduplicated_examples']
+        stats_options_args['weight_feature'] = 'weight'
+    statistics_plan = resource_planner.lookup(resource_plan or {}, 'StatisticsGen')
+    if statistics_plan is not None and statistics_plan.batch_size:
+        stats_options_args['desired_batch_size'] = statistics_plan.batch_size
+    stats_options = tfdv.StatsOptions(**stats_options_args) if stats_options_args else None
 
     # Computes statistics over data for visualization and example validation.
-    statistics_gen = StatisticsGen(examples=example_gen.outputs['examples'])
+    if _use_spans:
+        # Statistics of the raw rows of all spans.
+        statistics_gen = SpanStatistics(examples=example_gen.outputs['examples'], state_root=_span_state_root)
+    else:
+        statistics_gen = StatisticsGen(examples=examples_channel, stats_options=stats_options)
 
     # Generates schema based on statistics files.
     schema_gen = SchemaGen(
@@ -80,34 +251,124 @@ def _create_pipeline(pipeline_name: Text, pipeline_root: Text, data_root: Text,
         schema=schema_gen.outputs['schema'])
 
     # Performs transformations and feature engineering in training and serving.
-    transform = Transform(
-        examples=example_gen.outputs['examples'],
-        schema=schema_gen.outputs['schema'],
-        module_file=module_file)
+    if _use_spans:
+        transform = SpanTransform(
+            examples=examples_channel,
+            schema=schema_gen.outputs['schema'],
+            module_file=module_file,
+            merged_statistics=statistics_gen.outputs['merged_statistics'])
+    else:
+        transform = CodecTransform(
+            examples=examples_channel,
+            schema=schema_gen.outputs['schema'],
+            module_file=module_file)
 
-    # Uses user-provided Python function that implements a model using TF-Learn
-    # to train a model on Google Cloud AI Platform.
+    # Trains the Keras model of run_fn in tfx_utils.py.
     trainer = Trainer(
         module_file=module_file,
+        custom_executor_spec=executor_spec.ExecutorClassSpec(trainer_executor.GenericExecutor),
         transformed_examples=transform.outputs['transformed_examples'],
         schema=schema_gen.outputs['schema'],
         transform_graph=transform.outputs['transform_graph'],
         train_args=trainer_pb2.TrainArgs(num_steps=10000),
         eval_args=trainer_pb2.EvalArgs(num_steps=5000),
+        custom_config=trainer_custom_config,
     )
+    if columnar_cache_component is not None:
+        # The Trainer consumes none of its outputs, so the order is set explicitly.
+        trainer.add_upstream_node(columnar_cache_component)
+    components += [statistics_gen, schema_gen, example_validator, transform]
+    if _use_result_cache:
+        components = [enable_result_cache(component) for component in components]
+    components.append(trainer)
+
+    if _evaluate_slices:
+        validate_gen = KddExampleGen(
+            input=external_input(_validate_data_root),
+            input_config=example_gen_pb2.Input(splits=[example_gen_pb2.Input.Split(name='validate', pattern='*')]),
+            output_config=example_gen_pb2.Output(split_config=example_gen_pb2.SplitConfig(splits=[
+                example_gen_pb2.SplitConfig.Split(name='validate', hash_buckets=1)])),
+            instance_name='validate')
+        sliced_evaluator = SlicedEvaluator(
+            examples=validate_gen.outputs['examples'],
+            model=trainer.outputs['model'],
+            transform_graph=transform.outputs['transform_graph'],
+            split='validate')
+        components += [validate_gen, sliced_evaluator]
+
+    infra_blessing = None
+    if _load_test_model:
+        load_test_validator = LoadTestValidator(
+            model=trainer.outputs['model'],
+            examples=example_gen.outputs['examples'],
+            split='eval',
+            scenarios=_load_test_scenarios,
+            thresholds=_load_test_thresholds)
+        components.append(load_test_validator)
+        infra_blessing = load_test_validator.outputs['blessing']
+
+    if _push_model:
+        components.append(OptimizedPusher(
+            model=trainer.outputs['model'],
+            transform_graph=transform.outputs['transform_graph'],
+            examples=example_gen.outputs['examples'],
+            infra_blessing=infra_blessing,
+            serving_model_dir=serving_model_dir,
+            quantization=_serving_quantization,
+            max_accuracy_delta=_max_accuracy_delta,
+            split='eval'))
+
     return pipeline.Pipeline(
         pipeline_name=pipeline_name,
         pipeline_root=pipeline_root,
-        components=[
-            example_gen,
-            statistics_gen,
-            schema_gen,
-            example_validator,
-            transform
-        ],
+        components=components,
+        # ExampleGen reuses its output while the fingerprint of the input files is unchanged, so
+        # with caching the downstream stages, including Transform's vocabularies, are reused too.
+        enable_cache=True,
+        metadata_connection_config=metadata_connection_config,
         beam_pipeline_args=beam_pipeline_args)
 
 
+def _local_path(path: Text) -> Text:
+    """`path` of the image, or its copy in this checkout when compiling outside the image."""
+    if os.path.exists(path):
+        return path
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.relpath(path, _tfx_root))
+
+
+def _columnar_cache_dir(data_root: Text) -> Text:
+    """Directory the ColumnarCacheComponent builds or reuses for the files of `data_root`."""
+    data_root = _local_path(data_root)
+    paths = [os.path.join(data_root, filename) for filename in sorted(os.listdir(data_root))
+             if os.path.isfile(os.path.join(data_root, filename))]
+    return os.path.join(_columnar_cache_root, columnar_cache.fingerprint(paths))
+
+
+def _resource_plan() -> Dict[Text, resource_planner.ComponentPlan]:
+    """Resource plan for _plan_input_size or the measured size of the data root."""
+    input_size = _plan_input_size
+    if input_size is None:
+        input_size = resource_planner.measure_input(_local_path(_data_root))
+    profiles = None
+    if _plan_timings_path:
+        with open(_plan_timings_path) as timings_file:
+            profiles = resource_planner.profiles_from_timings(json.load(timings_file))
+    return resource_planner.plan(input_size, _node_capacity, profiles)
+
+
+def _result_cache_env(container_op):
+    """Configures the result cache of the caching executors in every component container."""
+    for name, value in ((result_cache.ROOT_ENV, _result_cache_root),
+                        (result_cache.MAX_BYTES_ENV, str(_result_cache_max_bytes)),
+                        (result_cache.MAX_AGE_ENV, str(_result_cache_max_age_seconds))):
+        container_op.container.add_env_variable(V1EnvVar(name=name, value=value))
+
+
+def _example_codec_env(container_op):
+    """Sets the codec of the examples writers in every component container."""
+    container_op.container.add_env_variable(V1EnvVar(name=example_codec.CODEC_ENV, value=_example_codec))
+
+
 if __name__ == '__main__':
     # Metadata config. The defaults work with the installation of
     # KF Pipelines using Kubeflow. If installing KF Pipelines using the
@@ -127,6 +388,9 @@ if __name__ == '__main__':
     # environment variable 'KUBEFLOW_TFX_IMAGE' is defined. Currently, the tfx
     # cli tool exports the environment variable to pass to the pipelines.
     tfx_image = "anylog/kdd_data:v0.1"
+    resource_plan = _resource_plan() if _plan_resources else None
+    for misfit in resource_planner.misfits(resource_plan or {}):
+        print(f"Warning: {misfit}")
     runner_config = kubeflow_dag_runner.KubeflowDagRunnerConfig(
         kubeflow_metadata_config=metadata_config,
         # Specify custom docker image to use.
@@ -137,8 +401,10 @@ if __name__ == '__main__':
             # default configurations specifically for GKE on GCP, such as secrets.
             [
                 onprem.mount_pvc(_persistent_volume_claim, _persistent_volume,
-                                 _persistent_volume_mount)
-            ]))
+                                 _persistent_volume_mount),
+                _result_cache_env,
+                _example_codec_env,
+            ] + ([resource_planner.pipeline_operator_func(resource_plan)] if resource_plan else [])))
 
     kubeflow_dag_runner.KubeflowDagRunner(config=runner_config).run(
         _create_pipeline(
@@ -147,4 +413,5 @@ if __name__ == '__main__':
             data_root=_data_root,
             module_file=_module_file,
             serving_model_dir=_serving_model_dir,
-            beam_pipeline_args=_beam_pipeline_args))
+            beam_pipeline_args=_beam_pipeline_args,
+            resource_plan=resource_plan))
@@ -0,0 +1,170 @@
+"""
+Runs the kdd_pipe graph in-process with BeamDagRunner and a SQLite metadata store, no cluster needed.
+
+Every component is launched by a timing launcher that records wall time, CPU time, peak RSS of the
+process tree, bytes of the input and output artifacts and rows/sec. The per-component results are
+written to <pipeline_root>/timing/<component>.json and summarized at the end of the run in
+<pipeline_root>/timing_report.json, from which resource_planner.py derives measured cost profiles.
+
+Usage: PYTHONPATH=<dir containing custom_components> python kdd_pipe_local.py --data-root data/train.small
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import resource
+import time
+from typing import Any, Dict, List, Optional, Text
+
+import tensorflow as tf
+from tfx import types
+from tfx.orchestration import metadata
+from tfx.orchestration.beam.beam_dag_runner import BeamDagRunner
+from tfx.orchestration.config import pipeline_config
+from tfx.orchestration.launcher import in_process_component_launcher
+
+import kdd_pipe
+from custom_components.example_codec.src import example_codec
+from custom_components.instrumentation.src.instrumentation import ProcessTreeRssSampler
+from custom_components.resource_planner.src import resource_planner
+
+TIMING_DIR = 'timing'
+REPORT_FILE = 'timing_report.json'
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Runs kdd_pipe in-process with a per-stage timing report')
+    parser.add_argument('--data-root', type=str, default='data/train.small')
+    parser.add_argument('--pipeline-root', type=str, default='/tmp/kdd-pipe-local')
+    parser.add_argument('--module-file', type=str, default='tfx_utils.py')
+    parser.add_argument('--serving-model-dir', type=str, default=None,
+                        help='Defaults to <pipeline root>/serving_model.')
+    parser.add_argument('--metadata-path', type=str, default=None,
+                        help='SQLite file of the metadata store, defaults to <pipeline root>/metadata.sqlite.')
+    parser.add_argument('--num-workers', type=int, default=0,
+                        help='Beam direct runner workers of the components, 0 means one per CPU.')
+
+    return parser.parse_args()
+
+
+def _cpu_seconds() -> float:
+    """User and system time of this process and its terminated children."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _artifact_bytes(artifacts: List[types.Artifact]) -> int:
+    total = 0
+    for artifact in artifacts:
+        for directory, _, filenames in os.walk(artifact.uri):
+            total += sum(os.path.getsize(os.path.join(directory, filename)) for filename in filenames)
+        if os.path.isfile(artifact.uri):
+            total += os.path.getsize(artifact.uri)
+    return total
+
+
+def _count_rows(artifact: types.Artifact) -> Optional[int]:
+    """Number of examples of an Examples artifact or csv rows of an input directory, else None."""
+    paths = [os.path.join(directory, filename) for directory, _, filenames in os.walk(artifact.uri)
+             for filename in filenames]
+    if artifact.type_name == 'Examples':
+        return sum(sum(1 for _ in tf.compat.v1.io.tf_record_iterator(
+            path, tf.io.TFRecordOptions(example_codec.compression_type_of_files([path])))) for path in paths)
+    if artifact.type_name == 'ExternalArtifact':
+        rows = 0
+        for path in paths:
+            with (gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')) as file:
+                rows += max(sum(1 for line in file if line.strip()) - 1, 0)  # minus the header
+        return rows
+    return None
+
+
+def _rows(input_dict: Dict[Text, List[types.Artifact]], output_dict: Dict[Text, List[types.Artifact]]) -> int:
+    """Rows read by a component, or written if it reads none (like ExampleGen from its csv input)."""
+    for artifacts in (input_dict, output_dict):
+        counts = [_count_rows(artifact) for values in artifacts.values() for artifact in values]
+        counts = [count for count in counts if count is not None]
+        if counts:
+            return max(counts)
+    return 0
+
+
+class TimingComponentLauncher(in_process_component_launcher.InProcessComponentLauncher):
+    """Runs executors in-process like InProcessComponentLauncher and records their resource use."""
+
+    def _run_executor(self, execution_id: int,
+                      input_dict: Dict[Text, List[types.Artifact]],
+                      output_dict: Dict[Text, List[types.Artifact]],
+                      exec_properties: Dict[Text, Any]) -> None:
+        sampler = ProcessTreeRssSampler()
+        sampler.start()
+        start, cpu_start = time.time(), _cpu_seconds()
+        try:
+            super(TimingComponentLauncher, self)._run_executor(execution_id, input_dict, output_dict,
+                                                               exec_properties)
+        finally:
+            seconds, cpu_seconds = time.time() - start, _cpu_seconds() - cpu_start
+            peak_rss = sampler.stop()
+        # Measured after the executor, so counting rows does not distort the timings.
+        rows = _rows(input_dict, output_dict)
+        timing = {
+            'component': self._component_info.component_id,
+            'wall_seconds': seconds,
+            'cpu_seconds': cpu_seconds,
+            'peak_rss_mib': peak_rss / (1 << 20),
+            'input_bytes': sum(_artifact_bytes(artifacts) for artifacts in input_dict.values()),
+            'output_bytes': sum(_artifact_bytes(artifacts) for artifacts in output_dict.values()),
+            'rows': rows,
+            'rows_per_sec': rows / max(seconds, 1e-9),
+            'num_workers': resource_planner.num_workers(self._beam_pipeline_args),
+        }
+        timing_dir = os.path.join(self._pipeline_info.pipeline_root, TIMING_DIR)
+        os.makedirs(timing_dir, exist_ok=True)
+        with open(os.path.join(timing_dir, timing['component'] + '.json'), 'w') as timing_file:
+            json.dump(timing, timing_file)
+
+
+def write_report(pipeline_root: Text, started: float) -> List[Dict[Text, Any]]:
+    """Collects the timings of the components that ran since `started`, prints and stores them."""
+    timings = []
+    for path in glob.glob(os.path.join(pipeline_root, TIMING_DIR, '*.json')):
+        if os.path.getmtime(path) >= started:
+            with open(path) as timing_file:
+                timings.append(json.load(timing_file))
+    timings.sort(key=lambda timing: os.path.getmtime(os.path.join(pipeline_root, TIMING_DIR,
+                                                                  timing['component'] + '.json')))
+    with open(os.path.join(pipeline_root, REPORT_FILE), 'w') as report_file:
+        json.dump(timings, report_file, indent=2)
+
+    print(f"{'component':<28}{'wall s':>9}{'cpu s':>9}{'peak RSS MiB':>14}{'in MiB':>9}{'out MiB':>9}"
+          f"{'rows':>10}{'rows/s':>10}")
+    for timing in timings:
+        print(f"{timing['component']:<28}{timing['wall_seconds']:>9.1f}{timing['cpu_seconds']:>9.1f}"
+              f"{timing['peak_rss_mib']:>14.0f}{timing['input_bytes'] / (1 << 20):>9.1f}"
+              f"{timing['output_bytes'] / (1 << 20):>9.1f}{timing['rows']:>10}{timing['rows_per_sec']:>10.0f}")
+    return timings
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    pipeline_root = os.path.abspath(args.pipeline_root)
+    os.makedirs(pipeline_root, exist_ok=True)
+    os.environ.setdefault(example_codec.CODEC_ENV, kdd_pipe._example_codec)
+    beam_pipeline_args = ['--direct_running_mode=multi_processing',
+                          f'--direct_num_workers={args.num_workers}']
+    tfx_pipeline = kdd_pipe._create_pipeline(
+        pipeline_name=kdd_pipe._pipeline_name,
+        pipeline_root=pipeline_root,
+        data_root=os.path.abspath(args.data_root),
+        module_file=os.path.abspath(args.module_file),
+        serving_model_dir=args.serving_model_dir or os.path.join(pipeline_root, 'serving_model'),
+        beam_pipeline_args=beam_pipeline_args,
+        metadata_connection_config=metadata.sqlite_metadata_connection_config(
+            args.metadata_path or os.path.join(pipeline_root, 'metadata.sqlite')))
+
+    started = time.time()
+    BeamDagRunner(config=pipeline_config.PipelineConfig(
+        supported_launcher_classes=[TimingComponentLauncher])).run(tfx_pipeline)
+    write_report(pipeline_root, started)
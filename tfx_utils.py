@@ -1,20 +1,63 @@
-from typing import List, Text
+import functools
+import importlib
+import os
+import time
+import types
+from typing import TYPE_CHECKING, List, Optional, Text
 
-import tensorflow as tf
-import tensorflow_transform as tft
-from tfx.components.trainer.executor import TrainerFnArgs
+from custom_components.columnar_cache.src.columnar_cache import ColumnarCache
+from custom_components.example_codec.src import example_codec
+from custom_components.span_statistics.src.sketches import (MERGED_STATISTICS_ENV, MERGED_VOCABULARY_DIR_ENV,
+                                                            MisraGries, SplitStatistics, statistics_path)
+
+if TYPE_CHECKING:
+    from tfx.components.trainer.executor import TrainerFnArgs
+
+
+class _LazyModule(types.ModuleType):
+    """Imports the module on first attribute access. Importing tfx_utils alone, e.g. for the key
+    lists or in a pre-warmed executor host, then does not pay the seconds of TensorFlow startup.
+    """
+
+    def __init__(self, name: Text):
+        super(_LazyModule, self).__init__(name)
+        self._module = None
+
+    def __getattr__(self, attr: Text):
+        if self._module is None:
+            self._module = importlib.import_module(self.__name__)
+        return getattr(self._module, attr)
+
+
+tf = _LazyModule('tensorflow')
+tft = _LazyModule('tensorflow_transform')
 
 NUMERICAL_KEYS = [f"num_{i}" for i in range(38)]
 CATEGORICAL_KEYS = ["transport_protocol", "application_protocol", "cat_0", ]
 LABEL_KEYS = ["label_0"]
-VOCAB_SIZE = 100  # a lousy guess
-OOV_SIZE = 10  # a lousy guess
+# Number of occurrences of a row, added by the optional ExampleDedup stage.
+WEIGHT_KEY = "weight"
+# Categorical values seen less often than this during analysis are mapped to the OOV buckets.
+VOCAB_FREQUENCY_THRESHOLD = 10
+OOV_SIZE = 1
+# Every attack type is kept, however rare; types unseen during analysis share one extra class.
+LABEL_FREQUENCY_THRESHOLD = 1
+LABEL_OOV_SIZE = 1
+DEFAULT_BATCH_SIZE = 256
+# hash_buckets of the train and eval splits of ExampleGen's default output config.
+DEFAULT_HASH_BUCKETS = [2, 1]
+SHUFFLE_BUFFER = 10000
+HIDDEN_UNITS = [64, 32]
+# Share of the input pipeline's own throughput above which training counts as input-bound.
+INPUT_BOUND_SHARE = 0.9
+# Analyze all numerical keys at once in a single pass instead of two passes per key.
+FUSED_NUMERIC_ANALYZERS = True
 
-def _gzip_reader_fn(filenames):
-  """Small utility returning a record reader that can read gzip'ed files."""
-  return tf.data.TFRecordDataset(
+def _reader_fn(compression_type: Text):
+  """Small utility returning a record reader for files of the given compression, see example_codec.py."""
+  return lambda filenames: tf.data.TFRecordDataset(
       filenames,
-      compression_type='GZIP')
+      compression_type=compression_type)
 
 def _fill_in_missing(x):
     """Replace missing values in a SparseTensor.
@@ -36,6 +79,82 @@ def _fill_in_missing(x):
     return tf.squeeze(dense_tensor, axis=1)
 
 
+def _scale_numerical_per_key(inputs):
+    """Scales every numerical key to z-score and then to [0, 1], with two analyzer passes per key."""
+    outputs = {}
+    for key in NUMERICAL_KEYS:
+        cache = tft.scale_to_z_score(_fill_in_missing(inputs[key]))
+        outputs[key] = tft.scale_to_0_1(cache)
+    return outputs
+
+
+def _scale_numerical_fused(inputs, weights=None):
+    """Same outputs as `_scale_numerical_per_key`, computed from one pass over a stacked tensor.
+    The count, sums and sums of squares (for mean and variance) of all numerical keys are reduced
+    by one `tft.sum` over a stacked `[batch, 3 * len(NUMERICAL_KEYS)]` tensor, min and max by one
+    `tft.max` over `[-x, x]`. Since the z-score is monotonic in x, the min and max of the z-scores
+    follow from those of x, so the second pass `scale_to_0_1` would need is not required.
+    Args:
+      inputs: map from feature keys to raw not-yet-transformed features.
+      weights: Optional rank 1 tensor of row weights, every row counts as often as its weight.
+    Returns:
+      Map from numerical feature key to its scaled float32 tensor.
+    """
+    num_keys = len(NUMERICAL_KEYS)
+    x = tf.stack([tf.cast(_fill_in_missing(inputs[key]), tf.float64) for key in NUMERICAL_KEYS], axis=1)
+    w = tf.ones_like(x) if weights is None else tf.broadcast_to(tf.cast(weights, tf.float64)[:, None], tf.shape(x))
+    sums = tft.sum(tf.concat([w, w * x, w * tf.square(x)], axis=1), reduce_instance_dims=False)
+    count, x_sum, x_square_sum = sums[:num_keys], sums[num_keys:2 * num_keys], sums[2 * num_keys:]
+    mean = x_sum / count
+    var = tf.maximum(x_square_sum / count - tf.square(mean), 0.)
+    extremes = tft.max(tf.concat([-x, x], axis=1), reduce_instance_dims=False)
+    return _scale_stacked(x, mean, var, -extremes[:num_keys], extremes[num_keys:])
+
+
+def _scale_stacked(x, mean, var, x_min, x_max):
+    """Scales the stacked numerical keys `x` to z-score and then to [0, 1], given their column statistics."""
+    # Like scale_to_z_score, columns without variance are only centered.
+    std = tf.where(var > 0., tf.sqrt(var), tf.ones_like(var))
+    z, z_min, z_max = (x - mean) / std, (x_min - mean) / std, (x_max - mean) / std
+    # Like scale_to_0_1, constant columns are mapped to 0.5.
+    scaled = tf.where(tf.broadcast_to(z_min < z_max, tf.shape(z)),
+                      (z - z_min) / tf.where(z_min < z_max, z_max - z_min, tf.ones_like(z_min)),
+                      tf.fill(tf.shape(z), tf.constant(0.5, tf.float64)))
+    scaled = tf.cast(scaled, tf.float32)
+    return {key: scaled[:, i] for i, key in enumerate(NUMERICAL_KEYS)}
+
+
+def _merged_statistics() -> Optional[SplitStatistics]:
+    """Merged train statistics of all spans if run by SpanTransform, else None."""
+    uri = os.environ.get(MERGED_STATISTICS_ENV)
+    return SplitStatistics.load(statistics_path(uri, 'train')) if uri else None
+
+
+def _scale_numerical_merged(inputs, statistics: SplitStatistics):
+    """Same outputs as `_scale_numerical_fused`, with the moments of the merged statistics as constants."""
+    moments = [statistics.moments[key] for key in NUMERICAL_KEYS]
+    x = tf.stack([tf.cast(_fill_in_missing(inputs[key]), tf.float64) for key in NUMERICAL_KEYS], axis=1)
+    mean, var, x_min, x_max = (tf.constant([getattr(m, field) for m in moments], tf.float64)
+                               for field in ('mean', 'variance', 'min', 'max'))
+    return _scale_stacked(x, mean, var, x_min, x_max)
+
+
+def _apply_merged_vocabulary(x, key: Text, top_values: MisraGries, frequency_threshold: int, num_oov_buckets: int):
+    """Like `tft.compute_and_apply_vocabulary` with the value counts of the merged statistics.
+    The vocabulary file is registered as asset under the name of the key, so the transform graph
+    stores it where `tf_transform_output.vocabulary_file_by_name(key)` finds it. The file itself goes
+    to the vocabulary dir of the SpanTransform run, which removes it afterwards.
+    """
+    path = os.path.join(os.environ[MERGED_VOCABULARY_DIR_ENV], key)
+    with open(path, 'w') as vocabulary_file:
+        for value, count in top_values.top():
+            if count >= frequency_threshold:
+                vocabulary_file.write(value + '\n')
+    vocabulary = tf.constant(path)
+    tf.compat.v1.add_to_collection(tf.compat.v1.GraphKeys.ASSET_FILEPATHS, vocabulary)
+    return tft.apply_vocabulary(x, vocabulary, num_oov_buckets=num_oov_buckets)
+
+
 # TFX Transform will call this function.
 def preprocessing_fn(inputs):
     """tf.transform's callback function for preprocessing inputs.
@@ -45,47 +164,306 @@ def preprocessing_fn(inputs):
       Map from string feature key to transformed feature operations.
     """
     outputs = {}
+    weights = None
+    if WEIGHT_KEY in inputs:
+        print("Weight the analyzers by the row counts of deduplicated examples. Add weight to output.")
+        weights = tf.cast(_fill_in_missing(inputs[WEIGHT_KEY]), tf.float32)
+        outputs[WEIGHT_KEY] = weights
+    merged = _merged_statistics()
+    if merged is not None:
+        print(f"Scale and integer-encode with the merged statistics of spans {merged.spans}, without analyzers.")
+        outputs.update(_scale_numerical_merged(inputs, merged))
+        for key in CATEGORICAL_KEYS + LABEL_KEYS:
+            labels = key in LABEL_KEYS
+            outputs[key] = _apply_merged_vocabulary(
+                _fill_in_missing(inputs[key]), key, merged.top_values[key],
+                LABEL_FREQUENCY_THRESHOLD if labels else VOCAB_FREQUENCY_THRESHOLD,
+                LABEL_OOV_SIZE if labels else OOV_SIZE)
+        return outputs
     print("Scale numerical keys to z-score. Add to output.")
-    for key in NUMERICAL_KEYS:
-        cache = tft.scale_to_z_score(_fill_in_missing(inputs[key]))
-        outputs[key] = tft.scale_to_0_1(cache)
-    print("Add categorical keys to output.")
+    if FUSED_NUMERIC_ANALYZERS or weights is not None:
+        # The per-key analyzers have no weights.
+        outputs.update(_scale_numerical_fused(inputs, weights))
+    else:
+        outputs.update(_scale_numerical_per_key(inputs))
+    print("Integer-encode categorical keys with vocabularies computed from the data. Add to output.")
     for key in CATEGORICAL_KEYS:
-        outputs[key] = _fill_in_missing(inputs[key])
-    print("Add label keys to output")
+        outputs[key] = tft.compute_and_apply_vocabulary(
+            _fill_in_missing(inputs[key]),
+            frequency_threshold=VOCAB_FREQUENCY_THRESHOLD,
+            num_oov_buckets=OOV_SIZE,
+            vocab_filename=key,
+            weights=weights)
+    print("Integer-encode label keys. Add to output")
     for key in LABEL_KEYS:
-        outputs[key] = inputs[key]
+        outputs[key] = tft.compute_and_apply_vocabulary(
+            _fill_in_missing(inputs[key]),
+            frequency_threshold=LABEL_FREQUENCY_THRESHOLD,
+            num_oov_buckets=LABEL_OOV_SIZE,
+            vocab_filename=key,
+            weights=weights)
     return outputs
 
 
+def _vocabulary_size(tf_transform_output: 'tft.TFTransformOutput', key: Text) -> int:
+    """Number of distinct ids of an integer-encoded key, including its OOV buckets.
+    The vocabularies are no separate artifact but assets of the transform graph, stored under their
+    key, where `tf_transform_output.vocabulary_file_by_name(key)` finds them for reuse.
+    """
+    oov_size = LABEL_OOV_SIZE if key in LABEL_KEYS else OOV_SIZE
+    return tf_transform_output.vocabulary_size_by_name(key) + oov_size
+
+
 def _input_fn(file_pattern: List[Text],
-              tf_transform_output: tft.TFTransformOutput,
-              batch_size: int = 200) -> tf.data.Dataset:
+              tf_transform_output: 'tft.TFTransformOutput',
+              batch_size: int = DEFAULT_BATCH_SIZE,
+              shuffle_buffer: int = SHUFFLE_BUFFER,
+              cache: bool = False) -> 'tf.data.Dataset':
     """Generates features and label for tuning/training.
+    The shards, compressed with any codec of example_codec.py, are read in parallel and
+    interleaved, whole batches are parsed at once, and batches are prefetched while the model
+    trains, all with autotuned parallelism.
     Args:
       file_pattern: List of paths or patterns of input tfrecord files.
       tf_transform_output: A TFTransformOutput.
       batch_size: representing the number of consecutive elements of returned
         dataset to combine in a single batch
+      shuffle_buffer: Number of records shuffled in memory, 0 disables shuffling.
+      cache: Keeps the decompressed records in memory after the first pass. Only for splits
+        that fit into memory, such as train.small.
     Returns:
       A dataset that contains (features, indices) tuple where features is a
         dictionary of Tensors, and indices is a single Tensor of label indices.
+        Deduplicated data adds the weights as third element, Keras uses them as sample weights.
     """
     transformed_feature_spec = (
         tf_transform_output.transformed_feature_spec().copy())
+    autotune = tf.data.experimental.AUTOTUNE
+
+    compression_type = example_codec.compression_type_of_files(
+        path for pattern in file_pattern for path in sorted(tf.io.gfile.glob(pattern)))
+    files = tf.data.Dataset.list_files(file_pattern, shuffle=shuffle_buffer > 0)
+    dataset = files.interleave(_reader_fn(compression_type), cycle_length=autotune, num_parallel_calls=autotune)
+    if cache:
+        dataset = dataset.cache()
+    if shuffle_buffer > 0:
+        dataset = dataset.shuffle(shuffle_buffer)
+    dataset = dataset.repeat().batch(batch_size, drop_remainder=True)
+
+    def parse(serialized):
+        features = tf.io.parse_example(serialized, transformed_feature_spec)
+        label = features.pop(LABEL_KEYS[0])
+        if WEIGHT_KEY in features:
+            return features, label, features.pop(WEIGHT_KEY)
+        return features, label
 
-    dataset = tf.data.experimental.make_batched_features_dataset(
-        file_pattern=file_pattern,
-        batch_size=batch_size,
-        features=transformed_feature_spec,
-        reader=_gzip_reader_fn,
-        label_key="tips")
+    return dataset.map(parse, num_parallel_calls=autotune).prefetch(autotune)
 
-    return dataset
+
+def _as_raw_feature(values: 'tf.Tensor', feature_spec) -> 'tf.Tensor':
+    """Shapes a batch of column values like the parsed raw feature of `feature_spec`."""
+    values = tf.cast(values, feature_spec.dtype)
+    if isinstance(feature_spec, tf.io.VarLenFeature):
+        batch_size = tf.shape(values, out_type=tf.int64)[0]
+        indices = tf.stack([tf.range(batch_size), tf.zeros([batch_size], tf.int64)], axis=1)
+        return tf.SparseTensor(indices, values, tf.stack([batch_size, 1]))
+    if feature_spec.shape:
+        return tf.expand_dims(values, 1)
+    return values
+
+
+def _cached_input_fn(cache_dir: Text,
+                     tf_transform_output: 'tft.TFTransformOutput',
+                     split: int,
+                     hash_buckets: List[int],
+                     batch_size: int = DEFAULT_BATCH_SIZE,
+                     shuffle_buffer: int = SHUFFLE_BUFFER) -> 'tf.data.Dataset':
+    """Generates features and label from a columnar cache instead of TFRecords.
+    The memory-mapped columns become tensors once (page-aligned maps are not copied), and every
+    batch gathers its rows from them and runs them through the transform graph, so nothing is
+    parsed, decompressed or passed through Python while training. The rows are those KddExampleGen
+    writes to the `split`-th split for `hash_buckets`, so train and eval stay apart.
+    Args:
+      cache_dir: Directory of a cache built by the ColumnarCacheComponent.
+      tf_transform_output: A TFTransformOutput.
+      split: Index of the split in `hash_buckets`.
+      hash_buckets: hash_buckets of the output splits of KddExampleGen.
+      batch_size: representing the number of consecutive elements of returned
+        dataset to combine in a single batch
+      shuffle_buffer: Number of row indices shuffled in memory, 0 disables shuffling.
+    Returns:
+      A dataset that contains (features, indices) tuple where features is a
+        dictionary of Tensors, and indices is a single Tensor of label indices.
+    """
+    cache = ColumnarCache(cache_dir)
+    raw_feature_spec = tf_transform_output.raw_feature_spec()
+    numerical = tf.convert_to_tensor(cache.numerical)
+    codes = {key: tf.convert_to_tensor(cache.codes(key)) for key in cache.categorical_keys if key in raw_feature_spec}
+    vocabularies = {key: tf.constant(cache.vocabulary(key) or [''], tf.string) for key in codes}
+    numerical_columns = {key: i for i, key in enumerate(cache.numerical_keys) if key in raw_feature_spec}
+    transform_layer = tf_transform_output.transform_features_layer()
+
+    dataset = tf.data.Dataset.from_tensor_slices(cache.split_rows(hash_buckets, split))
+    if shuffle_buffer > 0:
+        dataset = dataset.shuffle(shuffle_buffer)
+    dataset = dataset.repeat().batch(batch_size, drop_remainder=True)
+
+    def transform(rows):
+        numerical_rows = tf.gather(numerical, rows)
+        columns = {key: numerical_rows[:, i] for key, i in numerical_columns.items()}
+        columns.update({key: tf.gather(vocabularies[key], tf.gather(key_codes, rows))
+                        for key, key_codes in codes.items()})
+        if WEIGHT_KEY in raw_feature_spec:
+            # Every cached row is one raw row, which counts once.
+            columns[WEIGHT_KEY] = tf.ones_like(rows)
+        transformed_features = transform_layer({key: _as_raw_feature(values, raw_feature_spec[key])
+                                                for key, values in columns.items()})
+        label = transformed_features.pop(LABEL_KEYS[0])
+        transformed_features.pop(WEIGHT_KEY, None)
+        return transformed_features, label
+
+    autotune = tf.data.experimental.AUTOTUNE
+    return dataset.map(transform, num_parallel_calls=autotune).prefetch(autotune)
+
+
+def _build_keras_model(tf_transform_output: 'tft.TFTransformOutput') -> 'tf.keras.Model':
+    """Dense classifier over the scaled numerical keys and embedded categorical ids."""
+    inputs = {key: tf.keras.layers.Input(shape=(), name=key, dtype=tf.float32) for key in NUMERICAL_KEYS}
+    inputs.update({key: tf.keras.layers.Input(shape=(), name=key, dtype=tf.int64) for key in CATEGORICAL_KEYS})
+    columns = [tf.keras.layers.Reshape((1,))(inputs[key]) for key in NUMERICAL_KEYS]
+    for key in CATEGORICAL_KEYS:
+        vocabulary_size = _vocabulary_size(tf_transform_output, key)
+        embedding = tf.keras.layers.Embedding(vocabulary_size, min(8, vocabulary_size))
+        columns.append(tf.keras.layers.Flatten()(embedding(tf.keras.layers.Reshape((1,))(inputs[key]))))
+    hidden = tf.keras.layers.concatenate(columns)
+    for units in HIDDEN_UNITS:
+        hidden = tf.keras.layers.Dense(units, activation='relu')(hidden)
+    output = tf.keras.layers.Dense(_vocabulary_size(tf_transform_output, LABEL_KEYS[0]),
+                                   activation='softmax')(hidden)
+    model = tf.keras.Model(inputs=inputs, outputs=output)
+    # Deduplicated examples come with sample weights, the accuracy has to count them like the loss does.
+    model.compile(optimizer=tf.keras.optimizers.Adam(),
+                  loss='sparse_categorical_crossentropy',
+                  weighted_metrics=['sparse_categorical_accuracy'])
+    return model
+
+
+def _get_serve_tf_examples_fn(model: 'tf.keras.Model', tf_transform_output: 'tft.TFTransformOutput'):
+    """Returns a function that parses raw serialized tf.Examples and applies the transform graph."""
+    model.tft_layer = tf_transform_output.transform_features_layer()
+
+    @tf.function
+    def serve_tf_examples_fn(serialized_tf_examples):
+        feature_spec = tf_transform_output.raw_feature_spec()
+        for key in LABEL_KEYS + [WEIGHT_KEY]:
+            feature_spec.pop(key, None)
+        parsed_features = tf.io.parse_example(serialized_tf_examples, feature_spec)
+        transformed_features = model.tft_layer(parsed_features)
+        for key in LABEL_KEYS + [WEIGHT_KEY]:
+            transformed_features.pop(key, None)
+        return model(transformed_features)
+
+    return serve_tf_examples_fn
+
+
+@functools.lru_cache(maxsize=None)
+def _throughput_callback_class():
+    """The Keras callback class below, defined on first use since its base class needs TensorFlow."""
+
+    class _ThroughputCallback(tf.keras.callbacks.Callback):
+        """Logs examples/sec of the training loop and compares it with the input pipeline alone.
+        If training runs about as fast as the input pipeline can deliver, the steps are waiting for
+        data (input-bound); otherwise the model itself is the bottleneck (compute-bound).
+        """
+
+        def __init__(self, batch_size: int, input_examples_per_sec: float, log_every_steps: int = 500):
+            super(_ThroughputCallback, self).__init__()
+            self._batch_size = batch_size
+            self._input_examples_per_sec = input_examples_per_sec
+            self._log_every_steps = log_every_steps
+            self._steps = 0
+            self._start = None
+            self._window_start = None
+
+        def on_train_begin(self, logs=None):
+            self._start = self._window_start = time.time()
+
+        def on_train_batch_end(self, batch, logs=None):
+            self._steps += 1
+            if self._steps % self._log_every_steps == 0:
+                now = time.time()
+                self._log("steps {}-{}".format(self._steps - self._log_every_steps + 1, self._steps),
+                          self._log_every_steps, now - self._window_start)
+                self._window_start = now
+
+        def on_train_end(self, logs=None):
+            self._log("training", self._steps, time.time() - self._start)
+
+        def _log(self, label: Text, steps: int, seconds: float):
+            examples_per_sec = steps * self._batch_size / max(seconds, 1e-9)
+            input_share = min(examples_per_sec / max(self._input_examples_per_sec, 1e-9), 1.)
+            bound = "input-bound" if input_share >= INPUT_BOUND_SHARE else "compute-bound"
+            print(f"{label}: {examples_per_sec:.0f} examples/sec, input pipeline alone "
+                  f"{self._input_examples_per_sec:.0f} examples/sec; ~{input_share:.0%} of the step time "
+                  f"waits on input ({bound})")
+
+    return _ThroughputCallback
+
+
+def _measure_input_throughput(dataset: 'tf.data.Dataset', batch_size: int, steps: int) -> float:
+    """Examples/sec the input pipeline delivers on its own, after one warm-up batch."""
+    iterator = iter(dataset)
+    next(iterator)
+    start = time.time()
+    for _ in range(steps):
+        next(iterator)
+    return steps * batch_size / max(time.time() - start, 1e-9)
+
+
+def _fn_arg(fn_args: 'TrainerFnArgs', key: Text, default):
+    """Reads an optional Trainer custom_config value, which TFX passes as a plain fn_args entry."""
+    try:
+        return fn_args[key]
+    except KeyError:
+        return default
 
 
 # TFX Trainer will call this function.
-def run_fn(fn_args: TrainerFnArgs):
+def run_fn(fn_args: 'TrainerFnArgs'):
+    """Trains the classifier and exports it with the transform graph as serving signature.
+    Optional Trainer custom_config keys: batch_size, shuffle_buffer, cache_train_data (keep the
+    decompressed train records in memory, for small splits), input_benchmark_steps, and
+    columnar_cache_dir with columnar_cache_hash_buckets (read train and eval rows from the
+    columnar cache of the KddExampleGen input instead of the transformed examples).
+    """
+    batch_size = _fn_arg(fn_args, 'batch_size', DEFAULT_BATCH_SIZE)
+    shuffle_buffer = _fn_arg(fn_args, 'shuffle_buffer', SHUFFLE_BUFFER)
     tf_transform_output = tft.TFTransformOutput(fn_args.transform_output)
-    train_dataset = _input_fn(fn_args.train_files, tf_transform_output, 40)
-    eval_dataset = _input_fn(fn_args.eval_files, tf_transform_output, 40)
+    columnar_cache_dir = _fn_arg(fn_args, 'columnar_cache_dir', None)
+    if columnar_cache_dir:
+        hash_buckets = _fn_arg(fn_args, 'columnar_cache_hash_buckets', DEFAULT_HASH_BUCKETS)
+        train_dataset = _cached_input_fn(columnar_cache_dir, tf_transform_output, 0, hash_buckets, batch_size,
+                                         shuffle_buffer)
+        eval_dataset = _cached_input_fn(columnar_cache_dir, tf_transform_output, 1, hash_buckets, batch_size,
+                                        shuffle_buffer=0)
+    else:
+        train_dataset = _input_fn(fn_args.train_files, tf_transform_output, batch_size, shuffle_buffer,
+                                  cache=_fn_arg(fn_args, 'cache_train_data', False))
+        eval_dataset = _input_fn(fn_args.eval_files, tf_transform_output, batch_size, shuffle_buffer=0)
+
+    input_examples_per_sec = _measure_input_throughput(
+        train_dataset, batch_size, _fn_arg(fn_args, 'input_benchmark_steps', 100))
+    model = _build_keras_model(tf_transform_output)
+    model.fit(
+        train_dataset,
+        steps_per_epoch=fn_args.train_steps,
+        validation_data=eval_dataset,
+        validation_steps=fn_args.eval_steps,
+        callbacks=[_throughput_callback_class()(batch_size, input_examples_per_sec)])
+
+    signatures = {
+        'serving_default':
+            _get_serve_tf_examples_fn(model, tf_transform_output).get_concrete_function(
+                tf.TensorSpec(shape=[None], dtype=tf.string, name='examples')),
+    }
+    model.save(fn_args.serving_model_dir, save_format='tf', signatures=signatures)